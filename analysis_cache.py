@@ -0,0 +1,173 @@
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from constants import ANALYSIS_CACHE_PATH, ANALYSIS_CACHE_MAX_ENTRIES
+from moves.move import code_to_uci
+
+'''
+Persistent analysis cache: the result of every find_best_move search kept on disk by position hash, so
+positions seen again in later games, by other processes or after a restart are answered without searching.
+It is off by default, see constants.USE_ANALYSIS_CACHE.
+
+Every result carries the fingerprint of the engine that found it (smart_move_finder.engine_fingerprint: the
+search and evaluation sources and settings), a result of another fingerprint is a miss and is overwritten,
+so a changed or retuned engine never answers with the analysis of an earlier one.
+
+The cache is an SQLite database in WAL mode, which lets any number of processes read while one writes, every
+process opens its own connection and waits for the write lock instead of failing. A position keeps its
+deepest analysis: a shallower result never replaces a deeper one. Past max_entries the least recently used
+positions are deleted, checked every EVICTION_INTERVAL writes of a process.
+
+    python analysis_cache.py --stats
+    python analysis_cache.py --trim 100000
+'''
+
+ENGINE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+EVICTION_INTERVAL = 100
+EVICTION_SLACK = 0.9  # Eviction trims the cache to this fraction of max_entries, so it does not run on every write
+BUSY_TIMEOUT_MS = 10000
+HASH_OFFSET = 1 << 64  # Zobrist hashes are unsigned 64-bit, SQLite integers are signed
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS positions (
+    hash INTEGER PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    move INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    depth INTEGER NOT NULL,
+    pv TEXT NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS positions_last_used ON positions (last_used);
+"""
+
+
+def resolve_path(path):
+    """Relative paths are taken from the engine directory, not from where the engine was started."""
+    return os.path.join(ENGINE_DIRECTORY, path)
+
+
+def to_key(position_hash):
+    return position_hash - HASH_OFFSET if position_hash >= 1 << 63 else position_hash
+
+
+class AnalysisCache:
+    def __init__(self, path=ANALYSIS_CACHE_PATH, max_entries=ANALYSIS_CACHE_MAX_ENTRIES):
+        self.path = resolve_path(path)
+        self.max_entries = max_entries
+        self._connection = None
+        self.pid = None
+        self.writes = 0
+        self.lock = threading.Lock()  # The UCI front end searches on a new thread every move
+
+    @property
+    def connection(self):
+        """The connection of this process, a forked worker must not share its parent's."""
+        if self._connection is None or self.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+                                               check_same_thread=False)
+            self._connection.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+            self._connection.execute("PRAGMA journal_mode = WAL")
+            self._connection.execute("PRAGMA synchronous = NORMAL")
+            columns = [row[1] for row in self._connection.execute("PRAGMA table_info(positions)")]
+            if columns and "fingerprint" not in columns:
+                self._connection.execute("DROP TABLE positions")  # Written before fingerprints, of no known engine
+            self._connection.executescript(SCHEMA)
+            self.pid = os.getpid()
+            self.writes = 0
+        return self._connection
+
+    def probe(self, position_hash, fingerprint):
+        """(move code, score, depth, PV in UCI notation) of the position by that engine, or None. Marks it as used."""
+        key = to_key(position_hash)
+        try:
+            with self.lock:
+                row = self.connection.execute(
+                    "SELECT move, score, depth, pv FROM positions WHERE hash = ? AND fingerprint = ?", (key, fingerprint)
+                ).fetchone()
+                if row is None:
+                    return None
+                self.connection.execute("UPDATE positions SET last_used = ? WHERE hash = ?", (time.time(), key))
+        except sqlite3.Error:
+            return None  # A busy or broken cache must not stop the engine from searching
+        move, score, depth, pv = row
+        return move, score, depth, pv.split()
+
+    def store(self, position_hash, fingerprint, move, score, depth, pv):
+        """Keep the analysis of the position unless a deeper one of the same engine is already stored."""
+        try:
+            with self.lock:
+                self.connection.execute(
+                    "INSERT INTO positions (hash, fingerprint, move, score, depth, pv, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (hash) DO UPDATE SET fingerprint = excluded.fingerprint, move = excluded.move, "
+                    "score = excluded.score, depth = excluded.depth, pv = excluded.pv, last_used = excluded.last_used "
+                    "WHERE excluded.depth >= positions.depth OR excluded.fingerprint != positions.fingerprint",
+                    (to_key(position_hash), fingerprint, move, score, depth, " ".join(pv), time.time())
+                )
+                self.writes += 1
+                if self.writes % EVICTION_INTERVAL == 0:
+                    self.evict()
+        except sqlite3.Error:
+            pass
+
+    def evict(self, max_entries=None, keep_fraction=EVICTION_SLACK):
+        """
+        Delete the least recently used positions once there are more than max_entries, down to keep_fraction of them.
+        Returns how many were deleted.
+        """
+        max_entries = self.max_entries if max_entries is None else max_entries
+        count = len(self)
+        if count <= max_entries:
+            return 0
+        excess = count - int(max_entries * keep_fraction)
+        self.connection.execute(
+            "DELETE FROM positions WHERE hash IN (SELECT hash FROM positions ORDER BY last_used LIMIT ?)", (excess,)
+        )
+        return excess
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM positions").fetchone()[0]
+
+    def stats(self):
+        count, min_depth, max_depth, average_depth, fingerprints = self.connection.execute(
+            "SELECT COUNT(*), MIN(depth), MAX(depth), AVG(depth), COUNT(DISTINCT fingerprint) FROM positions"
+        ).fetchone()
+        return {"path": self.path, "positions": count, "fingerprints": fingerprints, "min_depth": min_depth,
+                "max_depth": max_depth,
+                "average_depth": round(average_depth or 0, 2), "bytes": os.path.getsize(self.path)}
+
+    def close(self):
+        if self._connection is not None and self.pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or trim the persistent analysis cache.")
+    parser.add_argument("--path", default=ANALYSIS_CACHE_PATH)
+    parser.add_argument("--stats", action="store_true", help="Print the number of positions and their depths")
+    parser.add_argument("--trim", type=int, help="Keep only this many of the most recently used positions")
+    parser.add_argument("--dump", type=int, metavar="N", help="Print the N most recently used positions")
+    args = parser.parse_args()
+
+    cache = AnalysisCache(args.path)
+    if args.trim is not None:
+        print(f"{cache.evict(args.trim, 1.0)} positions deleted")
+    if args.dump:
+        for key, fingerprint, move, score, depth, pv in cache.connection.execute(
+                "SELECT hash, fingerprint, move, score, depth, pv FROM positions ORDER BY last_used DESC LIMIT ?",
+                (args.dump,)):
+            print(f"{key % HASH_OFFSET:016x} {fingerprint} {code_to_uci(move)} score {score} depth {depth} pv {pv}")
+    if args.stats or (args.trim is None and not args.dump):
+        print(cache.stats())
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+from constants import DIMENSION, SQUARES
+
+'''
+Move and attack tables, built once at import. Squares are row * 8 + col, row 0 being the 8th rank.
+
+Target tables hold (row, col, square) tuples, so move generation and attack detection walk them
+without bounds checks and still index the board directly. BETWEEN and LINE are bitmasks of squares:
+bit s of BETWEEN[a][b] is set for the squares strictly between a and b on a rank, file or diagonal,
+LINE[a][b] is the whole line through a and b. Both are 0 when the squares are not aligned.
+'''
+
+# Ray directions, orthogonal first, in the order check_for_pins_and_checks looks outwards from the king
+DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+ROOK_DIRECTIONS = (0, 1, 2, 3)
+BISHOP_DIRECTIONS = (4, 5, 6, 7)
+QUEEN_DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+OPPOSITE_DIRECTIONS = (2, 3, 0, 1, 7, 6, 5, 4)
+
+KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2), (1, -2))
+
+
+def _on_board(row, col):
+    return 0 <= row < DIMENSION and 0 <= col < DIMENSION
+
+
+def _targets(square, offsets):
+    row, col = divmod(square, DIMENSION)
+    return tuple(
+        (row + d_row, col + d_col, (row + d_row) * DIMENSION + col + d_col)
+        for d_row, d_col in offsets if _on_board(row + d_row, col + d_col)
+    )
+
+
+def _ray(square, direction):
+    row, col = divmod(square, DIMENSION)
+    d_row, d_col = direction
+    ray = []
+    row, col = row + d_row, col + d_col
+    while _on_board(row, col):
+        ray.append((row, col, row * DIMENSION + col))
+        row, col = row + d_row, col + d_col
+    return tuple(ray)
+
+
+KNIGHT_TARGETS = [_targets(square, KNIGHT_OFFSETS) for square in range(SQUARES)]
+KING_TARGETS = [_targets(square, DIRECTIONS) for square in range(SQUARES)]
+
+# RAYS[square][direction index]: the squares from square to the edge of the board in that direction
+RAYS = [tuple(_ray(square, direction) for direction in DIRECTIONS) for square in range(SQUARES)]
+
+# PAWN_CAPTURES[color][square]: the squares a pawn of that color on square captures on
+PAWN_CAPTURES = {
+    "w": [_targets(square, ((-1, -1), (-1, 1))) for square in range(SQUARES)],
+    "b": [_targets(square, ((1, -1), (1, 1))) for square in range(SQUARES)]
+}
+
+# PAWN_ATTACKERS[color][square]: the squares a pawn of that color attacks square from
+PAWN_ATTACKERS = {
+    "w": PAWN_CAPTURES["b"],
+    "b": PAWN_CAPTURES["w"]
+}
+
+
+def _between_and_line():
+    between = [[0] * SQUARES for _ in range(SQUARES)]
+    line = [[0] * SQUARES for _ in range(SQUARES)]
+    for square in range(SQUARES):
+        for direction in range(len(DIRECTIONS)):
+            ray = RAYS[square][direction]
+            opposite_ray = RAYS[square][OPPOSITE_DIRECTIONS[direction]]
+            full_line = 1 << square
+            for _, _, ray_square in ray + opposite_ray:
+                full_line |= 1 << ray_square
+            squares_between = 0
+            for _, _, ray_square in ray:
+                between[square][ray_square] = squares_between
+                line[square][ray_square] = full_line
+                squares_between |= 1 << ray_square
+    return between, line
+
+
+BETWEEN, LINE = _between_and_line()
+
+
+def _ray_directions():
+    ray_directions = [[-1] * SQUARES for _ in range(SQUARES)]
+    for square in range(SQUARES):
+        for direction in range(len(DIRECTIONS)):
+            for _, _, ray_square in RAYS[square][direction]:
+                ray_directions[square][ray_square] = direction
+    return ray_directions
+
+
+# RAY_DIRECTIONS[a][b]: index of the direction going from a to b, -1 when they are not aligned
+RAY_DIRECTIONS = _ray_directions()
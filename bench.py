@@ -0,0 +1,200 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import batch_evaluator
+import perft
+import smart_move_finder
+from chess_engine import GameState
+
+'''
+Benchmark of move generation, evaluation and search throughput over a fixed set of positions.
+
+Every position goes through perft, the static evaluator and a fixed-depth search. The total number of
+search nodes is the signature of the run: it only changes when the search itself changes, so a
+different signature at the same depth means a change was not a pure speed-up.
+
+    python bench.py --output bench.json
+    python bench.py --baseline bench.json --threshold 0.05
+'''
+
+BENCH_FENS = [
+    # Perft test positions
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+    "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+    "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+    "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+    # Positions from the bundled Fischer games, openings to endgames
+    "r2q1rk1/pppnppbp/2np2p1/8/2PPP1b1/2NBBN2/PP3PPP/R2Q1RK1 w - - 8 9",
+    "1rbq1rk1/6bp/3ppnp1/n1p5/Np6/1P3NP1/PBQ1PPBP/2R2RK1 w - c6 0 16",
+    "r1bqkbnr/2p3pp/p2p1p2/1p2p3/3PP3/1P3N2/1PP2PPP/RNBQ1RK1 w kq - 0 9",
+    "2r2rk1/1bq1bppp/p4n2/np1pp3/3PP3/3B1N1P/PP3PP1/R1BQRNK1 w - - 0 16",
+    "4q1k1/p1pb2rp/1p1p2n1/3P1p2/2PQ1P2/2N2BP1/PP3K2/R7 w - - 0 23",
+    "5r1r/7R/1kp2Qp1/2q1p2P/p1PpP3/2nP2P1/6B1/5RK1 w - - 1 31",
+    "r1bqk2r/pp3ppp/2n1pn2/3p4/4P3/P1N5/1PP2PPP/R1BQKB1R w KQkq d6 0 9",
+    "r4rk1/pp3ppp/1bbp1n2/q3pP2/4P3/1BN5/PPP1QBPP/3R1RK1 w - - 4 16",
+    "r1b2r2/1pp1qnbk/6pp/pPP1np2/5B1P/3P2PN/P4PB1/1RQ1R1K1 w - - 0 23",
+    "rr6/p1n2kp1/2Q1p3/6P1/8/2N2Pb1/P1P3P1/2K5 w - - 3 31",
+    "r1bq1rk1/2p1bppp/p1np1n2/1p2p3/4P3/1BP2N2/PP1P1PPP/RNBQR1K1 w - - 0 9",
+    "1rb1nrk1/1p1nqpbp/p2p2p1/2pP4/P3PP2/2N1B3/1P1QBNPP/R4RK1 w - - 5 16",
+    "4rrk1/1p2ppbp/3p2p1/p2N1PB1/4P3/5Q2/1q5P/5R1K w - - 0 23",
+    "8/pp5p/3p2p1/2k1p1P1/4P3/4KP2/PP5P/8 w - - 4 31",
+    "rn2kb1r/pp3p1p/1qp2p2/3p1b2/3P4/1QN2N2/PP2PPPP/R3KB1R w KQkq - 0 9",
+    "r1b1rbk1/2q2ppp/p1ppp3/4nPP1/4PB2/2N5/PPP3BP/R2Q1R1K w - - 5 16",
+    "2r3k1/1nqbbp1p/3p2p1/1p1Pp2n/1P2P3/RN1B1N1P/5PP1/2BQ2K1 w - - 8 23",
+    "8/2qk2pb/p3p2p/Ppp1p3/4P1P1/5P1P/1PP3K1/4Q1B1 w - b6 0 31",
+    "r1bq1rk1/2p1bppp/p1np1n2/1p2p3/B3P3/2PP1N2/PP3PPP/R1BQKN1R w KQ b6 0 9",
+    "r2qr1k1/p4ppp/b1p1pn2/1p1n4/PPpP4/B1N1PB2/5PPP/2RQ1RK1 w - - 0 16",
+    "3qr1k1/pp1n2p1/2r1b1Pp/n2p4/2pP1N2/P1P1PP2/R1B2K2/1QB4R w - - 4 23",
+    "8/5k2/p3p2p/2p1B1p1/7P/2P1R3/q4PPK/8 w - - 0 31",
+    "rnb1nrk1/ppp1qpbp/3p2p1/3Pp3/2P1P3/2N1BN2/PP2BPPP/R2QK2R w KQ - 1 9",
+    "r1b1k2r/4b2p/p1p1pp2/4p3/4N3/q7/P1PQ2PP/1R2KB1R w Kkq - 2 16",
+    "r1b1r2k/3q3p/p1p2p2/p1B1pP2/P3N2P/8/1PP2Q2/R4RK1 w - - 0 23",
+    "2n3k1/4q2n/4p1pQ/pb1pP3/1p1PB1P1/1P4N1/P4P2/6K1 w - - 0 31",
+    "rnbq1rk1/pp3pbp/2pp2p1/4p3/2PPP1n1/2N1BN2/PP2BPPP/R2Q1RK1 w - - 2 9",
+    "r2q1b1r/1b1k1pp1/p2p1n1p/3P4/pP1N3B/8/P1P2PPP/R2QR1K1 w - - 0 16",
+    "r4rk1/5ppp/3qb3/3p4/1P1R4/p5P1/P3QPBP/4R1K1 w - - 0 23",
+    "r4k2/2R5/pn1r2p1/5p2/1P1p1P1p/3B4/P2KR1PP/8 w - - 2 31",
+    "r1b1kb1r/pp3ppp/2np1n2/qN2p1B1/4P3/8/PPP2PPP/RN1QKB1R w KQkq - 4 9",
+    "r2r2k1/1p1b1pp1/p1npp2p/8/5P2/2N2N2/PPP3PP/2KR3R w - - 0 16",
+    # Endgames
+    "8/k7/3p4/p2P1p2/P2P1P2/8/8/K7 w - - 0 1",
+    "6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1"
+]
+
+# Higher is better for every compared metric
+COMPARED_METRICS = ["perft_nps", "evals_per_second", "batch_evals_per_second", "search_nps"]
+
+
+def bench_perft(fens, depth):
+    nodes = 0
+    start_time = time.perf_counter()
+    for fen in fens:
+        nodes += perft.perft(GameState(fen=fen), depth)
+    return nodes, time.perf_counter() - start_time
+
+
+def bench_eval(fens, repeats):
+    """Time the scalar evaluator, then the batch evaluator on the same positions."""
+    game_states = [GameState(fen=fen) for fen in fens]
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        for gs in game_states:
+            smart_move_finder.board_score_based_on_gamestate(gs)
+    scalar_time = time.perf_counter() - start_time
+
+    codes = batch_evaluator.encode_positions(game_states)
+    codes = codes.repeat(max(1, 100000 // len(codes)), axis=0)
+    start_time = time.perf_counter()
+    batch_evaluator.static_board_scores(codes)
+    batch_time = time.perf_counter() - start_time
+    return len(game_states) * repeats / scalar_time, len(codes) / batch_time
+
+
+def bench_search(fens, depth):
+    """Fixed-depth search of every position from a clean state, returns per position results."""
+    results = []
+    for fen in fens:
+        gs = GameState(fen=fen)
+        smart_move_finder.reset_search_state()
+        time_to_depth = {}
+
+        def record_iteration(info):
+            time_to_depth[info.depth] = info.time
+
+        best_move, _ = smart_move_finder.iterative_deepening(
+            gs, gs.get_all_valid_moves(), max_depth=depth, on_iteration=record_iteration
+        )
+        results.append({
+            "fen": fen,
+            "nodes": smart_move_finder.stats.nodes,
+            "evaluations": smart_move_finder.stats.evaluations,
+            "best_move": best_move.to_uci() if best_move else None,
+            "time_to_depth": time_to_depth
+        })
+    return results
+
+
+def run_bench(fens, perft_depth, search_depth, eval_repeats):
+    perft_nodes, perft_time = bench_perft(fens, perft_depth)
+    evals_per_second, batch_evals_per_second = bench_eval(fens, eval_repeats)
+    positions = bench_search(fens, search_depth)
+
+    search_nodes = sum(position["nodes"] for position in positions)
+    search_time = sum(position["time_to_depth"].get(search_depth, 0.0) for position in positions)
+    time_to_depth = {
+        depth: sum(position["time_to_depth"].get(depth, 0.0) for position in positions)
+        for depth in range(1, search_depth + 1)
+    }
+    return {
+        "python": platform.python_version(),
+        "positions_count": len(fens),
+        "perft_depth": perft_depth,
+        "search_depth": search_depth,
+        "perft_nodes": perft_nodes,
+        "perft_nps": perft_nodes / perft_time,
+        "evals_per_second": evals_per_second,
+        "batch_evals_per_second": batch_evals_per_second,
+        "search_nodes": search_nodes,
+        "search_nps": search_nodes / search_time if search_time else 0.0,
+        "time_to_depth": time_to_depth,
+        "signature": search_nodes,
+        "positions": positions
+    }
+
+
+def compare(results, baseline, threshold):
+    """Returns the messages of the metrics that regressed by more than threshold, as a fraction of the baseline."""
+    regressions = []
+    for metric in COMPARED_METRICS:
+        previous, current = baseline.get(metric), results[metric]
+        if previous and current < previous * (1 - threshold):
+            regressions.append(f"{metric}: {current:.0f} vs {previous:.0f} ({current / previous - 1:+.1%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark move generation, evaluation and search.")
+    parser.add_argument("--perft-depth", type=int, default=3)
+    parser.add_argument("--search-depth", type=int, default=3)
+    parser.add_argument("--eval-repeats", type=int, default=50, help="Times every position is evaluated")
+    parser.add_argument("--positions", type=int, help="Only bench the first positions")
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.05, help="Allowed slowdown before failing")
+    args = parser.parse_args()
+
+    smart_move_finder.USE_ANALYSIS_CACHE = False  # Results must come from the search being measured
+    fens = BENCH_FENS[:args.positions] if args.positions else BENCH_FENS
+    results = run_bench(fens, args.perft_depth, args.search_depth, args.eval_repeats)
+
+    print(f"Perft:  {results['perft_nodes']} nodes, {results['perft_nps']:.0f} nodes/s")
+    print(f"Eval:   {results['evals_per_second']:.0f} evals/s, batch {results['batch_evals_per_second']:.0f} evals/s")
+    print(f"Search: {results['search_nodes']} nodes, {results['search_nps']:.0f} nodes/s")
+    for depth, elapsed_time in results["time_to_depth"].items():
+        print(f"        depth {depth} reached in {elapsed_time:.2f}s")
+    print(f"Signature: {results['signature']}")
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        same_settings = all(baseline.get(key) == results[key] for key in ("positions_count", "perft_depth", "search_depth"))
+        if same_settings and baseline.get("signature") != results["signature"]:
+            print(f"Signature changed: {baseline.get('signature')} -> {results['signature']}, the search explores a different tree")
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"Regression {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regression beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,24 @@
+'''
+Castling rights are kept by GameState as 4 bits, the same bits index zobrist.CASTLING_KEYS.
+CastleRights is the readable view of them, for printing and callers outside the engine.
+'''
+
+WHITE_KING_SIDE = 1
+WHITE_QUEEN_SIDE = 2
+BLACK_KING_SIDE = 4
+BLACK_QUEEN_SIDE = 8
+ALL_CASTLING_RIGHTS = 15
+
+# Rights kept when a move starts or ends on a square, only king and rook home squares clear any
+CASTLING_RIGHTS_MASKS = [ALL_CASTLING_RIGHTS] * 64
+CASTLING_RIGHTS_MASKS[0] = ALL_CASTLING_RIGHTS & ~BLACK_QUEEN_SIDE  # a8
+CASTLING_RIGHTS_MASKS[4] = ALL_CASTLING_RIGHTS & ~(BLACK_KING_SIDE | BLACK_QUEEN_SIDE)  # e8
+CASTLING_RIGHTS_MASKS[7] = ALL_CASTLING_RIGHTS & ~BLACK_KING_SIDE  # h8
+CASTLING_RIGHTS_MASKS[56] = ALL_CASTLING_RIGHTS & ~WHITE_QUEEN_SIDE  # a1
+CASTLING_RIGHTS_MASKS[60] = ALL_CASTLING_RIGHTS & ~(WHITE_KING_SIDE | WHITE_QUEEN_SIDE)  # e1
+CASTLING_RIGHTS_MASKS[63] = ALL_CASTLING_RIGHTS & ~WHITE_KING_SIDE  # h1
+
+
 class CastleRights:
     def __init__(self, wKs, wQs, bKs, bQs):
         self.wKs = wKs
@@ -5,6 +26,14 @@ class CastleRights:
         self.bKs = bKs
         self.bQs = bQs
 
+    @classmethod
+    def from_bits(cls, bits):
+        return cls(bool(bits & WHITE_KING_SIDE), bool(bits & WHITE_QUEEN_SIDE),
+                   bool(bits & BLACK_KING_SIDE), bool(bits & BLACK_QUEEN_SIDE))
+
+    def to_bits(self):
+        return self.wKs * WHITE_KING_SIDE | self.wQs * WHITE_QUEEN_SIDE | self.bKs * BLACK_KING_SIDE | self.bQs * BLACK_QUEEN_SIDE
+
     def __eq__(self, other):
         if isinstance(other, CastleRights):
             return (self.wKs == other.wKs and self.wQs == other.wQs and
@@ -12,4 +41,4 @@ class CastleRights:
         return False
     
     def __repr__(self):
-        return f"CastleRights(wKs={self.wKs}, wQs={self.wQs}, bKs={self.bKs}, bQs={self.bQs})"
\ No newline at end of file
+        return f"CastleRights(wKs={self.wKs}, wQs={self.wQs}, bKs={self.bKs}, bQs={self.bQs})"
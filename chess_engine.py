@@ -1,15 +1,45 @@
-from constants import DIMENSION
-from castle_rights import CastleRights
+from constants import DIMENSION, PIECE_CODES, PIECE_SQUARE_SCORES, FIFTY_MOVE_RULE_HALF_MOVES, SEVENTY_FIVE_MOVE_RULE_HALF_MOVES
+from castle_rights import CastleRights, ALL_CASTLING_RIGHTS, WHITE_KING_SIDE, WHITE_QUEEN_SIDE, BLACK_KING_SIDE, BLACK_QUEEN_SIDE, CASTLING_RIGHTS_MASKS
 from pieces.pawn import Pawn
 from pieces.rook import Rook
 from pieces.knight import Knight
 from pieces.bishop import Bishop
 from pieces.queen import Queen
 from pieces.king import King
-from moves.move import Move
+from moves.move import Move, encode_move, NULL_MOVE, DOUBLE_PAWN_PUSH, KING_CASTLE, QUEEN_CASTLE, EN_PASSANT, PROMOTION, PROMOTION_PIECES
+import zobrist
+from attack_tables import KNIGHT_TARGETS, KING_TARGETS, RAYS, PAWN_ATTACKERS, PAWN_CAPTURES, BETWEEN, LINE, RAY_DIRECTIONS
+
+PIECE_TYPES = "PNBRQK"
+
+# Move generator of every piece type, called as generator(gs, square, moves). The pieces hold no state, one of each is enough
+MOVE_FUNCTIONS = {
+    "P": Pawn().get_moves,
+    "N": Knight().get_moves,
+    "B": Bishop().get_moves,
+    "R": Rook().get_moves,
+    "Q": Queen().get_moves,
+    "K": King().get_moves
+}
+
+# Undo records allocated up front, one per ply, more are added if a game outgrows them
+UNDO_RECORDS_COUNT = 256
+
+class SilentSound:
+    """Stand-in for a pygame sound when the GameState runs headless (search workers, offline tools)."""
+    def play(self):
+        pass
+
+SILENT_SOUNDS = {
+    "move_sound": SilentSound(),
+    "capture_sound": SilentSound(),
+    "castle_sound": SilentSound(),
+    "check_sound": SilentSound(),
+    "promotion_sound": SilentSound()
+}
 
 class GameState:
-    def __init__(self, sounds, fen=None):
+    def __init__(self, sounds=None, fen=None):
         # Create an empty board
         self.board = self.create_board()
 
@@ -18,31 +48,28 @@ class GameState:
         self.w_king_location = (7, 4)  # Default position (for initial setup)
         self.b_king_location = (0, 4)  # Default position (for initial setup)
         self.in_check = False
-        self.pinned_pieces = []
+        self.pinned_pieces = {}
         self.checks = []
         self.en_passant_possible_square = ()
-        self.en_passant_possible_square_log = [self.en_passant_possible_square]
-        self.current_castling_rights = CastleRights(True, True, True, True)
-        self.castling_rights_log = [
-            CastleRights(
-                self.current_castling_rights.wKs,
-                self.current_castling_rights.wQs,
-                self.current_castling_rights.bKs,
-                self.current_castling_rights.bQs
-            )
-        ]
+        self.castling_rights = ALL_CASTLING_RIGHTS  # Bits of castle_rights
         self.is_stale_mate = False
         self.is_check_mate = False
         self.is_draw_due_to_75mr = False
+        self.is_draw_due_to_repetition = False  # Fivefold repetition
 
         self.is_game_over = False
 
         self.half_moves_count = 0
-        self.half_moves_count_log = []  # New log for half moves count
 
         self.moves_count = 1
 
-        self.move_logs = []
+        self.move_logs = []  # Moves made with make_move, for display
+
+        # What make_move_code cannot recompute on undo, one record per ply:
+        # [code, piece captured, castling rights, en passant square, half moves count, hash,
+        #  piece square score, in check, pinned pieces, checks]
+        self.undo_records = [[None] * 10 for _ in range(UNDO_RECORDS_COUNT)]
+        self.ply = 0
 
         # Load from FEN if provided
         if fen:
@@ -50,16 +77,18 @@ class GameState:
         else:
             self.setup_initial_board()
 
-        self.move_functions = {
-            "P": lambda r, c, moves: Pawn().get_moves(self, r, c, moves),
-            "N": lambda r, c, moves: Knight().get_moves(self, r, c, moves),
-            "B": lambda r, c, moves: Bishop().get_moves(self, r, c, moves),
-            "R": lambda r, c, moves: Rook().get_moves(self, r, c, moves),
-            "Q": lambda r, c, moves: Queen().get_moves(self, r, c, moves),
-            "K": lambda r, c, moves: King().get_moves(self, r, c, moves)
-        }
+        # Zobrist hash and material plus piece-square score of the position, updated incrementally by make_move
+        self.hash = zobrist.hash_position(self)
+        self.piece_square_score = self.compute_piece_square_score()
+
+        # Squares (row * 8 + col) of every piece, per piece: "wN" -> {57, 62}, updated by make_move and undo
+        self.piece_squares = self.locate_pieces()
+        # Pieces on the board, kings included, so the search can tell when the tablebases apply
+        self.pieces_count = sum(len(squares) for squares in self.piece_squares.values())
 
         # Load sound effects
+        if sounds is None:
+            sounds = SILENT_SOUNDS
         self.move_sound = sounds["move_sound"]
         self.capture_sound = sounds["capture_sound"]
         self.castle_sound = sounds["castle_sound"]
@@ -90,6 +119,7 @@ class GameState:
         rows = parts[0].split('/')
 
         # Load board configuration
+        self.board = self.create_board()
         for r in range(DIMENSION):
             c = 0
             for char in rows[r]:
@@ -104,21 +134,18 @@ class GameState:
         self.white_to_move = parts[1] == 'w'
 
         # Set castling rights and en passant
-        self.current_castling_rights = self.parse_castling_rights(parts[2])
+        self.castling_rights = self.parse_castling_rights(parts[2])
         self.en_passant_possible_square = self.parse_en_passant(parts[3])
 
-        # Set half moves count and moves count
-        self.half_moves_count = int(parts[4])
-        self.moves_count = int(parts[5])
+        # Set half moves count and moves count, both are optional
+        self.half_moves_count = int(parts[4]) if len(parts) > 4 else 0
+        self.moves_count = int(parts[5]) if len(parts) > 5 else 1
 
         # Update kings' positions based on the FEN
         self.update_king_locations()
 
         # Check for any initial checks or pins
         self.in_check, self.pinned_pieces, self.checks = self.check_for_pins_and_checks()
-        
-        # Print the relevant state information
-        self.print_self_data()
 
     def fen_char_to_piece(self, char):
         """Convert a FEN character to the internal piece notation."""
@@ -129,11 +156,8 @@ class GameState:
 
     def parse_castling_rights(self, castling_rights):
         """Parse the castling rights from the FEN string."""
-        wKs = 'K' in castling_rights
-        wQs = 'Q' in castling_rights
-        bKs = 'k' in castling_rights
-        bQs = 'q' in castling_rights
-        return CastleRights(wKs, wQs, bKs, bQs)
+        return ('K' in castling_rights) * WHITE_KING_SIDE | ('Q' in castling_rights) * WHITE_QUEEN_SIDE \
+            | ('k' in castling_rights) * BLACK_KING_SIDE | ('q' in castling_rights) * BLACK_QUEEN_SIDE
 
     def parse_en_passant(self, en_passant):
         """Parse the en passant target square from the FEN string."""
@@ -144,6 +168,58 @@ class GameState:
             row = 8 - int(en_passant[1])
             return (row, col)
 
+    def to_fen(self):
+        """Write the current position as a FEN string."""
+        rows = []
+        for r in range(DIMENSION):
+            row = ""
+            empty_count = 0
+            for square in self.board[r]:
+                if square == "--":
+                    empty_count += 1
+                    continue
+                if empty_count:
+                    row += str(empty_count)
+                    empty_count = 0
+                row += square[1] if square[0] == "w" else square[1].lower()
+            rows.append(row + (str(empty_count) if empty_count else ""))
+
+        rights = self.castling_rights
+        castling_rights = ("K" if rights & WHITE_KING_SIDE else "") + ("Q" if rights & WHITE_QUEEN_SIDE else "") \
+            + ("k" if rights & BLACK_KING_SIDE else "") + ("q" if rights & BLACK_QUEEN_SIDE else "")
+        if self.en_passant_possible_square:
+            row, col = self.en_passant_possible_square
+            en_passant = chr(ord('a') + col) + str(8 - row)
+        else:
+            en_passant = "-"
+        return f"{'/'.join(rows)} {'w' if self.white_to_move else 'b'} {castling_rights or '-'} {en_passant} " \
+               f"{self.half_moves_count} {self.moves_count}"
+
+    @property
+    def current_castling_rights(self):
+        """The castling rights as a CastleRights, a copy: the engine only reads and writes the bits."""
+        return CastleRights.from_bits(self.castling_rights)
+
+    def compute_piece_square_score(self):
+        """Material and piece-square score from white's point of view, computed from scratch."""
+        score = 0
+        for row in range(DIMENSION):
+            for col in range(DIMENSION):
+                square = self.board[row][col]
+                if square != "--":
+                    score += PIECE_SQUARE_SCORES[PIECE_CODES[square]][row * DIMENSION + col]
+        return score
+
+    def locate_pieces(self):
+        """Find the squares of every piece on the board, for the piece lists."""
+        piece_squares = {color + piece_type: set() for color in "wb" for piece_type in PIECE_TYPES}
+        for row in range(DIMENSION):
+            for col in range(DIMENSION):
+                square = self.board[row][col]
+                if square != "--":
+                    piece_squares[square].add(row * DIMENSION + col)
+        return piece_squares
+
     def print_self_data(self):
         print(f"White to move: {self.white_to_move}")
         print(f"Current castling rights: {self.current_castling_rights}")
@@ -164,191 +240,356 @@ class GameState:
                     self.b_king_location = (r, c)
 
     def make_move(self, move):
-        """Execute a move and update the board."""
-        self.half_moves_count_log.append(self.half_moves_count)
+        """Execute a Move and update the board, the move is kept in move_logs."""
+        self.make_move_code(move.code)
+        self.move_logs.append(move)
 
-        # Execute the move
-        self.board[move.start_row][move.start_col] = "--"
-        self.board[move.end_row][move.end_col] = move.piece_moved
+        # Draws declared without a claim: 75 moves without capture or pawn move, fivefold repetition
+        if self.half_moves_count >= SEVENTY_FIVE_MOVE_RULE_HALF_MOVES:
+            self.is_draw_due_to_75mr = True
+            self.is_game_over = True
+        if self.repetition_count() >= 4:
+            self.is_draw_due_to_repetition = True
+            self.is_game_over = True
 
-        # Play sound effects
-        if move.piece_captured != "--":
-            self.capture_sound.play()  # Play capture sound
+    def repetition_count(self, limit=None):
+        """
+        How many times the current position occurred before, counting stops at limit. Only positions since the
+        last capture, pawn move or move from the FEN are compared, earlier ones cannot come back. The hashes are
+        those of the undo records.
+        """
+        records = self.undo_records
+        first_ply = max(self.ply - self.half_moves_count, 0)
+        count = 0
+        for ply in range(self.ply - 4, first_ply - 1, -2):  # Returning to a position takes at least 4 half moves
+            if records[ply][5] == self.hash:
+                count += 1
+                if count == limit:
+                    break
+        return count
+
+    def is_repetition(self):
+        """True when the current position occurred before, which the search scores as a draw."""
+        return self.repetition_count(1) > 0
+
+    def can_claim_draw(self):
+        """Threefold repetition or fifty moves without capture or pawn move."""
+        return self.half_moves_count >= FIFTY_MOVE_RULE_HALF_MOVES or self.repetition_count() >= 2
+
+    def has_insufficient_material(self):
+        """Neither side can mate: bare kings, a single knight or bishop, or only bishops all on one square color."""
+        minor_squares = []
+        for piece, squares in self.piece_squares.items():
+            if piece[1] in "PRQ" and squares:
+                return False
+            if piece[1] in "NB":
+                minor_squares.extend((piece[1], square) for square in squares)
+        if len(minor_squares) <= 1:
+            return True
+        square_colors = {((square >> 3) + (square & 7)) & 1 for _, square in minor_squares}
+        return all(piece_type == "B" for piece_type, _ in minor_squares) and len(square_colors) == 1
+
+    def make_move_code(self, code):
+        """Execute a move code, the engine's internal counterpart of make_move."""
+        start_square = code & 63
+        end_square = code >> 6 & 63
+        flags = code >> 12
+        start_row, start_col = start_square >> 3, start_square & 7
+        end_row, end_col = end_square >> 3, end_square & 7
+        board = self.board
+        piece_moved = board[start_row][start_col]
+        if flags == EN_PASSANT:
+            piece_captured = board[start_row][end_col]
         else:
-            self.move_sound.play()  # Play move sound
+            piece_captured = board[end_row][end_col]
+
+        # Save what the undo restores, in the preallocated record of this ply
+        if self.ply == len(self.undo_records):
+            self.undo_records.append([None] * 10)
+        record = self.undo_records[self.ply]
+        record[0] = code
+        record[1] = piece_captured
+        record[2] = self.castling_rights
+        record[3] = self.en_passant_possible_square
+        record[4] = self.half_moves_count
+        record[5] = self.hash
+        record[6] = self.piece_square_score
+        record[7] = self.in_check
+        record[8] = self.pinned_pieces
+        record[9] = self.checks
+        self.ply += 1
+
+        piece_keys = zobrist.PIECE_KEYS
+        position_hash = self.hash ^ zobrist.CASTLING_KEYS[self.castling_rights] \
+            ^ zobrist.en_passant_key(board, self.en_passant_possible_square, self.white_to_move)
+        piece_square_score = self.piece_square_score
+
+        # Execute the move
+        board[start_row][start_col] = "--"
+        board[end_row][end_col] = piece_moved
 
         # Handle pawn promotion
-        if move.is_pawn_promotion:
-            self.promotion_sound.play()  # Play promotion sound
-            self.board[move.end_row][move.end_col] = move.piece_moved[0] + "Q"
+        if flags & PROMOTION:
+            board[end_row][end_col] = piece_moved[0] + PROMOTION_PIECES[flags & 3]
+
+        piece_landed = board[end_row][end_col]
+        moved_code = PIECE_CODES[piece_moved]
+        landed_code = PIECE_CODES[piece_landed]
+        position_hash ^= piece_keys[moved_code][start_square] ^ piece_keys[landed_code][end_square]
+        piece_square_score += PIECE_SQUARE_SCORES[landed_code][end_square] - PIECE_SQUARE_SCORES[moved_code][start_square]
+        piece_squares = self.piece_squares
+        if piece_captured != "--":
+            captured_square = start_row * DIMENSION + end_col if flags == EN_PASSANT else end_square
+            captured_code = PIECE_CODES[piece_captured]
+            position_hash ^= piece_keys[captured_code][captured_square]
+            piece_square_score -= PIECE_SQUARE_SCORES[captured_code][captured_square]
+            piece_squares[piece_captured].remove(captured_square)
+            self.pieces_count -= 1
+        piece_squares[piece_moved].remove(start_square)
+        piece_squares[piece_landed].add(end_square)
 
         # Update kings' location
-        if move.piece_moved == "wK":
-            self.w_king_location = (move.end_row, move.end_col)
-        elif move.piece_moved == "bK":
-            self.b_king_location = (move.end_row, move.end_col)
+        if piece_moved == "wK":
+            self.w_king_location = (end_row, end_col)
+        elif piece_moved == "bK":
+            self.b_king_location = (end_row, end_col)
 
         # Update other game states
-        if move.piece_moved[1] == "P" or move.piece_captured != "--":
+        if piece_moved[1] == "P" or piece_captured != "--":
             self.half_moves_count = 0
         else:
             self.half_moves_count += 1
 
-        # Handle 75-move rule
-        if self.half_moves_count >= 75:
-            self.is_stale_mate = True
-            self.is_game_over = True
-            print("75-move rule reached: Game is a draw.")
+        if not self.white_to_move:
+            self.moves_count += 1
 
         # Handle En Passant Move
-        if move.is_en_passant_move:
-            self.board[move.start_row][move.end_col] = "--"
+        if flags == EN_PASSANT:
+            board[start_row][end_col] = "--"
 
         # Handle castling move
-        if move.is_castling:
-            self.castle_sound.play()  # Play castling sound
-
-            if move.end_col - move.start_col == 2:  # King Side Castling
-                self.board[move.end_row][move.end_col - 1] = self.board[move.end_row][move.end_col + 1]
-                self.board[move.end_row][move.end_col + 1] = "--"
-            else:  # Queen Side Castling
-                self.board[move.end_row][move.end_col + 1] = self.board[move.end_row][move.end_col - 2]
-                self.board[move.end_row][move.end_col - 2] = "--"
-
-        # Update castling rights
-        self.update_castling_rights(move)
-        self.castling_rights_log.append(
-            CastleRights(
-                self.current_castling_rights.wKs, self.current_castling_rights.wQs,
-                self.current_castling_rights.bKs, self.current_castling_rights.bQs
-            )
-        )
+        if flags == KING_CASTLE or flags == QUEEN_CASTLE:
+            if flags == KING_CASTLE:
+                rook_start_col, rook_end_col = end_col + 1, end_col - 1
+            else:
+                rook_start_col, rook_end_col = end_col - 2, end_col + 1
+            rook = board[end_row][rook_start_col]
+            board[end_row][rook_end_col] = rook
+            board[end_row][rook_start_col] = "--"
+            rook_code = PIECE_CODES[rook]
+            rook_start_square = end_row * DIMENSION + rook_start_col
+            rook_end_square = end_row * DIMENSION + rook_end_col
+            position_hash ^= piece_keys[rook_code][rook_start_square] ^ piece_keys[rook_code][rook_end_square]
+            piece_square_score += PIECE_SQUARE_SCORES[rook_code][rook_end_square] - PIECE_SQUARE_SCORES[rook_code][rook_start_square]
+            rook_squares = piece_squares[rook]
+            rook_squares.remove(rook_start_square)
+            rook_squares.add(rook_end_square)
+
+        # Update castling rights, moving from or to a king or rook home square clears its rights
+        self.castling_rights &= CASTLING_RIGHTS_MASKS[start_square] & CASTLING_RIGHTS_MASKS[end_square]
 
         # Update en passant possible square
-        if move.piece_moved[1] == "P" and abs(move.start_row - move.end_row) == 2:
-            self.en_passant_possible_square = ((move.start_row + move.end_row) // 2, move.start_col)
+        if flags == DOUBLE_PAWN_PUSH:
+            self.en_passant_possible_square = ((start_row + end_row) // 2, start_col)
         else:
             self.en_passant_possible_square = ()
 
-        self.en_passant_possible_square_log.append(self.en_passant_possible_square)
-
         # Switch player's turn
         self.white_to_move = not self.white_to_move
 
-        # Check for check and checkmate
+        self.hash = position_hash ^ zobrist.WHITE_TO_MOVE_KEY ^ zobrist.CASTLING_KEYS[self.castling_rights] \
+            ^ zobrist.en_passant_key(board, self.en_passant_possible_square, self.white_to_move)
+        self.piece_square_score = piece_square_score
+
+        # Check for check, checkmate and stalemate are set by get_all_valid_moves
         self.in_check, self.pinned_pieces, self.checks = self.check_for_pins_and_checks()
-        if self.in_check:
-            self.check_sound.play()  # Play check sound
-            if self.get_all_valid_moves() == []:
-                self.is_check_mate = True
-        elif self.is_check_mate:
-            # Optionally play checkmate sound
-            pass
 
-        # Check for stalemate
-        if not self.is_check_mate and self.get_all_valid_moves() == []:
-            self.is_stale_mate = True
-            # Optionally play stalemate sound
+    def play_move_sounds(self, move):
+        """Play the sound effects of the move that was just made."""
+        if move.piece_captured != "--":
+            self.capture_sound.play()  # Play capture sound
+        else:
+            self.move_sound.play()  # Play move sound
 
-        self.move_logs.append(move)
+        if move.is_pawn_promotion:
+            self.promotion_sound.play()  # Play promotion sound
+
+        if move.is_castling:
+            self.castle_sound.play()  # Play castling sound
+
+        if self.in_check:
+            self.check_sound.play()  # Play check sound
    
     def undo_last_move(self):
-        """Undo the last move made."""
+        """Undo the last move made with make_move."""
         if len(self.move_logs) != 0:
-            last_move = self.move_logs.pop()
-
-            # Decrement moves_count on whites turns
-            if self.white_to_move:
-                self.moves_count -= 1
-
-            self.board[last_move.end_row][last_move.end_col] = last_move.piece_captured
-            self.board[last_move.start_row][last_move.start_col] = last_move.piece_moved
-
-            # Update the king's location if moved
-            if last_move.piece_moved == "wK":
-                self.w_king_location = (last_move.start_row, last_move.start_col)
-            elif last_move.piece_moved == "bK":
-                self.b_king_location = (last_move.start_row, last_move.start_col)
-
-            if last_move.is_en_passant_move:
-                self.board[last_move.end_row][last_move.end_col] = "--"
-                self.board[last_move.start_row][last_move.end_col] = last_move.piece_captured
-
-            self.en_passant_possible_square_log.pop() # Remove lastly created en passant log 
-            self.en_passant_possible_square = self.en_passant_possible_square_log[-1] # Set it back to it's previous state
-
-            # Restore castling rights
-            self.castling_rights_log.pop()  # Remove the most recent castling rights
-            self.current_castling_rights = self.castling_rights_log[-1]  # Restore previous castling rights
-
-            # Undo castling move
-            if last_move.is_castling:
-                if last_move.end_col - last_move.start_col == 2:  # King Side Castling
-                    self.board[last_move.end_row][last_move.end_col + 1] = self.board[last_move.end_row][last_move.end_col - 1]  # Restore the rook
-                    self.board[last_move.end_row][last_move.end_col - 1] = "--"  # Remove the rook from the new position
-                else:  # Queen Side Castling
-                    self.board[last_move.end_row][last_move.end_col - 2] = self.board[last_move.end_row][last_move.end_col + 1]  # Restore the rook
-                    self.board[last_move.end_row][last_move.end_col + 1] = "--"  # Remove the rook from the new position
-
-            # Adjust 75-move rule counter
-            self.half_moves_count = self.half_moves_count_log.pop()  # Reset counter
-
-            # Restore any other game state variables
-            self.in_check, self.pinned_pieces, self.checks = self.check_for_pins_and_checks()
-
-            self.checkmate = False
-            self.stalemate = False
-            self.is_draw_due_to_75mr = False
+            self.move_logs.pop()
+            self.undo_move_code()
+
+    def undo_move_code(self):
+        """Undo the last move made with make_move_code, restoring the state saved in its record."""
+        self.ply -= 1
+        code, piece_captured, self.castling_rights, self.en_passant_possible_square, self.half_moves_count, \
+            self.hash, self.piece_square_score, self.in_check, self.pinned_pieces, self.checks = self.undo_records[self.ply]
+        start_square = code & 63
+        end_square = code >> 6 & 63
+        flags = code >> 12
+        start_row, start_col = start_square >> 3, start_square & 7
+        end_row, end_col = end_square >> 3, end_square & 7
+        board = self.board
+        piece_squares = self.piece_squares
+        piece_moved = board[end_row][end_col]
+        piece_squares[piece_moved].remove(end_square)
+        if flags & PROMOTION:
+            piece_moved = piece_moved[0] + "P"
+        piece_squares[piece_moved].add(start_square)
+
+        # Decrement moves_count on whites turns
+        if self.white_to_move:
+            self.moves_count -= 1
+
+        board[start_row][start_col] = piece_moved
+        if flags == EN_PASSANT:
+            board[end_row][end_col] = "--"
+            board[start_row][end_col] = piece_captured
+            piece_squares[piece_captured].add(start_row * DIMENSION + end_col)
+            self.pieces_count += 1
+        else:
+            board[end_row][end_col] = piece_captured
+            if piece_captured != "--":
+                piece_squares[piece_captured].add(end_square)
+                self.pieces_count += 1
+
+        # Update the king's location if moved
+        if piece_moved == "wK":
+            self.w_king_location = (start_row, start_col)
+        elif piece_moved == "bK":
+            self.b_king_location = (start_row, start_col)
+
+        # Undo castling move
+        if flags == KING_CASTLE or flags == QUEEN_CASTLE:
+            if flags == KING_CASTLE:
+                rook_start_col, rook_end_col = end_col + 1, end_col - 1
+            else:
+                rook_start_col, rook_end_col = end_col - 2, end_col + 1
+            rook = board[end_row][rook_end_col]
+            board[end_row][rook_start_col] = rook  # Restore the rook
+            board[end_row][rook_end_col] = "--"  # Remove the rook from the new position
+            rook_squares = piece_squares[rook]
+            rook_squares.remove(end_row * DIMENSION + rook_end_col)
+            rook_squares.add(end_row * DIMENSION + rook_start_col)
+
+        # Next player's turn
+        self.white_to_move = not self.white_to_move
 
-            # Next player's turn
-            self.white_to_move = not self.white_to_move
+        self.is_check_mate = False
+        self.is_stale_mate = False
+        self.is_draw_due_to_75mr = False
+        self.is_draw_due_to_repetition = False
+        self.is_game_over = False
 
-    def update_castling_rights(self, move):
+    def make_null_move(self):
         """
-        Update the castling rights based on the move.
+        Pass the turn, for null-move pruning: the side to move changes and the en passant square is cleared.
+        Never call it in check. The null move counts as irreversible, so repetitions are not matched across it.
         """
-        if move.piece_moved == "wK":
-            self.current_castling_rights.wKs = False
-            self.current_castling_rights.wQs = False
-        elif move.piece_moved == "bK":
-            self.current_castling_rights.bKs = False
-            self.current_castling_rights.bQs = False
-        elif move.piece_moved == "wR":
-            self.disable_white_rook_castling_rights(move.start_row, move.start_col)
-        elif move.piece_moved == "bR":
-            self.disable_black_rook_castling_rights(move.start_row, move.start_col)
-        
-        if move.piece_captured == "wR":
-            self.disable_white_rook_castling_rights(move.end_row, move.end_col)
-        elif move.piece_captured == "bR":
-            self.disable_black_rook_castling_rights(move.end_row, move.end_col)
-
-    def disable_white_rook_castling_rights(self, row, col):
-        """
-        Disable white rook castling rights based on its position.
-        """
-        if row == 7:
-            if col == 0:  # Left Rook
-                self.current_castling_rights.wQs = False
-            elif col == 7:  # Right Rook
-                self.current_castling_rights.wKs = False
+        if self.ply == len(self.undo_records):
+            self.undo_records.append([None] * 10)
+        record = self.undo_records[self.ply]
+        record[0] = NULL_MOVE
+        record[1] = "--"
+        record[2] = self.castling_rights
+        record[3] = self.en_passant_possible_square
+        record[4] = self.half_moves_count
+        record[5] = self.hash
+        record[6] = self.piece_square_score
+        record[7] = self.in_check
+        record[8] = self.pinned_pieces
+        record[9] = self.checks
+        self.ply += 1
+
+        self.hash ^= zobrist.WHITE_TO_MOVE_KEY ^ zobrist.en_passant_key(self.board, self.en_passant_possible_square, self.white_to_move)
+        self.en_passant_possible_square = ()
+        self.half_moves_count = 0
+        self.white_to_move = not self.white_to_move
+        self.in_check, self.pinned_pieces, self.checks = self.check_for_pins_and_checks()
+
+    def undo_null_move(self):
+        """Undo the last move made with make_null_move."""
+        self.ply -= 1
+        _, _, self.castling_rights, self.en_passant_possible_square, self.half_moves_count, \
+            self.hash, self.piece_square_score, self.in_check, self.pinned_pieces, self.checks = self.undo_records[self.ply]
+        self.white_to_move = not self.white_to_move
 
-    def disable_black_rook_castling_rights(self, row, col):
+    def gives_check(self, code):
         """
-        Disable black rook castling rights based on its position.
+        Whether a move code of the side to move checks the enemy king, without making it. Looks for a direct check
+        of the piece on its end square and for a discovered check of a slider behind its start square.
+        Castling and en passant, which move two pieces, are made and undone instead.
         """
-        if row == 0:
-            if col == 0:  # Left Rook
-                self.current_castling_rights.bQs = False
-            elif col == 7:  # Right Rook
-                self.current_castling_rights.bKs = False
+        flags = code >> 12
+        if flags == KING_CASTLE or flags == QUEEN_CASTLE or flags == EN_PASSANT:
+            self.make_move_code(code)
+            in_check = self.in_check
+            self.undo_move_code()
+            return in_check
+
+        board = self.board
+        start_square = code & 63
+        end_square = code >> 6 & 63
+        ally_color = "w" if self.white_to_move else "b"
+        king_row, king_col = self.b_king_location if self.white_to_move else self.w_king_location
+        king_square = king_row * 8 + king_col
+        piece_type = PROMOTION_PIECES[flags & 3] if flags & PROMOTION else board[start_square >> 3][start_square & 7][1]
+
+        # Direct check from the end square
+        if piece_type == "N":
+            if any(square == king_square for _, _, square in KNIGHT_TARGETS[end_square]):
+                return True
+        elif piece_type == "P":
+            if any(square == king_square for _, _, square in PAWN_CAPTURES[ally_color][end_square]):
+                return True
+        elif piece_type != "K":
+            direction = RAY_DIRECTIONS[king_square][end_square]
+            if direction != -1 and (piece_type == "Q" or (piece_type == "R") == (direction < 4)):
+                if self.ray_clear_up_to(king_square, direction, end_square, start_square):
+                    return True
+
+        # Discovered check: the piece leaves the line between the king and one of our sliders
+        direction = RAY_DIRECTIONS[king_square][start_square]
+        if direction == -1 or LINE[king_square][start_square] >> end_square & 1:
+            return False
+        passed_start_square = False
+        slider = ally_color + ("R" if direction < 4 else "B")
+        for row, col, square in RAYS[king_square][direction]:
+            if square == start_square:
+                passed_start_square = True
+                continue
+            end_piece = board[row][col]
+            if end_piece != "--":
+                return passed_start_square and (end_piece == slider or end_piece == ally_color + "Q")
+        return False
+
+    def ray_clear_up_to(self, from_square, direction, to_square, vacated_square):
+        """Whether the squares between from_square and to_square along direction are empty, vacated_square counting as empty."""
+        board = self.board
+        for row, col, square in RAYS[from_square][direction]:
+            if square == to_square:
+                return True
+            if square != vacated_square and board[row][col] != "--":
+                return False
+        return False
 
     def get_all_valid_moves(self):
+        """Legal moves of the side to move as Move objects, for callers outside the engine."""
+        return [Move.from_code(code, self.board) for code in self.get_valid_move_codes()]
+
+    def get_valid_move_codes(self):
+        """Legal moves of the side to move as move codes, sets the checkmate and stalemate flags."""
         temp_en_passant_possible_square = self.en_passant_possible_square
-        temp_castle_rights = CastleRights(self.current_castling_rights.wKs, self.current_castling_rights.wQs,
-                                          self.current_castling_rights.bKs, self.current_castling_rights.bQs)
+        temp_castle_rights = self.castling_rights
 
-        self.in_check, self.pinned_pieces, self.checks = self.check_for_pins_and_checks()
+        # in_check, pinned_pieces and checks are current: set by make_move and the FEN loader, restored by undo
         valid_moves = []
 
         if self.white_to_move:
@@ -362,32 +603,21 @@ class GameState:
             if len(self.checks) == 1: # If theres only one check, block check or move king
                 valid_moves = self.get_all_possible_moves()
 
-                #To block a chess you either move or block one of the square between king and piece
-                check = self.checks[0] # Get check data
-                check_row = check[0]
-                check_col = check[1]
-                piece_checking = self.board[check_row][check_col]
-                valid_squares = []
-
-                #if the piece checking is a knight then you capture it or move
-                if piece_checking[1] == "N":
-                    valid_squares = [(check_row, check_col)]
-                else: # Piece checking is not a knight
-                    for i in range(1,8):
-                        valid_square = (K_row + check[2] * i, K_col + check[3] * i)
-                        valid_squares.append(valid_square)
-                        if valid_square[0] == check_row and valid_square[1] == check_col: #stop once you get to the piece that end checks 
-                            break
+                #To block a check you either capture the checking piece or move to a square between it and the king
+                check_square, valid_squares = self.checks[0]
+                king_square = K_row * 8 + K_col
+
                 #Get rid of the moves that don't block check or move the king 
                 for i in range(len(valid_moves) -1, -1, -1): 
-                    if valid_moves[i].piece_moved[1] != "K": #Not moving the king, so move has to block or capture 
-                        if not (valid_moves[i].end_row, valid_moves[i].end_col) in valid_squares:
-                            valid_moves.remove(valid_moves[i])
+                    code = valid_moves[i]
+                    start_square = code & 63
+                    end_square = code >> 6 & 63
+                    if start_square != king_square and not valid_squares >> end_square & 1: #Not moving the king, so move has to block or capture 
+                        # En passant captures a checking pawn without landing on its square
+                        if not (code >> 12 == EN_PASSANT and (start_square & 56) + (end_square & 7) == check_square):
+                            del valid_moves[i]
             else: # Double check -> King has to move
-                color = "w" if self.white_to_move else "b"
-                K_row, K_col = self.w_king_location if color == "w" else self.b_king_location
-                king_instance = King()
-                king_instance.get_moves(self, K_row, K_col, valid_moves)
+                MOVE_FUNCTIONS["K"](self, K_row * 8 + K_col, valid_moves)
 
         else:  # Not in check then all moves are valid ! 
             valid_moves = self.get_all_possible_moves()
@@ -398,7 +628,7 @@ class GameState:
         #If no valid move and check -> check_mate 
         #If no valid move and ! check -> stale_mate 
         if len(valid_moves) == 0:
-            if self.is_in_check():
+            if self.in_check:
                 self.is_check_mate = True
             else:
                 self.is_stale_mate = True
@@ -407,7 +637,7 @@ class GameState:
             self.is_stale_mate = False
 
         self.en_passant_possible_square = temp_en_passant_possible_square
-        self.current_castling_rights = temp_castle_rights
+        self.castling_rights = temp_castle_rights
 
         return valid_moves
 
@@ -420,89 +650,102 @@ class GameState:
 
     def is_square_under_attack(self, r, c):
         """Determine if a given square is under attack by the opponent."""
-        self.white_to_move = not self.white_to_move
-        opponent_moves = self.get_all_possible_moves()
-        self.white_to_move = not self.white_to_move
+        return self.is_square_attacked(r, c, not self.white_to_move)
+
+    def is_square_attacked(self, r, c, by_white):
+        """Determine if a square is attacked by the pieces of a color, looking outwards from the square."""
+        enemy_color = "w" if by_white else "b"
+        board = self.board
+        square = r * 8 + c
 
-        for move in opponent_moves:
-            if move.end_row == r and move.end_col == c:
+        enemy_pawn = enemy_color + "P"
+        for row, col, _ in PAWN_ATTACKERS[enemy_color][square]:
+            if board[row][col] == enemy_pawn:
                 return True
+
+        enemy_knight = enemy_color + "N"
+        for row, col, _ in KNIGHT_TARGETS[square]:
+            if board[row][col] == enemy_knight:
+                return True
+
+        enemy_king = enemy_color + "K"
+        for row, col, _ in KING_TARGETS[square]:
+            if board[row][col] == enemy_king:
+                return True
+
+        # Sliders, orthogonal directions first
+        enemy_queen = enemy_color + "Q"
+        rays = RAYS[square]
+        for j in range(8):
+            enemy_slider = enemy_color + ("R" if j < 4 else "B")
+            for row, col, _ in rays[j]:
+                end_piece = board[row][col]
+                if end_piece != "--":
+                    if end_piece == enemy_slider or end_piece == enemy_queen:
+                        return True
+                    break
         return False
 
     def get_all_possible_moves(self):
+        """Pseudo-legal moves of the pieces of the side to move, found through the piece lists."""
         moves = []
-        for r in range(len(self.board)):
-            for c in range(len(self.board[r])):
-                piece = self.board[r][c]
-                if piece != "--":
-                    color_to_play = piece[0]
-                    piece_type = piece[1]
-                    if (color_to_play == "w" and self.white_to_move) or (color_to_play == "b" and not self.white_to_move):
-                        self.move_functions[piece_type](r, c, moves)
+        color = "w" if self.white_to_move else "b"
+        for piece_type in PIECE_TYPES:
+            move_function = MOVE_FUNCTIONS[piece_type]
+            for square in self.piece_squares[color + piece_type]:
+                move_function(self, square, moves)
         return moves
     
     def check_for_pins_and_checks(self):
-        pinned_pieces = []  # squares pinned and the direction its pinned from
-        checks = []  # squares where enemy is applying a check
+        """
+        Look outwards from the king of the side to move for checks and pins. Returns in_check,
+        pinned_pieces as {square: line the piece may move on} and checks as [(checking square, squares blocking it)],
+        with lines and blocking squares as attack_tables bitmasks.
+        """
+        pinned_pieces = {}
+        checks = []
         in_check = False
+        board = self.board
         if self.white_to_move:
             enemy_color = "b"
             ally_color = "w"
-            start_row = self.w_king_location[0]
-            start_col = self.w_king_location[1]
+            king_row, king_col = self.w_king_location
         else:
             enemy_color = "w"
             ally_color = "b"
-            start_row = self.b_king_location[0]
-            start_col = self.b_king_location[1]
-        # check outwards from king for pins and checks, keep track of pins
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
-        for j in range(len(directions)):
-            direction = directions[j]
-            possible_pin = ()  # reset possible pins
-            for i in range(1, 8):
-                end_row = start_row + direction[0] * i
-                end_col = start_col + direction[1] * i
-                if 0 <= end_row <= 7 and 0 <= end_col <= 7:
-                    end_piece = self.board[end_row][end_col]
-                    if end_piece[0] == ally_color and end_piece[1] != "K":
-                        if possible_pin == ():  # first allied piece could be pinned
-                            possible_pin = (end_row, end_col, direction[0], direction[1])
-                        else:  # 2nd allied piece - no check or pin from this direction
-                            break
-                    elif end_piece[0] == enemy_color:
-                        enemy_type = end_piece[1]
-                        # 5 possibilities in this complex conditional
-                        # 1.) orthogonally away from king and piece is a rook
-                        # 2.) diagonally away from king and piece is a bishop
-                        # 3.) 1 square away diagonally from king and piece is a pawn
-                        # 4.) any direction and piece is a queen
-                        # 5.) any direction 1 square away and piece is a king
-                        if (0 <= j <= 3 and enemy_type == "R") or (4 <= j <= 7 and enemy_type == "B") or (
-                                i == 1 and enemy_type == "P" and (
-                                (enemy_color == "w" and 6 <= j <= 7) or (enemy_color == "b" and 4 <= j <= 5))) or (
-                                enemy_type == "Q") or (i == 1 and enemy_type == "K"):
-                            if possible_pin == ():  # no piece blocking, so check
-                                in_check = True
-                                checks.append((end_row, end_col, direction[0], direction[1]))
-                                break
-                            else:  # piece blocking so pin
-                                pinned_pieces.append(possible_pin)
-                                break
-                        else:  # enemy piece not applying checks
-                            break
-                else:
-                    break  # off board
-        # check for knight checks
-        knight_moves = ((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2), (1, -2))
-        for move in knight_moves:
-            end_row = start_row + move[0]
-            end_col = start_col + move[1]
-            if 0 <= end_row <= 7 and 0 <= end_col <= 7:
-                end_piece = self.board[end_row][end_col]
-                if end_piece[0] == enemy_color and end_piece[1] == "N":  # enemy knight attacking a king
-                    in_check = True
-                    checks.append((end_row, end_col, move[0], move[1]))
+            king_row, king_col = self.b_king_location
+        king_square = king_row * 8 + king_col
+
+        # Enemy pawns attack the king from the two diagonals in front of it
+        pawn_directions = (4, 5) if enemy_color == "b" else (6, 7)
+        rays = RAYS[king_square]
+        for j in range(8):
+            possible_pin = None  # Square of the first allied piece met
+            for i, (row, col, square) in enumerate(rays[j]):
+                end_piece = board[row][col]
+                if end_piece == "--":
+                    continue
+                if end_piece[0] == ally_color and end_piece[1] != "K":
+                    if possible_pin is None:  # first allied piece could be pinned
+                        possible_pin = square
+                        continue
+                    break  # 2nd allied piece - no check or pin from this direction
+                if end_piece[0] == enemy_color:
+                    enemy_type = end_piece[1]
+                    if (j < 4 and enemy_type == "R") or (j >= 4 and enemy_type == "B") or enemy_type == "Q" or (
+                            i == 0 and ((enemy_type == "P" and j in pawn_directions) or enemy_type == "K")):
+                        if possible_pin is None:  # no piece blocking, so check
+                            in_check = True
+                            checks.append((square, BETWEEN[king_square][square] | 1 << square))
+                        else:  # piece blocking so pin
+                            pinned_pieces[possible_pin] = LINE[king_square][possible_pin]
+                break
+
+        enemy_knight = enemy_color + "N"
+        for row, col, square in KNIGHT_TARGETS[king_square]:
+            if board[row][col] == enemy_knight:  # enemy knight attacking a king
+                in_check = True
+                checks.append((square, 1 << square))
 
         return in_check, pinned_pieces, checks
     
@@ -510,9 +753,9 @@ class GameState:
     def get_castle_moves(self, r, c, moves):
         if self.is_square_under_attack(r, c):
             return 
-        if (self.white_to_move and self.current_castling_rights.wKs) or (not self.white_to_move and self.current_castling_rights.bKs): #Check for King Side castle rights of color
+        if self.castling_rights & (WHITE_KING_SIDE if self.white_to_move else BLACK_KING_SIDE): #Check for King Side castle rights of color
             self.get_king_side_castle_moves(r, c, moves)
-        if (self.white_to_move and self.current_castling_rights.wQs) or (not self.white_to_move and self.current_castling_rights.bQs): #Check for Queen Side castle rights of color
+        if self.castling_rights & (WHITE_QUEEN_SIDE if self.white_to_move else BLACK_QUEEN_SIDE): #Check for Queen Side castle rights of color
             self.get_queen_side_castle_moves(r, c, moves)    
 
     #Generate King Side Castle Moves
@@ -521,7 +764,7 @@ class GameState:
         # Check if squares are empty
         if self.board[r][c+1] == "--" and self.board[r][c+2] == "--" and self.board[r][c+3] == ally_color + "R":
             if not self.is_square_under_attack(r, c + 1) and not self.is_square_under_attack(r, c + 2):
-                moves.append(Move((r, c), (r, c + 2) , self.board, is_castling = True))
+                moves.append(encode_move(r * 8 + c, r * 8 + c + 2, KING_CASTLE))
 
     #Generate King Side Castle Moves
     def get_queen_side_castle_moves(self, r, c, moves):
@@ -529,4 +772,4 @@ class GameState:
         # Check if squares are empty
         if self.board[r][c-1] == "--" and self.board[r][c-2] == "--" and self.board[r][c-3] == "--" and self.board[r][c-4] == ally_color + "R":
             if not self.is_square_under_attack(r, c - 1) and not self.is_square_under_attack(r, c -2):
-                moves.append(Move((r, c), (r, c - 2), self.board, is_castling = True))
+                moves.append(encode_move(r * 8 + c, r * 8 + c - 2, QUEEN_CASTLE))
@@ -1,8 +1,9 @@
 import pygame as p
 import time
 import chess_engine
-from constants import DIMENSION, IMAGE_DIR, SQ_SIZE, PIECES, IMAGES, THEMES, THEME, BOARD_WIDTH, BOARD_HEIGHT, MOVE_LOG_PANEL_WIDTH, MAX_FPS, BLACK_IS_HUMAN, WHITE_IS_HUMAN
+from constants import DIMENSION, IMAGE_DIR, SQ_SIZE, PIECES, IMAGES, THEMES, THEME, BOARD_WIDTH, BOARD_HEIGHT, MOVE_LOG_PANEL_WIDTH, MAX_FPS, HUMAN, WHITE_LEVEL, BLACK_LEVEL
 import smart_move_finder
+import pgn
 import cairosvg
 import io
 import argparse
@@ -24,7 +25,7 @@ def load_images():
 '''
 The main driver for the code 
 '''
-def main(fen):
+def main(fen, white_level=WHITE_LEVEL, black_level=BLACK_LEVEL):
     p.init()
     screen = p.display.set_mode((BOARD_WIDTH + MOVE_LOG_PANEL_WIDTH, BOARD_HEIGHT))
     clock = p.time.Clock()
@@ -55,8 +56,8 @@ def main(fen):
     valid_moves_for_selected_piece = []
 
 
-    is_white_human = WHITE_IS_HUMAN # True if white is a human, false if it's an AI -> TODO set it to int for level handling
-    is_black_human = BLACK_IS_HUMAN # True if black is a human, false if it's an AI -> TODO set it to int for level handling
+    is_white_human = white_level == HUMAN
+    is_black_human = black_level == HUMAN
 
     ai_thinking = False
     move_undone = False
@@ -84,7 +85,7 @@ def main(fen):
                         move = chess_engine.Move(player_clicks[0], player_clicks[1], gs.board)
                         for i in range(len(valid_moves)):
                             if move == valid_moves[i]:
-                                gs.make_move(valid_moves[i])
+                                make_game_move(gs, valid_moves[i], valid_moves)
                                 move_was_made = True
                                 print(f"Half moves count : {gs.half_moves_count}")  # TODO Check what happens after this 
 
@@ -119,21 +120,19 @@ def main(fen):
             if not ai_thinking:
                 ai_thinking = True
                 return_queue = Queue()  # used to pass data between threads
-                move_finder_process = Process(target=smart_move_finder.find_best_move, args=(gs, valid_moves, return_queue))
+                level = white_level if gs.white_to_move else black_level
+                move_finder_process = Process(target=smart_move_finder.find_best_move, args=(gs, valid_moves, return_queue),
+                                              kwargs={"level": level})
                 move_finder_process.start()
 
             if not move_finder_process.is_alive():
                 ai_smart_move = return_queue.get()
-                gs.make_move(ai_smart_move)
+                make_game_move(gs, ai_smart_move, valid_moves)
                 move_was_made = True
                 ai_thinking = False
 
                 print(f"Half moves count : {gs.half_moves_count}")  # TODO Check what happens after this 
 
-        # Check for the half-move limit
-        if gs.half_moves_count >= 75:
-            gs.is_draw_due_to_75mr = True
-
         if move_was_made:
             valid_moves = gs.get_all_valid_moves()
             move_was_made = False
@@ -151,11 +150,23 @@ def main(fen):
         elif gs.is_draw_due_to_75mr:
             text = "Draw due to 75-move rule"
             draw_text_on_screen(screen, text)
+        elif gs.is_draw_due_to_repetition:
+            text = "Draw due to fivefold repetition"
+            draw_text_on_screen(screen, text)
 
         clock.tick(MAX_FPS)
         p.display.flip()
 
 
+'''
+Make a move of the game: name it in SAN for the move log, then play it and its sounds
+'''
+def make_game_move(gs, move, valid_moves):
+    move.san = pgn.move_to_san(gs, move, valid_moves)
+    gs.make_move(move)
+    gs.play_move_sounds(move)
+
+
 '''
 Draw move logs
 '''
@@ -14,8 +14,9 @@ MAX_FPS = 60
 IMAGE_DIR = "assets/images"
 IMAGES = {}
 
-WHITE_IS_HUMAN = False
-BLACK_IS_HUMAN = False
+HUMAN = 0  # Player level of a human, 1 to MAX_ENGINE_LEVEL are the ENGINE_LEVELS
+WHITE_LEVEL = 8
+BLACK_LEVEL = 8
 
 
 '''
@@ -44,6 +45,39 @@ STARTING_DEPTH = 3
 ENDING_DEPTH = 4
 MAX_DEPTH = 25
 MOVE_SEARCH_TIME_LIMIT = 10
+TRANSPOSITION_TABLE_SIZE = 1000000  # Entries, the table is cleared when full
+SEARCH_LOG_PATH = None  # JSON lines file the search statistics of every iteration are appended to
+ENGINE_PROFILING = False  # Time the search stages of every find_best_move, see engine_profiler.py
+
+# Engine levels: a node budget and a depth cap per move, so a level costs the same CPU on any machine and load,
+# and an evaluation noise in centipawns, the same for a position every time. Low levels do not use the opening book.
+ENGINE_LEVELS = {
+    1: {"nodes": 200, "depth": 1, "noise": 150, "book": False},
+    2: {"nodes": 500, "depth": 2, "noise": 100, "book": False},
+    3: {"nodes": 1500, "depth": 2, "noise": 60, "book": False},
+    4: {"nodes": 4000, "depth": 3, "noise": 30, "book": True},
+    5: {"nodes": 10000, "depth": 4, "noise": 15, "book": True},
+    6: {"nodes": 25000, "depth": 5, "noise": 0, "book": True},
+    7: {"nodes": 50000, "depth": 6, "noise": 0, "book": True},
+    8: {"nodes": 100000, "depth": 25, "noise": 0, "book": True}
+}
+MAX_ENGINE_LEVEL = max(ENGINE_LEVELS)
+EVAL_NOISE_SEED = 0
+
+USE_OPENING_BOOK = True
+OPENING_BOOK_PATH = "assets/opening_books/fischer.bin"
+OPENING_BOOK_MAX_PLY = 24
+
+USE_TABLEBASES = True
+TABLEBASE_PATH = "assets/tablebases"  # Directory of the tables written by tablebase.py
+TABLEBASE_MAX_PIECES = 3
+
+# Searched positions kept between runs, see analysis_cache.py. Off unless turned on: uci.py AnalysisCache option,
+# engine_server.py --analysis-cache. The path is relative to the engine directory.
+USE_ANALYSIS_CACHE = False
+ANALYSIS_CACHE_PATH = "assets/analysis_cache.sqlite"
+ANALYSIS_CACHE_MAX_ENTRIES = 1000000
+ANALYSIS_CACHE_MIN_DEPTH = 5  # A cached result this deep, or as deep as the search is allowed to go, replaces the search
 
 PIECE_SCORES = {
     "K": 0,
@@ -55,11 +89,21 @@ PIECE_SCORES = {
 }
 
 CASTLING_RIGHT_SCORE = 220
+CENTRAL_CONTROL_SCORE = 10
+MOBILITY_SCORE = 4  # static_board_score and batch_evaluator only, not the search evaluation
 CHECK_MATE_SCORE = 10000
-STALE_MATE_SCORE = -CHECK_MATE_SCORE // 2
+DRAW_SCORE = 0  # Repetitions and the fifty-move rule in the search
+STALE_MATE_SCORE = DRAW_SCORE
+TABLEBASE_WIN_SCORE = CHECK_MATE_SCORE - 1  # Less the plies to mate, below a mate the search found itself
+
+# Half moves without a capture or a pawn move after which a draw can be claimed, and is declared
+FIFTY_MOVE_RULE_HALF_MOVES = 100
+SEVENTY_FIVE_MOVE_RULE_HALF_MOVES = 150
 
 END_GAME_SCORE = 2 * 1320
 
+CENTER_SQUARES = [(3, 3), (3, 4), (4, 3), (4, 4)]
+
 PAWN_POSITION_SCORE_WHITE = [
     [  0,  0,  0,  0,  0,  0,  0,  0],
     [ 50, 50, 50, 50, 50, 50, 50, 50],
@@ -84,7 +128,7 @@ KNIGHT_POSITION_SCORE_WHITE = [
     [-50,-40,-30,-30,-30,-30,-40,-50]
 ]
 
-KNIGHT_POSITION_SCORE_BLACK = KNIGHT_POSITION_SCORE_WHITE
+KNIGHT_POSITION_SCORE_BLACK = KNIGHT_POSITION_SCORE_WHITE[::-1]
 
 BISHOP_POSITION_SCORE_WHITE = [
     [-20,-10,-10,-10,-10,-10,-10,-20],
@@ -97,7 +141,7 @@ BISHOP_POSITION_SCORE_WHITE = [
     [-20,-10,-10,-10,-10,-10,-10,-20]
 ]
 
-BISHOP_POSITION_SCORE_BLACK = BISHOP_POSITION_SCORE_WHITE
+BISHOP_POSITION_SCORE_BLACK = BISHOP_POSITION_SCORE_WHITE[::-1]
 
 ROOK_POSITION_SCORE_WHITE = [
     [  0,  0,  0,  0,  0,  0,  0,  0],
@@ -110,7 +154,7 @@ ROOK_POSITION_SCORE_WHITE = [
     [  0,  0,  0,  0,  0,  0,  0,  0]
 ]
 
-ROOK_POSITION_SCORE_BLACK = ROOK_POSITION_SCORE_WHITE
+ROOK_POSITION_SCORE_BLACK = ROOK_POSITION_SCORE_WHITE[::-1]
 
 QUEEN_POSITION_SCORE_WHITE = [
     [-20,-10,-10, -5, -5,-10,-10,-20],
@@ -123,7 +167,7 @@ QUEEN_POSITION_SCORE_WHITE = [
     [-20,-10,-10, -5, -5,-10,-10,-20]
 ]
 
-QUEEN_POSITION_SCORE_BLACK = QUEEN_POSITION_SCORE_WHITE
+QUEEN_POSITION_SCORE_BLACK = QUEEN_POSITION_SCORE_WHITE[::-1]
 
 KING_POSITION_SCORE_WHITE = [
     [-30,-40,-40,-50,-50,-40,-40,-30],
@@ -154,6 +198,30 @@ PIECE_POSITION_SCORE = {
     "bK": KING_POSITION_SCORE_BLACK
 }
 
+# Small int piece codes, 0 is an empty square
+CODED_PIECES = ["--", "wP", "wN", "wB", "wR", "wQ", "wK", "bP", "bN", "bB", "bR", "bQ", "bK"]
+PIECE_CODES = {piece: code for code, piece in enumerate(CODED_PIECES)}
+
+def compile_piece_square_scores():
+    """
+    Compile, for every piece code, a flat 64-entry table (index = row * 8 + col) holding the piece value,
+    its position score and its central control bonus, signed from white's point of view.
+    """
+    tables = [[0] * SQUARES]
+    for piece in CODED_PIECES[1:]:
+        sign = 1 if piece[0] == "w" else -1
+        table = []
+        for row in range(DIMENSION):
+            for col in range(DIMENSION):
+                score = PIECE_SCORES[piece[1]] + PIECE_POSITION_SCORE[piece][row][col]
+                if (row, col) in CENTER_SQUARES:
+                    score += CENTRAL_CONTROL_SCORE
+                table.append(sign * score)
+        tables.append(table)
+    return tables
+
+PIECE_SQUARE_SCORES = compile_piece_square_scores()
+
 '''
 THEMES PART 
 '''
@@ -0,0 +1,152 @@
+import argparse
+import cProfile
+import functools
+import pstats
+import queue
+import time
+import smart_move_finder
+from chess_engine import GameState
+
+'''
+Opt-in profiling of the engine hot paths.
+
+StageProfiler swaps timing wrappers in for the functions of every search stage while it is enabled and puts
+the originals back afterwards, so nothing is measured, and nothing costs anything, when it is off.
+Times are kept inclusive and exclusive of the nested wrapped calls, so stages calling each other
+(legality calls generation, ordering calls make/undo) are not counted twice in the breakdown.
+
+    python engine_profiler.py --fen "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"
+    python engine_profiler.py --cprofile search.prof
+'''
+
+# Stage -> (owner, function name) of the functions timed for it
+STAGES = {
+    "generation": [(GameState, "get_all_possible_moves"), (GameState, "get_castle_moves")],
+    "legality": [(GameState, "get_valid_move_codes"), (GameState, "check_for_pins_and_checks"),
+                 (GameState, "is_square_attacked")],
+    "make_undo": [(GameState, "make_move_code"), (GameState, "undo_move_code")],
+    "ordering": [(smart_move_finder, "order_moves")],
+    "eval": [(smart_move_finder, "board_score_based_on_gamestate")]
+}
+
+
+class StageProfiler:
+    """Counts calls and times of the engine stages between enable() and disable(), or inside a with block."""
+
+    def __init__(self, stages=STAGES):
+        self.stages = stages
+        self.functions = {}  # "Owner.name" -> [calls, time, self time]
+        self.originals = []
+        self.call_stack = []  # Time spent in nested wrapped calls, per open call
+        self.elapsed_time = 0.0
+        self.start_time = None
+
+    def enable(self):
+        if self.originals:
+            return
+        for stage_functions in self.stages.values():
+            for owner, name in stage_functions:
+                original = getattr(owner, name)
+                self.originals.append((owner, name, original))
+                setattr(owner, name, self.timed(f"{owner.__name__}.{name}", original))
+        self.start_time = time.perf_counter()
+
+    def disable(self):
+        for owner, name, original in reversed(self.originals):
+            setattr(owner, name, original)
+        self.originals = []
+        if self.start_time is not None:
+            self.elapsed_time += time.perf_counter() - self.start_time
+            self.start_time = None
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.disable()
+
+    def timed(self, key, function):
+        counters = self.functions.setdefault(key, [0, 0.0, 0.0])
+        call_stack = self.call_stack
+        perf_counter = time.perf_counter
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            call_stack.append(0.0)
+            start_time = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed_time = perf_counter() - start_time
+                nested_time = call_stack.pop()
+                counters[0] += 1
+                counters[1] += elapsed_time
+                counters[2] += elapsed_time - nested_time
+                if call_stack:
+                    call_stack[-1] += elapsed_time
+
+        return wrapper
+
+    def report(self):
+        """Per stage and per function breakdown, shares are of the self time over the profiled time."""
+        total_time = self.elapsed_time or 1e-9
+        functions = {
+            key: {"calls": calls, "time": round(elapsed, 6), "self_time": round(self_time, 6)}
+            for key, (calls, elapsed, self_time) in self.functions.items()
+        }
+        stages = {}
+        for stage, stage_functions in self.stages.items():
+            keys = [f"{owner.__name__}.{name}" for owner, name in stage_functions]
+            calls = sum(self.functions.get(key, [0])[0] for key in keys)
+            self_time = sum(self.functions.get(key, [0, 0.0, 0.0])[2] for key in keys)
+            stages[stage] = {"calls": calls, "self_time": round(self_time, 6), "share": round(self_time / total_time, 4)}
+        profiled_time = sum(stage["self_time"] for stage in stages.values())
+        stages["other"] = {"calls": 0, "self_time": round(max(total_time - profiled_time, 0.0), 6),
+                           "share": round(max(total_time - profiled_time, 0.0) / total_time, 4)}
+        return {"time": round(self.elapsed_time, 6), "stages": stages, "functions": functions}
+
+    def format_report(self):
+        report = self.report()
+        lines = [f"Profiled {report['time']:.3f}s"]
+        for stage, values in report["stages"].items():
+            lines.append(f"  {stage:<12}{values['calls']:>10} calls {values['self_time']:>9.3f}s {values['share']:>7.1%}")
+        return "\n".join(lines)
+
+
+def capture_find_best_move(gs, output_path, time_limit=5.0):
+    """Run a single find_best_move under cProfile and dump the stats to output_path, returns the best move."""
+    return_queue = queue.Queue()
+    profile = cProfile.Profile()
+    profile.runcall(smart_move_finder.find_best_move, gs, gs.get_all_valid_moves(), return_queue, time_limit)
+    profile.dump_stats(output_path)
+    return return_queue.get()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile a search of the engine.")
+    parser.add_argument("--fen", default="rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")
+    parser.add_argument("--time-limit", type=float, default=5.0)
+    parser.add_argument("--cprofile", help="Capture the search with cProfile into this file instead")
+    parser.add_argument("--top", type=int, default=25, help="Functions listed from the cProfile capture")
+    parser.add_argument("--book", action="store_true", help="Allow the search to answer from the opening book")
+    args = parser.parse_args()
+
+    smart_move_finder.USE_OPENING_BOOK = args.book
+    smart_move_finder.USE_ANALYSIS_CACHE = False  # Profile a search, never a cached answer
+    gs = GameState(fen=args.fen)
+
+    if args.cprofile:
+        best_move = capture_find_best_move(gs, args.cprofile, args.time_limit)
+        print(f"Best move {best_move}, profile written to {args.cprofile}")
+        pstats.Stats(args.cprofile).sort_stats("cumulative").print_stats(args.top)
+        return
+
+    with StageProfiler() as profiler:
+        best_move, depth = smart_move_finder.iterative_deepening(gs, gs.get_all_valid_moves(), time_limit=args.time_limit)
+    print(f"Best move {best_move} at depth {depth}, {smart_move_finder.stats.nodes} nodes")
+    print(profiler.format_report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+import os
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")  # constants imports pygame, keep its banner out of the server output
+
+import argparse
+import asyncio
+import itertools
+import json
+import queue
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+import smart_move_finder
+import uci
+from chess_engine import GameState
+from constants import MAX_DEPTH
+
+'''
+Multi-game engine server: many human-vs-engine games held in memory, the engine moves computed by a fixed
+pool of persistent search processes instead of a new process per move.
+
+Clients connect over TCP and exchange JSON objects, one per line. Every request may carry an "id", echoed
+in its response, so a connection can have requests for several games in flight:
+
+    {"op": "new", "engine": "b", "time": 300, "increment": 2, "fen": "..."}  -> game id, the engine replies if it moves first
+    {"op": "move", "game": 1, "move": "e2e4"}  -> the position after the move and the engine's reply
+    {"op": "state", "game": 1}
+    {"op": "close", "game": 1}
+
+Every response carries the FEN, the legal moves in UCI notation and the result ("*" while the game goes on).
+Engine requests wait in one first-in first-out queue served by a dispatcher per worker, a game has at most
+one request in it, so games are served in turn and a busy game cannot hold back the others. Each game has its
+own engine clock, a time budget and an increment, and every search gets a share of it as uci.allocate_time
+gives it, counting only the time spent searching and not the time waiting in the queue.
+Games belong to their connection and are dropped when it closes.
+
+    python engine_server.py --port 8765 --workers 4
+'''
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_ENGINE_TIME = 300.0  # Seconds on the engine clock of a new game
+DEFAULT_INCREMENT = 2.0
+DEFAULT_HASH_MB = 64  # Per worker
+MAX_GAMES = 10000
+
+
+def init_worker(hash_mb, analysis_cache):
+    smart_move_finder.TRANSPOSITION_TABLE_SIZE = max(1, hash_mb * 1024 * 1024 // uci.TRANSPOSITION_ENTRY_BYTES)
+    smart_move_finder.USE_ANALYSIS_CACHE = analysis_cache
+
+
+class SearchResults(list):
+    """Stands in for find_best_move's info_queue."""
+    put = list.append
+
+
+def engine_move(fen, uci_moves, time_limit, max_depth, node_limit):
+    """
+    Search the position after uci_moves from fen in a worker process, the search tables stay in the worker between requests.
+    Returns the best move in UCI notation, its score from the side to move's point of view, the depth and the seconds searched.
+    """
+    start_time = time.time()
+    gs = GameState(fen=fen)
+    for uci_move in uci_moves:
+        moves_by_uci = {move.to_uci(): move for move in gs.get_all_valid_moves()}
+        gs.make_move(moves_by_uci[uci_move])
+    records = SearchResults()
+    return_queue = queue.Queue()
+    smart_move_finder.find_best_move(gs, gs.get_all_valid_moves(), return_queue, time_limit, records, None,
+                                     max_depth=max_depth, node_limit=node_limit)
+    best_move = return_queue.get()
+    last = records[-1] if records else {}
+    return best_move.to_uci(), last.get("score"), last.get("depth", 0), time.time() - start_time
+
+
+def game_result(gs, valid_moves):
+    """Result of the game from the current position, "*" while it goes on."""
+    if not valid_moves:
+        if gs.in_check:
+            return "0-1" if gs.white_to_move else "1-0"
+        return "1/2-1/2"
+    if gs.is_game_over or gs.can_claim_draw() or gs.has_insufficient_material():
+        return "1/2-1/2"
+    return "*"
+
+
+class GameSession:
+    """A game on the server: the GameState, the moves played and the engine clock."""
+
+    def __init__(self, game_id, fen, engine_color, engine_time, increment):
+        self.game_id = game_id
+        self.fen = fen
+        self.gs = GameState(fen=fen)
+        self.uci_moves = []
+        self.engine_color = engine_color  # "w", "b" or None for no engine moves
+        self.engine_time = engine_time
+        self.increment = increment
+        self.valid_moves = self.gs.get_all_valid_moves()
+        self.result = "*"
+        self.engine_busy = False
+
+    @property
+    def engine_to_move(self):
+        return self.result == "*" and self.engine_color == ("w" if self.gs.white_to_move else "b")
+
+    def play(self, uci_move):
+        move = next((move for move in self.valid_moves if move.to_uci() == uci_move), None)
+        if move is None:
+            raise ValueError(f"Illegal move {uci_move}")
+        self.gs.make_move(move)
+        self.uci_moves.append(uci_move)
+        self.valid_moves = self.gs.get_all_valid_moves()
+        self.result = game_result(self.gs, self.valid_moves)
+
+    def allocate_time(self):
+        return uci.allocate_time({"wtime": self.engine_time * 1000, "winc": self.increment * 1000}, True)
+
+    def charge(self, seconds):
+        """Take a search off the engine clock, the engine loses on time when it runs out."""
+        self.engine_time += self.increment - seconds
+        if self.engine_time < 0 and self.result == "*":
+            self.result = "0-1" if self.engine_color == "w" else "1-0"
+
+    def state(self):
+        return {"game": self.game_id, "fen": self.gs.to_fen(), "moves": len(self.uci_moves),
+                "legal": [move.to_uci() for move in self.valid_moves] if self.result == "*" else [],
+                "result": self.result, "engine_time": round(self.engine_time, 3)}
+
+
+class EngineServer:
+    def __init__(self, workers=None, hash_mb=DEFAULT_HASH_MB, max_depth=MAX_DEPTH, node_limit=None, max_games=MAX_GAMES,
+                 analysis_cache=False):
+        self.workers = workers or os.cpu_count()
+        self.executor = ProcessPoolExecutor(self.workers, initializer=init_worker, initargs=(hash_mb, analysis_cache))
+        self.max_depth = max_depth
+        self.node_limit = node_limit
+        self.max_games = max_games
+        self.sessions = {}
+        self.game_ids = itertools.count(1)
+        self.requests = None  # Queue of (session, future) waiting for a worker
+        self.dispatchers = []
+        self.searches = 0
+
+    async def start(self, host, port):
+        self.requests = asyncio.Queue()
+        self.dispatchers = [asyncio.create_task(self.dispatch()) for _ in range(self.workers)]
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    def close(self):
+        for dispatcher in self.dispatchers:
+            dispatcher.cancel()
+        self.executor.shutdown(cancel_futures=True)
+
+    async def dispatch(self):
+        """Hand queued engine requests to the worker processes, one at a time per worker."""
+        loop = asyncio.get_running_loop()
+        while True:
+            session, future = await self.requests.get()
+            if future.cancelled():
+                continue  # Its connection closed while it waited
+            try:
+                reply = await loop.run_in_executor(
+                    self.executor, engine_move, session.fen, list(session.uci_moves), session.allocate_time(),
+                    self.max_depth, self.node_limit
+                )
+            except Exception as error:
+                if not future.done():
+                    future.set_exception(error)
+            else:
+                if not future.done():
+                    future.set_result(reply)
+
+    async def engine_reply(self, session):
+        """Let the engine play its move in the session, returns the reply fields of the response."""
+        session.engine_busy = True
+        queued_time = time.time()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            await self.requests.put((session, future))
+            uci_move, score, depth, seconds = await future
+        finally:
+            session.engine_busy = False
+        self.searches += 1
+        if session.game_id in self.sessions:  # Not closed while the engine was thinking
+            session.play(uci_move)
+            session.charge(seconds)
+        return {"reply": uci_move, "score": score, "depth": depth, "search_time": round(seconds, 4),
+                "latency": round(time.time() - queued_time, 4)}
+
+    async def handle_request(self, request, owned_games):
+        op = request.get("op")
+        if op == "new":
+            if len(self.sessions) >= self.max_games:
+                raise ValueError("Too many games")
+            engine_color = request.get("engine", "b")
+            if engine_color not in ("w", "b", None):
+                raise ValueError(f"Invalid engine color {engine_color}")
+            session = GameSession(next(self.game_ids), request.get("fen") or uci.START_FEN, engine_color,
+                                  float(request.get("time", DEFAULT_ENGINE_TIME)),
+                                  float(request.get("increment", DEFAULT_INCREMENT)))
+            self.sessions[session.game_id] = session
+            owned_games.add(session.game_id)
+            reply = await self.engine_reply(session) if session.engine_to_move else {}
+            return dict(session.state(), **reply)
+
+        session = self.sessions.get(request.get("game"))
+        if session is None or session.game_id not in owned_games:
+            raise ValueError(f"Unknown game {request.get('game')}")
+        if op == "state":
+            return session.state()
+        if op == "close":
+            del self.sessions[session.game_id]
+            owned_games.discard(session.game_id)
+            return {"game": session.game_id, "closed": True}
+        if op == "move":
+            if session.engine_busy:
+                raise ValueError("The engine is thinking")
+            if session.result != "*":
+                raise ValueError(f"The game is over: {session.result}")
+            if session.engine_to_move:
+                raise ValueError("It is the engine's move")
+            session.play(request.get("move"))
+            reply = await self.engine_reply(session) if session.engine_to_move else {}
+            return dict(session.state(), **reply)
+        raise ValueError(f"Unknown op {op}")
+
+    async def respond(self, request, owned_games, writer, write_lock):
+        try:
+            response = await self.handle_request(request, owned_games)
+        except Exception as error:
+            response = {"error": str(error)}
+        if "id" in request:
+            response["id"] = request["id"]
+        try:
+            async with write_lock:
+                writer.write((json.dumps(response) + "\n").encode())
+                await writer.drain()
+        except ConnectionError:
+            pass  # The client is gone, handle_connection drops its games
+
+    async def handle_connection(self, reader, writer):
+        owned_games = set()
+        write_lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    request = {}
+                task = asyncio.create_task(self.respond(request, owned_games, writer, write_lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()  # Requests still waiting for the engine, nobody is left to answer
+            for game_id in owned_games:
+                self.sessions.pop(game_id, None)
+            writer.close()
+
+
+async def serve(host, port, workers, hash_mb, max_depth, node_limit, analysis_cache=False):
+    server = EngineServer(workers, hash_mb, max_depth, node_limit, analysis_cache=analysis_cache)
+    tcp_server = await server.start(host, port)
+    print(f"Serving on {host}:{port} with {server.workers} search workers", flush=True)
+    # Stop serving on SIGTERM as on Ctrl-C, so the worker processes are shut down with the server, not orphaned
+    serving = asyncio.current_task()
+    for signal_number in (signal.SIGTERM, signal.SIGINT):
+        asyncio.get_running_loop().add_signal_handler(signal_number, serving.cancel)
+    try:
+        async with tcp_server:
+            await tcp_server.serve_forever()
+    finally:
+        server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve many human-vs-engine games over TCP with a pool of search processes.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Search processes")
+    parser.add_argument("--hash", type=int, default=DEFAULT_HASH_MB, help="Transposition table MB per worker")
+    parser.add_argument("--depth", type=int, default=MAX_DEPTH, help="Maximum search depth")
+    parser.add_argument("--nodes", type=int, help="Node limit per search")
+    parser.add_argument("--analysis-cache", action="store_true", help="Answer and keep searches in the analysis cache")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.hash, args.depth, args.nodes, args.analysis_cache))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import argparse
+import json
+import os
+import re
+import time
+from multiprocessing import Pool
+import pgn
+import smart_move_finder
+from chess_engine import GameState
+from constants import MAX_DEPTH
+
+'''
+Test suites in EPD (Extended Position Description), such as WAC or ECM, solved across a process pool.
+
+An EPD line is the first four FEN fields followed by opcodes: bm (best moves) and am (moves to avoid) in SAN,
+id to name the position. A position is solved when the move of the deepest completed iteration is a bm move
+and not an am move. Time and nodes to solution are those of the first iteration from which the search kept
+a solving move until the end.
+
+    python epd_runner.py wac.epd --time 5 --json wac.json
+    python epd_runner.py ecm.epd --nodes 200000 --workers 8
+'''
+
+# Opcode and operands up to the semicolon, quoted operands may contain semicolons
+OPERATION_PATTERN = re.compile(r'(\w+)\s*((?:"[^"]*"|[^;"])*);?')
+
+
+def parse_epd(line):
+    """Split an EPD line into a FEN and a dict of opcode -> list of operands."""
+    fields = line.split(maxsplit=4)
+    if len(fields) < 4:
+        raise ValueError(f"Invalid EPD line: {line.strip()}")
+    operations = {}
+    for opcode, operands in OPERATION_PATTERN.findall(fields[4] if len(fields) > 4 else ""):
+        operands = operands.strip()
+        if operands.startswith('"') and operands.endswith('"'):
+            operations[opcode] = [operands[1:-1]]
+        else:
+            operations[opcode] = operands.split()
+    # hmvc and fmvn give the counters EPD leaves out of the position
+    fen = " ".join(fields[:4]) + f" {operations.get('hmvc', ['0'])[0]} {operations.get('fmvn', ['1'])[0]}"
+    return fen, operations
+
+
+def read_epd(path):
+    """The positions of an EPD file as (id, fen, operations) tuples, positions without an id are numbered."""
+    positions = []
+    with open(path, encoding="utf-8", errors="replace") as epd_file:
+        for line in epd_file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            fen, operations = parse_epd(line)
+            position_id = operations.get("id", [f"{os.path.basename(path)}.{len(positions) + 1}"])[0]
+            positions.append((position_id, fen, operations))
+    return positions
+
+
+def resolve_moves(gs, sans):
+    """UCI moves of the SAN operands in the position of gs."""
+    move_index = pgn.index_moves(gs.get_all_valid_moves())
+    return [pgn.parse_san(san, move_index).to_uci() for san in sans]
+
+
+def solve_position(task):
+    """Search one position in a worker process, returns its result as a dict."""
+    position_id, fen, operations, time_limit, node_limit, max_depth = task
+    gs = GameState(fen=fen)
+    result = {"id": position_id, "fen": fen, "bm": operations.get("bm", []), "am": operations.get("am", [])}
+    try:
+        best_moves = set(resolve_moves(gs, result["bm"]))
+        avoided_moves = set(resolve_moves(gs, result["am"]))
+    except ValueError as error:
+        result.update({"solved": False, "error": str(error)})
+        return result
+
+    def solves(uci_move):
+        return (not best_moves or uci_move in best_moves) and uci_move not in avoided_moves
+
+    # (move, time, nodes) of every completed depth, the move is the first of its PV: the moves of the
+    # iterations are all read the same way, and a search stopped before depth 1 has none to be judged on
+    iterations = []
+    smart_move_finder.reset_search_state()
+    _, depth = smart_move_finder.iterative_deepening(
+        gs, gs.get_all_valid_moves(), max_depth=max_depth, time_limit=time_limit, node_limit=node_limit,
+        on_iteration=lambda info: iterations.append((info.pv[0] if info.pv else None, info.time, info.nodes))
+    )
+
+    move = iterations[-1][0] if iterations else None
+    solved = move is not None and solves(move)
+    solution_time = solution_nodes = None
+    if solved:
+        for iteration_move, iteration_time, iteration_nodes in reversed(iterations):
+            if iteration_move is None or not solves(iteration_move):
+                break
+            solution_time, solution_nodes = iteration_time, iteration_nodes
+    result.update({
+        "solved": solved,
+        "move": move,
+        "depth": depth,
+        "time": round(solution_time, 3) if solution_time is not None else None,
+        "nodes": solution_nodes,
+        "total_nodes": smart_move_finder.stats.nodes
+    })
+    return result
+
+
+def run_suite(positions, time_limit=None, node_limit=None, max_depth=MAX_DEPTH, workers=None, log=None):
+    """Solve the positions across a process pool, results in the order of the positions."""
+    tasks = [(position_id, fen, operations, time_limit, node_limit, max_depth) for position_id, fen, operations in positions]
+    results = []
+    with Pool(workers) as pool:
+        for result in pool.imap(solve_position, tasks):
+            results.append(result)
+            if log:
+                log(format_row(result))
+    return results
+
+
+def format_row(result):
+    expected = " ".join(result["bm"]) if result["bm"] else "not " + " ".join(result["am"])
+    if "error" in result:
+        return f"{result['id']:<16} error  {result['error']}"
+    solution = f"{result['time']:>8.3f}s {result['nodes']:>10}" if result["solved"] else f"{'-':>9} {'-':>10}"
+    return f"{result['id']:<16} {'ok' if result['solved'] else '--':<6} {solution}  " \
+           f"{result['move'] or '-':<7} {expected}"
+
+
+def summarize(results, elapsed_time):
+    solved = [result for result in results if result["solved"]]
+    return {
+        "positions": len(results),
+        "solved": len(solved),
+        "solution_time": round(sum(result["time"] for result in solved), 3),
+        "solution_nodes": sum(result["nodes"] for result in solved),
+        "time": round(elapsed_time, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve the positions of an EPD test suite.")
+    parser.add_argument("epd", help="EPD file with bm or am opcodes")
+    parser.add_argument("--time", type=float, help="Seconds per position")
+    parser.add_argument("--nodes", type=int, help="Nodes per position, reproducible unlike --time")
+    parser.add_argument("--depth", type=int, default=MAX_DEPTH, help="Maximum depth per position")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--json", help="Write the per position results and the summary to this file")
+    args = parser.parse_args()
+
+    time_limit = args.time
+    if time_limit is None and args.nodes is None and args.depth == MAX_DEPTH:
+        time_limit = 5.0
+
+    positions = read_epd(args.epd)
+    print(f"{'id':<16} {'result':<6} {'time':>9} {'nodes':>10}  {'move':<7} expected")
+    start_time = time.time()
+    results = run_suite(positions, time_limit, args.nodes, args.depth, args.workers, log=print)
+    summary = summarize(results, time.time() - start_time)
+    print(f"Solved {summary['solved']}/{summary['positions']} in {summary['time']:.1f}s, "
+          f"{summary['solution_time']:.1f}s and {summary['solution_nodes']} nodes to the solutions")
+
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump({"summary": summary, "positions": results}, json_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
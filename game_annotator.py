@@ -0,0 +1,167 @@
+import argparse
+import os
+import time
+from multiprocessing import Pool
+import pgn
+import smart_move_finder
+from chess_engine import GameState
+from constants import CHECK_MATE_SCORE, STALE_MATE_SCORE, MAX_DEPTH
+
+'''
+Whole-game annotation: evaluations, best moves and mistakes written into the games as PGN comments.
+
+A game is walked backwards from its last position with one search state kept throughout, so the
+transposition table filled by the later positions already holds most of the subtrees of the earlier ones.
+Going backwards also gives the score of every played move for free: it is the score of the position after
+it, searched the step before, taken one depth shallower than the best move's score so that both look the
+same number of plies ahead (the evaluation swings between odd and even depths). Large PGN files are annotated
+a game per worker process.
+
+    python game_annotator.py games.pgn --output annotated.pgn --time 1
+'''
+
+ANNOTATOR = "Chess engine"
+
+# Centipawns lost against the best move, largest first
+JUDGEMENTS = ((200, "Blunder"), (100, "Mistake"), (50, "Inaccuracy"))
+
+
+def analyze_position(gs, time_limit, node_limit, max_depth):
+    """
+    Best move of the position and its score at every completed depth, scores[d - 1] at depth d, from the side to
+    move's point of view. Keeps the search tables.
+    """
+    valid_moves = gs.get_all_valid_moves()
+    if not valid_moves:
+        return None, [-CHECK_MATE_SCORE if gs.in_check else STALE_MATE_SCORE] * max_depth  # The same at every depth
+    scores = []
+    best_move, _ = smart_move_finder.iterative_deepening(
+        gs, valid_moves, max_depth=max_depth, time_limit=time_limit, node_limit=node_limit,
+        on_iteration=lambda info: scores.append(info.score)
+    )
+    return best_move, scores
+
+
+def judge(loss):
+    for threshold, judgement in JUDGEMENTS:
+        if loss >= threshold:
+            return judgement
+    return None
+
+
+def format_score(score):
+    """Score from white's point of view in pawns, "#" for a forced mate."""
+    if abs(score) >= CHECK_MATE_SCORE:
+        return "#" if score > 0 else "-#"
+    return f"{score / 100:+.2f}"
+
+
+def annotate_game(gs, time_limit=1.0, node_limit=None, max_depth=MAX_DEPTH):
+    """
+    Annotate the moves of gs.move_logs, the game gs is at the end of, walking back to its first position.
+    Returns one dict per move, in the order of the game. gs is back at the end of the game afterwards.
+    """
+    moves = list(gs.move_logs)
+    smart_move_finder.reset_search_state()  # Only between games, the positions of a game share the tables
+    _, next_scores = analyze_position(gs, time_limit, node_limit, max_depth)
+
+    annotations = [None] * len(moves)
+    for i in range(len(moves) - 1, -1, -1):
+        gs.undo_last_move()
+        move = moves[i]
+        valid_moves = gs.get_all_valid_moves()
+        best_move, scores = analyze_position(gs, time_limit, node_limit, max_depth)
+        # The position after the move was searched at the previous step, its score at depth - 1 is the move's at depth
+        depth = min(len(scores), len(next_scores) + 1)
+        if depth >= 2:
+            best_score, played_score = scores[depth - 1], -next_scores[depth - 2]
+        else:  # Too shallow to compare, the move is not judged
+            best_score = played_score = scores[-1] if scores else -next_scores[-1] if next_scores else 0
+        if best_move.code == move.code or played_score > best_score:
+            best_move, best_score = move, max(best_score, played_score)
+        loss = max(best_score - played_score, 0)
+        sign = 1 if gs.white_to_move else -1
+        annotations[i] = {
+            "san": pgn.move_to_san(gs, move, valid_moves),
+            "score": sign * played_score,
+            "best_move": pgn.move_to_san(gs, best_move, valid_moves),
+            "best_score": sign * best_score,
+            "loss": loss,
+            "judgement": judge(loss)
+        }
+        next_scores = scores
+
+    for move in moves:
+        gs.make_move(move)
+    return annotations
+
+
+def format_comment(annotation):
+    comment = format_score(annotation["score"])
+    if annotation["judgement"]:
+        comment = f"{annotation['judgement']}, {comment}. Best {annotation['best_move']} " \
+                  f"{format_score(annotation['best_score'])}"
+    return comment
+
+
+def annotated_game(gs, headers, time_limit=1.0, node_limit=None, max_depth=MAX_DEPTH):
+    """PgnGame of the game gs is at the end of, its moves commented."""
+    annotations = annotate_game(gs, time_limit, node_limit, max_depth)
+    headers = dict(headers, Annotator=ANNOTATOR)
+    return pgn.PgnGame(headers, [annotation["san"] for annotation in annotations],
+                       [format_comment(annotation) for annotation in annotations])
+
+
+def annotate_pgn_game(task):
+    """Replay and annotate one PgnGame in a worker process, returns its PGN text, None when it cannot be replayed."""
+    game, time_limit, node_limit, max_depth = task
+    gs = GameState(fen=game.headers.get("FEN"))
+    try:
+        for san in game.moves:
+            gs.make_move(pgn.parse_san(san, pgn.index_moves(gs.get_all_valid_moves())))
+    except ValueError:
+        return None
+    return pgn.format_game(annotated_game(gs, game.headers, time_limit, node_limit, max_depth))
+
+
+def annotate_pgn(pgn_path, output_path, time_limit=1.0, node_limit=None, max_depth=MAX_DEPTH, workers=None,
+                 max_games=None, log=print):
+    """Annotate the games of a PGN file across a process pool, written in their original order."""
+    games = pgn.read_games(pgn_path)
+    if max_games:
+        games = (game for game, _ in zip(games, range(max_games)))
+    tasks = ((game, time_limit, node_limit, max_depth) for game in games)
+
+    annotated = skipped = 0
+    start_time = time.time()
+    with Pool(workers) as pool, open(output_path, "w") as output_file:
+        for text in pool.imap(annotate_pgn_game, tasks):
+            if text is None:
+                skipped += 1
+                continue
+            output_file.write(text)
+            output_file.flush()
+            annotated += 1
+            if log:
+                log(f"{annotated} games annotated in {time.time() - start_time:.1f}s")
+    return annotated, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Annotate the games of a PGN file with evaluations and mistakes.")
+    parser.add_argument("pgn", help="PGN file of the games to annotate")
+    parser.add_argument("--output", default="annotated.pgn")
+    parser.add_argument("--time", type=float, default=1.0, help="Seconds per position")
+    parser.add_argument("--nodes", type=int, help="Nodes per position")
+    parser.add_argument("--depth", type=int, default=MAX_DEPTH, help="Maximum depth per position")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--max-games", type=int, help="Only annotate the first games of the file")
+    args = parser.parse_args()
+
+    annotated, skipped = annotate_pgn(args.pgn, args.output, args.time, args.nodes, args.depth, args.workers,
+                                      args.max_games)
+    print(f"{annotated} games written to {args.output}" + (f", {skipped} could not be replayed" if skipped else ""))
+
+
+if __name__ == "__main__":
+    main()
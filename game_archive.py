@@ -0,0 +1,276 @@
+import argparse
+import mmap
+import os
+import struct
+import time
+from array import array
+import pgn
+from chess_engine import GameState
+from moves.move import Move, code_to_uci
+
+'''
+Binary game archives, for self-play and imported games in numbers PGN text is too slow and large for.
+
+A game is stored as its result, its tags (the FEN tag gives a start position other than the initial one)
+and one 16-bit move code per ply (see moves.move), with optional per-ply evaluations (int16 centipawns,
+white's point of view) and clocks (uint32 milliseconds left). The archive is a data file of game records
+following an 8-byte magic, and an index file of the uint64 offset of every record, for random access to game N.
+Everything is little-endian:
+
+    record: flags (u8), result (u8), plies (u16), tags length (u16), tags ("name\\tvalue\\n" UTF-8),
+            moves (plies x u16), evaluations (plies x i16) when flags & HAS_EVALS,
+            clocks (plies x u32) when flags & HAS_CLOCKS
+
+Reading does not replay the moves: the codes are sliced out of the memory mapped file as arrays,
+UCI moves come straight from the codes, and only the conversion to PGN replays the game for SAN.
+
+    python game_archive.py import assets/opening_books/Fischer.pgn fischer.games
+    python game_archive.py export fischer.games fischer.pgn
+    python game_archive.py uci fischer.games fischer.txt
+'''
+
+DATA_MAGIC = b"CHGAMES1"
+INDEX_MAGIC = b"CHINDEX1"
+INDEX_EXTENSION = ".idx"
+RECORD_HEADER = struct.Struct("<BBHH")
+OFFSET = struct.Struct("<Q")
+
+# Record flags
+HAS_EVALS = 1
+HAS_CLOCKS = 2
+
+RESULT_CODES = {"*": 0, "1-0": 1, "0-1": 2, "1/2-1/2": 3}
+RESULTS = {code: result for result, code in RESULT_CODES.items()}
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+
+class ArchivedGame:
+    """A game read from an archive, its tags are decoded on first use."""
+    __slots__ = ("result", "codes", "evals", "clocks", "tags_data", "_headers")
+
+    def __init__(self, result, codes, evals=None, clocks=None, tags_data=b""):
+        self.result = result
+        self.codes = codes  # array("H") of move codes
+        self.evals = evals
+        self.clocks = clocks
+        self.tags_data = tags_data
+        self._headers = None
+
+    @property
+    def headers(self):
+        if self._headers is None:
+            self._headers = dict(
+                line.split("\t", 1) for line in bytes(self.tags_data).decode("utf-8").splitlines() if "\t" in line
+            )
+        return self._headers
+
+    @property
+    def fen(self):
+        return self.headers.get("FEN", START_FEN)
+
+    def uci_moves(self):
+        return [code_to_uci(code) for code in self.codes]
+
+    def moves(self):
+        """Yield (gs, move) before each move is made, replaying the game on one GameState."""
+        gs = GameState(fen=self.headers.get("FEN"))
+        for code in self.codes:
+            move = Move.from_code(code, gs.board)
+            yield gs, move
+            gs.make_move(move)
+
+    def to_pgn_game(self):
+        """PgnGame with SAN moves, evaluations and clocks go in the move comments."""
+        sans = []
+        for gs, move in self.moves():
+            sans.append(pgn.move_to_san(gs, move, gs.get_all_valid_moves()))
+        comments = None
+        if self.evals is not None or self.clocks is not None:
+            comments = []
+            for ply in range(len(sans)):
+                parts = []
+                if self.evals is not None:
+                    parts.append(f"{self.evals[ply] / 100:+.2f}")
+                if self.clocks is not None:
+                    seconds = self.clocks[ply] // 1000
+                    parts.append(f"[%clk {seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}]")
+                comments.append(" ".join(parts))
+        headers = dict(self.headers, Result=self.result)
+        return pgn.PgnGame(headers, sans, comments)
+
+
+class GameWriter:
+    """Append games to an archive and its index, a record at a time."""
+
+    def __init__(self, path, append=False):
+        exists = append and os.path.exists(path)
+        self.data_file = open(path, "ab" if exists else "wb")
+        self.index_file = open(path + INDEX_EXTENSION, "ab" if exists else "wb")
+        if not exists:
+            self.data_file.write(DATA_MAGIC)
+            self.index_file.write(INDEX_MAGIC)
+        self.offset = self.data_file.tell()
+
+    def write(self, codes, result="*", headers=None, evals=None, clocks=None):
+        """Write a game from its move codes, headers are PGN tags, the result excluded."""
+        tags_data = "".join(f"{name}\t{value}\n" for name, value in (headers or {}).items() if name != "Result").encode("utf-8")
+        flags = (HAS_EVALS if evals is not None else 0) | (HAS_CLOCKS if clocks is not None else 0)
+        parts = [RECORD_HEADER.pack(flags, RESULT_CODES.get(result, 0), len(codes), len(tags_data)), tags_data,
+                 array("H", codes).tobytes()]
+        if evals is not None:
+            parts.append(array("h", evals).tobytes())
+        if clocks is not None:
+            parts.append(array("I", clocks).tobytes())
+        record = b"".join(parts)
+        self.data_file.write(record)
+        self.index_file.write(OFFSET.pack(self.offset))
+        self.offset += len(record)
+
+    def close(self):
+        self.data_file.close()
+        self.index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class GameReader:
+    """Read an archive: len(reader), reader[n] through the index, or iteration over all games in order."""
+
+    def __init__(self, path):
+        self.data_file = open(path, "rb")
+        self.data = mmap.mmap(self.data_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(DATA_MAGIC)] != DATA_MAGIC:
+            raise ValueError(f"Not a game archive: {path}")
+        self.index_path = path + INDEX_EXTENSION
+        self.offsets = None
+
+    def close(self):
+        self.data.close()
+        self.data_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def load_index(self):
+        if self.offsets is None:
+            with open(self.index_path, "rb") as index_file:
+                if index_file.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                    raise ValueError(f"Not a game archive index: {self.index_path}")
+                self.offsets = array("Q")
+                self.offsets.frombytes(index_file.read())
+        return self.offsets
+
+    def __len__(self):
+        return len(self.load_index())
+
+    def __getitem__(self, n):
+        return self.read_game(self.load_index()[n])[0]
+
+    def __iter__(self):
+        offset = len(DATA_MAGIC)
+        size = len(self.data)
+        while offset < size:
+            game, offset = self.read_game(offset)
+            yield game
+
+    def read_game(self, offset):
+        """The game of the record at offset, and the offset of the next record."""
+        data = self.data
+        flags, result, plies, tags_length = RECORD_HEADER.unpack_from(data, offset)
+        offset += RECORD_HEADER.size
+        tags_data = data[offset:offset + tags_length]
+        offset += tags_length
+        codes = array("H", data[offset:offset + 2 * plies])
+        offset += 2 * plies
+        evals = clocks = None
+        if flags & HAS_EVALS:
+            evals = array("h", data[offset:offset + 2 * plies])
+            offset += 2 * plies
+        if flags & HAS_CLOCKS:
+            clocks = array("I", data[offset:offset + 4 * plies])
+            offset += 4 * plies
+        return ArchivedGame(RESULTS[result], codes, evals, clocks, tags_data), offset
+
+
+def import_pgn(pgn_path, archive_path, append=False):
+    """Convert the games of a PGN file, returns the number of games written and skipped."""
+    written = skipped = 0
+    with GameWriter(archive_path, append) as writer:
+        for game in pgn.read_games(pgn_path):
+            try:
+                codes = [move.code for _, move in pgn.replay_game(game)]
+            except ValueError:
+                skipped += 1
+                continue
+            writer.write(codes, game.headers.get("Result", "*"), game.headers)
+            written += 1
+    return written, skipped
+
+
+def export_pgn(archive_path, pgn_path):
+    """Write the games of an archive as PGN, returns the number of games."""
+    count = 0
+    with GameReader(archive_path) as reader, open(pgn_path, "w") as pgn_file:
+        for game in reader:
+            pgn_file.write(pgn.format_game(game.to_pgn_game()))
+            count += 1
+    return count
+
+
+def export_uci(archive_path, text_path):
+    """Write a line per game: the start position and the moves in UCI notation, as a UCI position command takes them."""
+    count = 0
+    with GameReader(archive_path) as reader, open(text_path, "w") as text_file:
+        for game in reader:
+            fen = game.headers.get("FEN")
+            start = f"fen {fen}" if fen else "startpos"
+            text_file.write(f"{start} moves {' '.join(game.uci_moves())} {game.result}\n")
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert between PGN files and binary game archives.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="PGN to archive")
+    import_parser.add_argument("pgn")
+    import_parser.add_argument("archive")
+    import_parser.add_argument("--append", action="store_true")
+    export_parser = subparsers.add_parser("export", help="Archive to PGN")
+    export_parser.add_argument("archive")
+    export_parser.add_argument("pgn")
+    uci_parser = subparsers.add_parser("uci", help="Archive to UCI move lists")
+    uci_parser.add_argument("archive")
+    uci_parser.add_argument("output")
+    count_parser = subparsers.add_parser("count", help="Read every game of an archive and count the plies")
+    count_parser.add_argument("archive")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    if args.command == "import":
+        written, skipped = import_pgn(args.pgn, args.archive, args.append)
+        print(f"{written} games written to {args.archive}" + (f", {skipped} could not be replayed" if skipped else ""))
+    elif args.command == "export":
+        print(f"{export_pgn(args.archive, args.pgn)} games written to {args.pgn}")
+    elif args.command == "uci":
+        print(f"{export_uci(args.archive, args.output)} games written to {args.output}")
+    else:
+        with GameReader(args.archive) as reader:
+            games = plies = 0
+            for game in reader:
+                games += 1
+                plies += len(game.codes)
+        print(f"{games} games, {plies} plies")
+    print(f"{time.time() - start_time:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 import pygame as p
 import sys
-from constants import THEMES, PIECES
+from constants import THEMES, PIECES, HUMAN, MAX_ENGINE_LEVEL
+from chess_game import main
 
 def draw_text_centered(screen, text, font, color, rect):
     text_surface = font.render(text, True, color)
@@ -11,6 +12,9 @@ def draw_text_left(screen, text, font, color, x, y):
     text_surface = font.render(text, True, color)
     screen.blit(text_surface, (x, y))
 
+def player_name(level):
+    return "Human" if level == HUMAN else f"Level {level}"
+
 def main_menu():
     p.init()
     screen = p.display.set_mode((600, 500))
@@ -22,8 +26,8 @@ def main_menu():
 
     selected_theme = "classic"  # Default theme
     selected_piece_set = "default"  # Default piece set
-    is_white_human = True  # Default player types
-    is_black_human = True
+    white_level = HUMAN  # Default player types, HUMAN or an engine level
+    black_level = HUMAN
     fen_string = ""  # Default FEN
 
     input_active = False  # Track if FEN input is active
@@ -43,7 +47,7 @@ def main_menu():
         draw_text_centered(screen, f"Pieces: {selected_piece_set}", small_font, p.Color("white"), piece_button_rect)
 
         player_button_rect = p.Rect(200, 250, 200, 50)
-        draw_text_centered(screen, f"White: {'Human' if is_white_human else 'AI'}, Black: {'Human' if is_black_human else 'AI'}", small_font, p.Color("white"), player_button_rect)
+        draw_text_centered(screen, f"White: {player_name(white_level)}, Black: {player_name(black_level)}", small_font, p.Color("white"), player_button_rect)
 
         draw_text_left(screen, "Enter FEN (Optional):", small_font, p.Color("white"), 50, 370)
         p.draw.rect(screen, p.Color("white"), input_rect, 2)
@@ -69,19 +73,19 @@ def main_menu():
                     current_piece_set_index = piece_sets.index(selected_piece_set)
                     selected_piece_set = piece_sets[(current_piece_set_index + 1) % len(piece_sets)]
                 elif player_button_rect.collidepoint(event.pos):
-                    is_white_human = not is_white_human
-                    is_black_human = not is_black_human
+                    # The left half of the button cycles white through human and the engine levels, the right half black
+                    if event.pos[0] < player_button_rect.centerx:
+                        white_level = (white_level + 1) % (MAX_ENGINE_LEVEL + 1)
+                    else:
+                        black_level = (black_level + 1) % (MAX_ENGINE_LEVEL + 1)
                 elif input_rect.collidepoint(event.pos):
                     input_active = True
                 else:
                     input_active = False
                     if start_button_rect.collidepoint(event.pos):
                         global THEME
-                        global WHITE_IS_HUMAN, BLACK_IS_HUMAN
                         THEME = selected_theme
-                        WHITE_IS_HUMAN = is_white_human
-                        BLACK_IS_HUMAN = is_black_human
-                        main(fen_string if fen_string else None)  # Start the game with the selected FEN if provided
+                        main(fen_string if fen_string else None, white_level, black_level)  # Start the game with the selected FEN if provided
                     elif quit_button_rect.collidepoint(event.pos):
                         p.quit()
                         sys.exit()
@@ -0,0 +1,336 @@
+import argparse
+import json
+import math
+import os
+import random
+import time
+from multiprocessing import Pool
+import pgn
+import smart_move_finder
+from chess_engine import GameState
+from constants import MAX_DEPTH
+
+'''
+Headless engine-vs-engine matches, to measure a search or evaluation change over many games.
+
+Two engine configurations, each a set of smart_move_finder module settings, play game pairs from openings
+sampled out of a PGN collection, every opening once with each color. Games are played in a process pool,
+written to a PGN file as they finish, and the running score gives an Elo estimate and an SPRT log-likelihood
+ratio which can stop the match as soon as it is conclusive. The engines search from the openings, they do not
+probe the opening book.
+
+The material and piece-square tables cannot be part of a configuration: GameState keeps its score up to date
+from the tables of chess_engine on every move, so a per-engine PIECE_SCORES or PIECE_SQUARE_SCORES would only
+reach move ordering and not the evaluation, and is rejected.
+
+    python match_runner.py --engine1 '{"CASTLING_RIGHT_SCORE": 150}' --name1 castling150 --nodes 20000 --games 400 --sprt
+'''
+
+DEFAULT_OPENINGS = "assets/opening_books/Fischer.pgn"
+DEFAULT_OPENING_PLIES = 8
+
+# Module globals the search keeps between moves, every engine gets its own
+SEARCH_TABLES = ("history_table", "killer_moves", "transposition_table")
+# Settings compiled into the incremental GameState score, which the engines share
+EVALUATION_TABLES = ("PIECE_SCORES", "PIECE_SQUARE_SCORES")
+
+# Adjudication defaults, scores in centipawns from white's point of view
+RESIGN_SCORE = 1000
+RESIGN_PLIES = 8  # Consecutive plies both engines agree the game is lost
+DRAW_ADJUDICATION_SCORE = 10
+DRAW_PLIES = 12
+DRAW_START_PLY = 80
+MAX_PLIES = 400
+
+
+class MatchEngine:
+    """An engine configuration: smart_move_finder settings swapped in for its own moves, with its own search tables."""
+
+    def __init__(self, name, settings, movetime=None, nodes=None, depth=None):
+        self.name = name
+        self.settings = settings
+        self.movetime = movetime
+        self.nodes = nodes
+        self.depth = depth or settings.get("MAX_DEPTH", MAX_DEPTH)
+        self.tables = {table: {} for table in SEARCH_TABLES}
+
+    def think(self, gs, valid_moves):
+        """Search the position, returns the best move and its score from the side to move's point of view."""
+        overrides = dict(self.settings, **self.tables)
+        saved = {name: getattr(smart_move_finder, name) for name in overrides}
+        for name, value in overrides.items():
+            setattr(smart_move_finder, name, value)
+        scores = []
+        try:
+            best_move, _ = smart_move_finder.iterative_deepening(
+                gs, valid_moves, max_depth=self.depth, time_limit=self.movetime, node_limit=self.nodes,
+                on_iteration=lambda info: scores.append(info.score)
+            )
+        finally:
+            for name, value in saved.items():
+                setattr(smart_move_finder, name, value)
+        return best_move, scores[-1] if scores else None
+
+
+def sample_openings(pgn_path, count, plies, seed):
+    """FENs of distinct positions after the first plies of games of the PGN file, count of them picked at random."""
+    openings = []
+    seen = set()
+    for game in pgn.read_games(pgn_path):
+        if len(game.moves) <= plies:
+            continue
+        try:
+            for ply, (gs, move) in enumerate(pgn.replay_game(game)):
+                if ply == plies:
+                    break
+        except ValueError:
+            continue
+        fen = gs.to_fen()
+        if fen not in seen:
+            seen.add(fen)
+            openings.append(fen)
+    random.Random(seed).shuffle(openings)
+    return openings[:count]
+
+
+def adjudicate(scores, resign_score, resign_plies, draw_score, draw_plies, draw_start_ply):
+    """Result of the game from the scores of the moves so far, white's point of view, None to play on."""
+    if len(scores) >= resign_plies:
+        recent = scores[-resign_plies:]
+        if None not in recent:
+            if all(score >= resign_score for score in recent):
+                return "1-0"
+            if all(score <= -resign_score for score in recent):
+                return "0-1"
+    if len(scores) >= max(draw_plies, draw_start_ply):
+        recent = scores[-draw_plies:]
+        if None not in recent and all(abs(score) <= draw_score for score in recent):
+            return "1/2-1/2"
+    return None
+
+
+def play_game(task):
+    """Play one game in a worker process, returns the task index, the PgnGame and the engine1 color."""
+    index, fen, engine1_white, engine_specs, adjudication = task
+    engines = [MatchEngine(**spec) for spec in engine_specs]
+    white, black = engines if engine1_white else engines[::-1]
+    gs = GameState(fen=fen)
+    sans = []
+    scores = []
+    result = None
+
+    while result is None:
+        valid_moves = gs.get_all_valid_moves()
+        if not valid_moves:
+            if gs.in_check:
+                result, termination = ("0-1" if gs.white_to_move else "1-0"), "checkmate"
+            else:
+                result, termination = "1/2-1/2", "stalemate"
+        elif gs.is_game_over or gs.can_claim_draw():
+            result, termination = "1/2-1/2", "repetition" if gs.repetition_count() >= 2 else "fifty moves"
+        elif gs.has_insufficient_material():
+            result, termination = "1/2-1/2", "insufficient material"
+        elif len(sans) >= adjudication["max_plies"]:
+            result, termination = "1/2-1/2", "max plies"
+        else:
+            white_to_move = gs.white_to_move
+            move, score = (white if white_to_move else black).think(gs, valid_moves)
+            sans.append(pgn.move_to_san(gs, move, valid_moves))
+            gs.make_move(move)
+            scores.append(score if white_to_move or score is None else -score)
+            result = adjudicate(scores, adjudication["resign_score"], adjudication["resign_plies"],
+                                adjudication["draw_score"], adjudication["draw_plies"], adjudication["draw_start_ply"])
+            termination = "adjudication"
+
+    headers = {
+        "Event": "Engine match",
+        "Site": "?",
+        "Date": time.strftime("%Y.%m.%d"),
+        "Round": str(index + 1),
+        "White": white.name,
+        "Black": black.name,
+        "Result": result,
+        "FEN": fen,
+        "SetUp": "1",
+        "Termination": termination,
+        "PlyCount": str(len(sans))
+    }
+    return index, pgn.PgnGame(headers, sans), engine1_white
+
+
+def expected_score(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def elo_difference(score):
+    """Elo difference giving that expected score, clamped so 0% and 100% stay finite."""
+    score = min(max(score, 1e-4), 1 - 1e-4)
+    return 400 * math.log10(score / (1 - score))
+
+
+def score_statistics(wins, draws, losses):
+    """Mean score per game and its per game variance."""
+    games = wins + draws + losses
+    score = (wins + 0.5 * draws) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    return score, variance
+
+
+def elo_estimate(wins, draws, losses):
+    """Elo difference and its 95% confidence margin."""
+    games = wins + draws + losses
+    if not games:
+        return 0.0, 0.0
+    score, variance = score_statistics(wins, draws, losses)
+    margin = 1.96 * math.sqrt(variance / games)
+    return elo_difference(score), (elo_difference(score + margin) - elo_difference(score - margin)) / 2
+
+
+def sprt_llr(wins, draws, losses, elo0, elo1):
+    """Log-likelihood ratio of H1 (elo1) against H0 (elo0), normal approximation of the trinomial game results."""
+    games = wins + draws + losses
+    if not games:
+        return 0.0
+    score, variance = score_statistics(wins, draws, losses)
+    if variance == 0:
+        return 0.0
+    s0, s1 = expected_score(elo0), expected_score(elo1)
+    return games * (s1 - s0) * (2 * score - s0 - s1) / (2 * variance)
+
+
+def sprt_bounds(alpha, beta):
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def run_match(engine_specs, games, openings, adjudication, workers=None, pgn_path=None, sprt=None, log=print):
+    """
+    Play the match, engine1 is engine_specs[0]. sprt is (elo0, elo1, alpha, beta) to stop the match once
+    the SPRT accepts a hypothesis. Returns the results and statistics as a dict.
+    """
+    tasks = [
+        (i, openings[i // 2 % len(openings)], i % 2 == 0, engine_specs, adjudication)
+        for i in range(games)
+    ]
+    wins = draws = losses = 0
+    llr = 0.0
+    bounds = sprt_bounds(sprt[2], sprt[3]) if sprt else None
+    verdict = None
+    start_time = time.time()
+    pgn_file = open(pgn_path, "a") if pgn_path else None
+
+    try:
+        with Pool(workers) as pool:
+            for finished, (index, game, engine1_white) in enumerate(pool.imap_unordered(play_game, tasks), 1):
+                if pgn_file:
+                    pgn_file.write(pgn.format_game(game))
+                    pgn_file.flush()
+                engine1_score = game.result if engine1_white else 1 - game.result
+                if engine1_score == 1:
+                    wins += 1
+                elif engine1_score == 0:
+                    losses += 1
+                else:
+                    draws += 1
+
+                elo, margin = elo_estimate(wins, draws, losses)
+                status = f"Game {finished}/{games}: {game.headers['White']} - {game.headers['Black']} " \
+                         f"{game.headers['Result']} ({game.headers['Termination']}) | W{wins} D{draws} L{losses} " \
+                         f"| Elo {elo:+.1f} +/- {margin:.1f}"
+                if sprt:
+                    llr = sprt_llr(wins, draws, losses, sprt[0], sprt[1])
+                    status += f" | LLR {llr:.2f} ({bounds[0]:.2f}, {bounds[1]:.2f})"
+                log(status)
+
+                if sprt and (llr <= bounds[0] or llr >= bounds[1]):
+                    verdict = "H1" if llr >= bounds[1] else "H0"
+                    break  # Leaving the with block terminates the games still running
+    finally:
+        if pgn_file:
+            pgn_file.close()
+
+    elo, margin = elo_estimate(wins, draws, losses)
+    return {
+        "engine1": engine_specs[0]["name"],
+        "engine2": engine_specs[1]["name"],
+        "games": wins + draws + losses,
+        "wins": wins,
+        "draws": draws,
+        "losses": losses,
+        "elo": round(elo, 1),
+        "elo_margin": round(margin, 1),
+        "llr": round(llr, 3) if sprt else None,
+        "sprt": verdict,
+        "time": round(time.time() - start_time, 1)
+    }
+
+
+def parse_settings(text):
+    """Engine settings from a JSON object of smart_move_finder module attributes, other than the EVALUATION_TABLES."""
+    settings = json.loads(text)
+    unknown = [name for name in settings if not hasattr(smart_move_finder, name)]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Unknown smart_move_finder settings: {', '.join(unknown)}")
+    unsupported = [name for name in settings if name in EVALUATION_TABLES]
+    if unsupported:
+        raise argparse.ArgumentTypeError(f"Settings of the incremental evaluation cannot differ between engines: "
+                                         f"{', '.join(unsupported)}")
+    return settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play a match between two engine configurations.")
+    parser.add_argument("--engine1", type=parse_settings, default={}, help="JSON smart_move_finder settings of engine 1")
+    parser.add_argument("--engine2", type=parse_settings, default={}, help="JSON smart_move_finder settings of engine 2")
+    parser.add_argument("--name1", default="engine1")
+    parser.add_argument("--name2", default="engine2")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--movetime", type=float, help="Seconds per move")
+    parser.add_argument("--nodes", type=int, help="Nodes per move, reproducible unlike --movetime")
+    parser.add_argument("--depth", type=int, help="Maximum depth per move")
+    parser.add_argument("--openings", default=DEFAULT_OPENINGS, help="PGN file the openings are sampled from")
+    parser.add_argument("--opening-plies", type=int, default=DEFAULT_OPENING_PLIES)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--pgn", default="match.pgn", help="PGN file the games are appended to")
+    parser.add_argument("--resign-score", type=int, default=RESIGN_SCORE)
+    parser.add_argument("--resign-plies", type=int, default=RESIGN_PLIES)
+    parser.add_argument("--draw-score", type=int, default=DRAW_ADJUDICATION_SCORE)
+    parser.add_argument("--draw-plies", type=int, default=DRAW_PLIES)
+    parser.add_argument("--draw-start-ply", type=int, default=DRAW_START_PLY)
+    parser.add_argument("--max-plies", type=int, default=MAX_PLIES)
+    parser.add_argument("--sprt", action="store_true", help="Stop as soon as the SPRT accepts a hypothesis")
+    parser.add_argument("--elo0", type=float, default=0.0)
+    parser.add_argument("--elo1", type=float, default=5.0)
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--beta", type=float, default=0.05)
+    parser.add_argument("--json", help="Write the final statistics to this file")
+    args = parser.parse_args()
+
+    if args.movetime is None and args.nodes is None and args.depth is None:
+        parser.error("Give at least one of --movetime, --nodes and --depth")
+
+    engine_specs = [
+        {"name": name, "settings": settings,
+         "movetime": args.movetime, "nodes": args.nodes, "depth": args.depth}
+        for name, settings in ((args.name1, args.engine1), (args.name2, args.engine2))
+    ]
+    openings = sample_openings(args.openings, (args.games + 1) // 2, args.opening_plies, args.seed)
+    if not openings:
+        parser.error(f"No openings of {args.opening_plies} plies found in {args.openings}")
+    adjudication = {
+        "resign_score": args.resign_score, "resign_plies": args.resign_plies, "draw_score": args.draw_score,
+        "draw_plies": args.draw_plies, "draw_start_ply": args.draw_start_ply, "max_plies": args.max_plies
+    }
+    sprt = (args.elo0, args.elo1, args.alpha, args.beta) if args.sprt else None
+
+    results = run_match(engine_specs, args.games, openings, adjudication, args.workers, args.pgn, sprt)
+    print(f"{results['engine1']} vs {results['engine2']}: +{results['wins']} ={results['draws']} -{results['losses']}, "
+          f"Elo {results['elo']:+.1f} +/- {results['elo_margin']:.1f}"
+          + (f", SPRT {results['sprt'] or 'inconclusive'} (LLR {results['llr']})" if sprt else ""))
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(results, json_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
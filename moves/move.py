@@ -1,41 +1,149 @@
 from constants import PIECES_SYMBOLS
 
-class Move: 
-    def __init__(self, from_square, end_square, board_state, is_pawn_promotion = False, is_en_passant = False, is_castling = False):
-        self.start_row = from_square[0]
-        self.start_col = from_square[1]
-        self.end_row = end_square[0]
-        self.end_col = end_square[1]
-        self.start_square = from_square
-        self.end_square = end_square
-        self.piece_moved = board_state[self.start_row][self.start_col]
-        self.piece_captured = board_state[self.end_row][self.end_col]
-
-        # Pawn Promotion: If pawn is on last rank
-        self.is_pawn_promotion = is_pawn_promotion
-        
-        # En Passant: If pawn is moved to en passant square
-        self.is_en_passant_move = is_en_passant
-        if self.is_en_passant_move:
+'''
+Inside the engine a move is a 16-bit integer code: from square | to square << 6 | flags << 12,
+with square = row * 8 + col. Move generation, make/undo and search work on codes only, Move objects
+wrap a code together with the pieces involved for the UI, PGN, opening book and other callers.
+'''
+
+# Move flags, the 4 high bits of a code
+QUIET = 0
+DOUBLE_PAWN_PUSH = 1
+KING_CASTLE = 2
+QUEEN_CASTLE = 3
+CAPTURE = 4  # Set on every capture flag below
+EN_PASSANT = 5
+PROMOTION = 8  # Flags 8 to 11 promote to PROMOTION_PIECES[flags & 3], 12 to 15 are promotions with a capture
+PROMOTION_PIECES = "NBRQ"
+PROMOTION_FLAGS = {piece: PROMOTION | i for i, piece in enumerate(PROMOTION_PIECES)}
+CAPTURE_BITS = CAPTURE << 12  # The capture flag in place in a code, for generators or-ing it in
+
+
+# Code of the null move in the undo records, a8 to a8 is never a move
+NULL_MOVE = 0
+
+
+def encode_move(start_square, end_square, flags=QUIET):
+    return start_square | end_square << 6 | flags << 12
+
+
+def code_to_uci(code):
+    """UCI notation of a move code, "e7e8q" for a queen promotion."""
+    start_square = code & 63
+    end_square = code >> 6 & 63
+    flags = code >> 12
+    uci = Move.cols_to_files[start_square & 7] + Move.rows_to_ranks[start_square >> 3] \
+        + Move.cols_to_files[end_square & 7] + Move.rows_to_ranks[end_square >> 3]
+    if flags & PROMOTION:
+        uci += PROMOTION_PIECES[flags & 3].lower()
+    return uci
+
+
+class Move:
+    __slots__ = ("code", "piece_moved", "piece_captured", "san")
+
+    def __init__(self, from_square, end_square, board_state, is_pawn_promotion = False, is_en_passant = False, is_castling = False, promotion_piece = "Q"):
+        """Build a move from squares, as the UI does from clicks. The engine builds them with from_code."""
+        start_row, start_col = from_square
+        end_row, end_col = end_square
+        self.validate_coordinates(start_row, start_col, end_row, end_col)
+        self.piece_moved = board_state[start_row][start_col]
+        self.piece_captured = board_state[end_row][end_col]
+
+        if is_castling:
+            flags = KING_CASTLE if end_col > start_col else QUEEN_CASTLE
+        elif is_en_passant:
+            # En Passant: the captured pawn is not on the end square
+            flags = EN_PASSANT
             self.piece_captured = "wP" if self.piece_moved == "bP" else "bP"
+        elif is_pawn_promotion:
+            flags = PROMOTION_FLAGS[promotion_piece] | (CAPTURE if self.piece_captured != "--" else 0)
+        elif self.piece_captured != "--":
+            flags = CAPTURE
+        elif self.piece_moved[1:] == "P" and abs(end_row - start_row) == 2:
+            flags = DOUBLE_PAWN_PUSH
+        else:
+            flags = QUIET
+        self.code = encode_move(start_row * 8 + start_col, end_row * 8 + end_col, flags)
 
-        # Castling: If this is a castling move
-        self.is_castling = is_castling
+        # SAN of the move, set by pgn.move_to_san which knows the position it is played in
+        self.san = None
 
-        # Generate a specific id for a move
-        self.move_id = self.start_row * 1000 + self.start_col * 100 + self.end_row * 10 + self.end_col
-        
-        # Validate move coordinates
-        self.validate_coordinates()
+    @classmethod
+    def from_code(cls, code, board_state):
+        """Wrap a move code generated in the position of board_state, before the move is made."""
+        move = cls.__new__(cls)
+        move.code = code
+        start_square = code & 63
+        end_square = code >> 6 & 63
+        move.piece_moved = board_state[start_square >> 3][start_square & 7]
+        if code >> 12 == EN_PASSANT:
+            move.piece_captured = "wP" if move.piece_moved == "bP" else "bP"
+        else:
+            move.piece_captured = board_state[end_square >> 3][end_square & 7]
+        move.san = None
+        return move
 
     ranks_to_rows = {"1": 7, "2": 6, "3": 5, "4": 4, "5": 3, "6": 2, "7": 1, "8": 0}
     rows_to_ranks = {v: k for k, v in ranks_to_rows.items()}
     files_to_cols = {"a": 0, "b": 1, "c": 2, "d": 3, "e": 4, "f": 5, "g": 6, "h": 7}
     cols_to_files = {v: k for k, v in files_to_cols.items()}
+    promotion_ids = {"": 0, "Q": 0, "R": 1, "B": 2, "N": 3}
+
+    @property
+    def start_row(self):
+        return (self.code & 63) >> 3
 
-    def validate_coordinates(self):
-        if not (0 <= self.start_row < 8 and 0 <= self.start_col < 8 and 0 <= self.end_row < 8 and 0 <= self.end_col < 8):
-            raise ValueError(f"Invalid move coordinates: start=({self.start_row}, {self.start_col}), end=({self.end_row}, {self.end_col})")
+    @property
+    def start_col(self):
+        return self.code & 7
+
+    @property
+    def end_row(self):
+        return (self.code >> 6 & 63) >> 3
+
+    @property
+    def end_col(self):
+        return self.code >> 6 & 7
+
+    @property
+    def start_square(self):
+        return (self.start_row, self.start_col)
+
+    @property
+    def end_square(self):
+        return (self.end_row, self.end_col)
+
+    @property
+    def is_pawn_promotion(self):
+        return bool(self.code >> 12 & PROMOTION)
+
+    @property
+    def promotion_piece(self):
+        flags = self.code >> 12
+        return PROMOTION_PIECES[flags & 3] if flags & PROMOTION else ""
+
+    @property
+    def is_en_passant_move(self):
+        return self.code >> 12 == EN_PASSANT
+
+    @property
+    def is_castling(self):
+        return self.code >> 12 in (KING_CASTLE, QUEEN_CASTLE)
+
+    @property
+    def move_id(self):
+        """
+        Id of the move squares and promotion piece. Queen promotions keep the plain id,
+        so the move built from two clicks on the board promotes to a queen.
+        """
+        return self.start_row * 1000 + self.start_col * 100 + self.end_row * 10 + self.end_col \
+            + self.promotion_ids[self.promotion_piece] * 10000
+
+    @staticmethod
+    def validate_coordinates(start_row, start_col, end_row, end_col):
+        if not (0 <= start_row < 8 and 0 <= start_col < 8 and 0 <= end_row < 8 and 0 <= end_col < 8):
+            raise ValueError(f"Invalid move coordinates: start=({start_row}, {start_col}), end=({end_row}, {end_col})")
 
     def __eq__(self, other):
         if isinstance(other, Move):
@@ -45,17 +153,20 @@ class Move:
         return PIECES_SYMBOLS[piece]
 
     def __str__(self):
+        if self.san:
+            return self.san
+
         if self.is_castling:
             return "O-O" if self.end_col == 6 else "O-O-O"
 
         if self.piece_captured != "--":
             if self.piece_moved == "wP" or self.piece_moved == "bP":
-                return self.get_rank_file(self.start_row, self.start_col)[0] + "x" + self.get_rank_file(self.end_row, self.end_col)
+                return self.get_rank_file(self.start_row, self.start_col)[0] + "x" + self.get_rank_file(self.end_row, self.end_col) + ("=" + self.promotion_piece if self.is_pawn_promotion else "")
             else:
                 return self.piece_moved[1] + "x" + self.get_rank_file(self.end_row, self.end_col)
         else:
             if self.piece_moved == "wP" or self.piece_moved == "bP":
-                return self.get_rank_file(self.end_row, self.end_col)
+                return self.get_rank_file(self.end_row, self.end_col) + ("=" + self.promotion_piece if self.is_pawn_promotion else "")
             return self.piece_moved[1] + self.get_rank_file(self.end_row, self.end_col)
 
     def get_rank_file(self, row, col):
@@ -70,6 +181,4 @@ class Move:
         Returns:
             str: The move in UCI format.
         """
-        start_square_uci = self.get_rank_file(self.start_row, self.start_col)
-        end_square_uci = self.get_rank_file(self.end_row, self.end_col)
-        return start_square_uci + end_square_uci
+        return code_to_uci(self.code)
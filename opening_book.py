@@ -0,0 +1,127 @@
+import argparse
+import mmap
+import os
+import random
+import struct
+import time
+import pgn
+import zobrist
+from constants import DIMENSION, OPENING_BOOK_PATH, OPENING_BOOK_MAX_PLY
+
+'''
+Binary opening book compiled from PGN games.
+
+The book is a file of fixed 16-byte big-endian records sorted by position hash: key (u64), move (u16),
+weight (u16) and an unused u32, the Polyglot record layout keyed with this engine's Zobrist hashes.
+Moves are stored as from square | to square << 6 | promotion << 12 with square = row * 8 + col.
+
+    python opening_book.py assets/opening_books/Fischer.pgn --output assets/opening_books/fischer.bin
+'''
+
+RECORD = struct.Struct(">QHHI")
+KEY = struct.Struct(">Q")
+MAX_WEIGHT = 0xFFFF
+PROMOTION_CODES = {"": 0, "N": 1, "B": 2, "R": 3, "Q": 4}
+
+
+def encode_book_move(move):
+    promotion = PROMOTION_CODES[move.promotion_piece]
+    from_square = move.start_row * DIMENSION + move.start_col
+    to_square = move.end_row * DIMENSION + move.end_col
+    return from_square | to_square << 6 | promotion << 12
+
+
+def compile_book(pgn_paths, output_path, max_ply=OPENING_BOOK_MAX_PLY, min_weight=1):
+    """
+    Replay the first max_ply moves of every game and write the book.
+    A move scores 2 for every game its side won and 1 for every draw, moves scoring less than min_weight are dropped.
+    """
+    weights = {}
+    games_count = 0
+    for pgn_path in pgn_paths:
+        for game in pgn.read_games(pgn_path):
+            result = game.result
+            if result is None:
+                continue
+            games_count += 1
+            try:
+                for ply, (gs, move) in enumerate(pgn.replay_game(game)):
+                    if ply >= max_ply:
+                        break
+                    mover_result = result if gs.white_to_move else 1.0 - result
+                    entry = (zobrist.hash_position(gs), encode_book_move(move))
+                    weights[entry] = weights.get(entry, 0) + int(mover_result * 2)
+            except ValueError:
+                continue  # Keep the moves replayed before the unreadable one
+
+    records = sorted(
+        ((key, move, min(weight, MAX_WEIGHT)) for (key, move), weight in weights.items() if weight >= min_weight),
+        key=lambda record: (record[0], -record[2], record[1])
+    )
+    with open(output_path, "wb") as book_file:
+        for key, move, weight in records:
+            book_file.write(RECORD.pack(key, move, weight, 0))
+    return games_count, len(records)
+
+
+class OpeningBook:
+    def __init__(self, path):
+        self.book_file = open(path, "rb")
+        self.size = os.fstat(self.book_file.fileno()).st_size
+        self.data = mmap.mmap(self.book_file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        self.count = self.size // RECORD.size
+
+    def close(self):
+        if self.size:
+            self.data.close()
+        self.book_file.close()
+
+    def key_at(self, index):
+        return KEY.unpack_from(self.data, index * RECORD.size)[0]
+
+    def probe(self, key):
+        """Binary search the records of a position hash, returns [(move, weight)] best first."""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        entries = []
+        while low < self.count:
+            record_key, move, weight, _ = RECORD.unpack_from(self.data, low * RECORD.size)
+            if record_key != key:
+                break
+            entries.append((move, weight))
+            low += 1
+        return entries
+
+    def find_move(self, gs, valid_moves, rng=random):
+        """Pick a book move for the position, at random in proportion to the weights, or None when out of book."""
+        entries = self.probe(zobrist.hash_position(gs))
+        if not entries:
+            return None
+        valid_by_code = {encode_book_move(move): move for move in valid_moves}
+        candidates = [(valid_by_code[move], weight) for move, weight in entries if move in valid_by_code]
+        if not candidates:
+            return None
+        return rng.choices([move for move, _ in candidates], weights=[weight for _, weight in candidates])[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile an opening book from PGN files.")
+    parser.add_argument("pgn", nargs="+", help="PGN files to read the games from")
+    parser.add_argument("--output", default=OPENING_BOOK_PATH)
+    parser.add_argument("--max-ply", type=int, default=OPENING_BOOK_MAX_PLY)
+    parser.add_argument("--min-weight", type=int, default=1)
+    args = parser.parse_args()
+
+    start_time = time.time()
+    games_count, records_count = compile_book(args.pgn, args.output, args.max_ply, args.min_weight)
+    print(f"{records_count} book entries from {games_count} games written to {args.output} in {time.time() - start_time:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import argparse
+import time
+from chess_engine import GameState
+from moves.move import code_to_uci
+
+'''
+Perft: count the leaf nodes of the legal move tree to a fixed depth, the reference test of move generation.
+
+    python perft.py 4
+    python perft.py 3 --fen "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1" --divide
+    python perft.py --suite
+'''
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# Published node counts, (fen, [nodes at depth 1, 2, ...])
+SUITE = [
+    (START_FEN, [20, 400, 8902, 197281, 4865609]),
+    ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", [48, 2039, 97862, 4085603]),
+    ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812, 43238, 674624]),
+    ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", [6, 264, 9467, 422333]),
+    ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", [44, 1486, 62379, 2103487]),
+    ("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", [46, 2079, 89890, 3894594])
+]
+
+
+class PerftTable:
+    """Fixed size hash table of subtree counts, keyed by position hash and remaining depth."""
+
+    def __init__(self, size_mb=16):
+        self.size = max(1, size_mb * 1024 * 1024 // 64)
+        self.entries = [None] * self.size
+
+    def get(self, key, depth):
+        entry = self.entries[(key ^ depth) % self.size]
+        if entry is not None and entry[0] == key and entry[1] == depth:
+            return entry[2]
+        return None
+
+    def put(self, key, depth, nodes):
+        self.entries[(key ^ depth) % self.size] = (key, depth, nodes)
+
+
+def perft(gs, depth, table=None, bulk=True):
+    """Number of leaf nodes depth plies below the position of gs."""
+    if depth == 0:
+        return 1
+    if table is not None:
+        nodes = table.get(gs.hash, depth)
+        if nodes is not None:
+            return nodes
+
+    valid_moves = gs.get_valid_move_codes()
+    if depth == 1 and bulk:
+        # Bulk counting: the moves of the last ply are leaves, no need to make them
+        return len(valid_moves)
+
+    nodes = 0
+    for code in valid_moves:
+        gs.make_move_code(code)
+        nodes += perft(gs, depth - 1, table, bulk)
+        gs.undo_move_code()
+
+    if table is not None:
+        table.put(gs.hash, depth, nodes)
+    return nodes
+
+
+def divide(gs, depth, table=None, bulk=True):
+    """Perft split by root move, returns [(uci move, nodes)]."""
+    results = []
+    for code in gs.get_valid_move_codes():
+        gs.make_move_code(code)
+        results.append((code_to_uci(code), perft(gs, depth - 1, table, bulk)))
+        gs.undo_move_code()
+    return results
+
+
+def run_suite(max_nodes, table_mb, bulk):
+    """Check every suite position at the depths whose expected count is at most max_nodes."""
+    failures = 0
+    for fen, expected_counts in SUITE:
+        for depth, expected in enumerate(expected_counts, start=1):
+            if expected > max_nodes:
+                break
+            table = PerftTable(table_mb) if table_mb else None
+            start_time = time.time()
+            nodes = perft(GameState(fen=fen), depth, table, bulk)
+            elapsed = time.time() - start_time
+            status = "ok" if nodes == expected else f"FAILED, expected {expected}"
+            failures += nodes != expected
+            print(f"{fen} depth {depth}: {nodes} nodes in {elapsed:.2f}s {status}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count the leaf nodes of the legal move tree.")
+    parser.add_argument("depth", type=int, nargs="?", default=3)
+    parser.add_argument("--fen", default=START_FEN)
+    parser.add_argument("--divide", action="store_true", help="Print the node count below every root move")
+    parser.add_argument("--hash", type=int, default=0, help="Hash table size in MB, 0 to disable")
+    parser.add_argument("--no-bulk", action="store_true", help="Make the moves of the last ply too")
+    parser.add_argument("--suite", action="store_true", help="Check the published counts of the standard positions")
+    parser.add_argument("--max-nodes", type=int, default=100000, help="Largest expected count checked by --suite")
+    args = parser.parse_args()
+
+    if args.suite:
+        failures = run_suite(args.max_nodes, args.hash, not args.no_bulk)
+        print("All counts match" if not failures else f"{failures} counts do not match")
+        raise SystemExit(1 if failures else 0)
+
+    gs = GameState(fen=args.fen)
+    table = PerftTable(args.hash) if args.hash else None
+    start_time = time.time()
+    if args.divide:
+        results = divide(gs, args.depth, table, not args.no_bulk)
+        for uci, nodes in sorted(results):
+            print(f"{uci}: {nodes}")
+        nodes = sum(nodes for _, nodes in results)
+    else:
+        nodes = perft(gs, args.depth, table, not args.no_bulk)
+    elapsed = time.time() - start_time
+
+    print(f"Nodes: {nodes}")
+    print(f"Time: {elapsed:.2f}s")
+    print(f"Nodes/s: {nodes / elapsed if elapsed else 0:.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import re
+from chess_engine import GameState
+from constants import DIMENSION
+from utils import Utils
+
+'''
+Reading and writing PGN.
+
+Games are streamed one at a time from files of any size: only the game being read is held in memory.
+SAN moves are resolved against the valid moves of a GameState through an index keyed by destination
+square, and move_to_san writes fully disambiguated SAN with check and mate suffixes.
+'''
+
+RESULTS = {"1-0": 1.0, "0-1": 0.0, "1/2-1/2": 0.5, "*": None}
+
+HEADER_PATTERN = re.compile(r'\[(\w+)\s+"(.*)"\]')
+# Comments (possibly left open at the end of the line), variation brackets, NAGs and move tokens
+TOKEN_PATTERN = re.compile(r'\{[^}]*\}?|;.*|\(|\)|\$\d+|[^\s(){};$]+')
+MOVE_NUMBER_PATTERN = re.compile(r'^\d+\.+')
+SAN_PATTERN = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
+CASTLING_SANS = {"O-O": "O-O", "0-0": "O-O", "O-O-O": "O-O-O", "0-0-0": "O-O-O"}
+
+# "e4" -> square index (row * 8 + col)
+SQUARE_INDEXES = {
+    Utils.get_rank_file(row, col): row * DIMENSION + col for row in range(DIMENSION) for col in range(DIMENSION)
+}
+
+
+class PgnGame:
+    def __init__(self, headers, moves, comments=None):
+        self.headers = headers
+        self.moves = moves  # SAN moves of the main line, in order
+        self.comments = comments  # Written after the move of the same index when given, None to skip one
+
+    @property
+    def result(self):
+        """Game result from white's point of view: 1.0, 0.5, 0.0 or None when unknown."""
+        return RESULTS.get(self.headers.get("Result", "*"))
+
+    def __repr__(self):
+        return f"PgnGame({self.headers.get('White', '?')} - {self.headers.get('Black', '?')}, {len(self.moves)} plies)"
+
+
+def read_games(source):
+    """Yield the games of a PGN file path, or of an open text file, one at a time."""
+    if isinstance(source, str):
+        with open(source, encoding="utf-8", errors="replace") as pgn_file:
+            yield from read_games(pgn_file)
+        return
+
+    headers = {}
+    moves = []
+    in_comment = False
+    variation_depth = 0
+
+    for line in source:
+        if in_comment:
+            comment_end = line.find("}")
+            if comment_end < 0:
+                continue
+            line = line[comment_end + 1:]
+            in_comment = False
+
+        line = line.strip()
+        if not line or line.startswith("%"):
+            continue
+
+        if line.startswith("[") and variation_depth == 0:
+            if moves:  # Previous game had no result token
+                yield PgnGame(headers, moves)
+                headers, moves = {}, []
+            match = HEADER_PATTERN.match(line)
+            if match:
+                headers[match.group(1)] = match.group(2)
+            continue
+
+        for token in TOKEN_PATTERN.findall(line):
+            first = token[0]
+            if first == "{":
+                in_comment = not token.endswith("}")
+            elif first == ";" or first == "$":
+                continue
+            elif first == "(":
+                variation_depth += 1
+            elif first == ")":
+                variation_depth = max(variation_depth - 1, 0)
+            elif variation_depth == 0:
+                if token in RESULTS:
+                    headers.setdefault("Result", token)
+                    yield PgnGame(headers, moves)
+                    headers, moves = {}, []
+                    continue
+                token = MOVE_NUMBER_PATTERN.sub("", token)
+                if token:
+                    moves.append(token)
+
+    if moves or headers:
+        yield PgnGame(headers, moves)
+
+
+def index_moves(valid_moves):
+    """Index valid moves by destination square for SAN lookups, castling moves are indexed by their SAN."""
+    move_index = {}
+    for move in valid_moves:
+        if move.is_castling:
+            key = "O-O" if move.end_col > move.start_col else "O-O-O"
+        else:
+            key = move.end_row * DIMENSION + move.end_col
+        if key in move_index:
+            move_index[key].append(move)
+        else:
+            move_index[key] = [move]
+    return move_index
+
+
+def parse_san(san, move_index):
+    """Find the move written as san among the moves of index_moves(valid_moves)."""
+    san = san.rstrip("+#!?")
+    if san in CASTLING_SANS:
+        candidates = move_index.get(CASTLING_SANS[san])
+        if not candidates:
+            raise ValueError(f"Illegal castling move: {san}")
+        return candidates[0]
+
+    match = SAN_PATTERN.match(san)
+    if not match:
+        raise ValueError(f"Invalid SAN move: {san}")
+    piece_type, from_file, from_rank, to_square, promotion = match.groups()
+    piece_type = piece_type or "P"
+    from_col = Utils.files_to_cols[from_file] if from_file else None
+    from_row = Utils.ranks_to_rows[from_rank] if from_rank else None
+
+    found = None
+    for move in move_index.get(SQUARE_INDEXES[to_square], ()):
+        if move.piece_moved[1] != piece_type or move.promotion_piece != (promotion or ""):
+            continue
+        if (from_col is not None and move.start_col != from_col) or (from_row is not None and move.start_row != from_row):
+            continue
+        if found is not None:
+            raise ValueError(f"Ambiguous SAN move: {san}")
+        found = move
+
+    if found is None:
+        raise ValueError(f"Illegal SAN move: {san}")
+    return found
+
+
+def move_to_san(gs, move, valid_moves):
+    """Write a valid move of the current position of gs in SAN, with disambiguation and check or mate suffix."""
+    if move.is_castling:
+        san = "O-O" if move.end_col > move.start_col else "O-O-O"
+    else:
+        piece_type = move.piece_moved[1]
+        destination = Utils.get_rank_file(move.end_row, move.end_col)
+        capture = "x" if move.piece_captured != "--" else ""
+        if piece_type == "P":
+            san = (Utils.cols_to_files[move.start_col] + capture if capture else "") + destination
+            if move.is_pawn_promotion:
+                san += "=" + move.promotion_piece
+        else:
+            rivals = [
+                other for other in valid_moves
+                if other.piece_moved == move.piece_moved and other.end_row == move.end_row
+                and other.end_col == move.end_col and other.start_square != move.start_square
+            ]
+            disambiguation = ""
+            if rivals:
+                if all(other.start_col != move.start_col for other in rivals):
+                    disambiguation = Utils.cols_to_files[move.start_col]
+                elif all(other.start_row != move.start_row for other in rivals):
+                    disambiguation = Utils.rows_to_ranks[move.start_row]
+                else:
+                    disambiguation = Utils.get_rank_file(move.start_row, move.start_col)
+            san = piece_type + disambiguation + capture + destination
+
+    gs.make_move(move)
+    if gs.in_check:
+        san += "+" if gs.get_all_valid_moves() else "#"
+    gs.undo_last_move()
+    return san
+
+
+def format_game(game, line_length=80):
+    """Write a PgnGame as PGN text, move numbers follow the FEN header when the game has one."""
+    lines = [f'[{name} "{value}"]' for name, value in game.headers.items()]
+    fen_fields = game.headers.get("FEN", "").split()
+    white_to_move = len(fen_fields) < 2 or fen_fields[1] == "w"
+    move_number = int(fen_fields[5]) if len(fen_fields) > 5 else 1
+
+    tokens = []
+    for i, san in enumerate(game.moves):
+        if white_to_move:
+            tokens.append(f"{move_number}.")
+        elif i == 0:
+            tokens.append(f"{move_number}...")
+        tokens.append(san)
+        comment = game.comments[i] if game.comments else None
+        if comment:
+            tokens.append("{" + comment + "}")
+            if white_to_move and i + 1 < len(game.moves):
+                tokens.append(f"{move_number}...")  # Black's move after a comment gets its number again
+        if not white_to_move:
+            move_number += 1
+        white_to_move = not white_to_move
+    tokens.append(game.headers.get("Result", "*"))
+
+    movetext = []
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > line_length:
+            movetext.append(line)
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    movetext.append(line)
+    return "\n".join(lines) + "\n\n" + "\n".join(movetext) + "\n\n"
+
+
+def replay_game(game):
+    """
+    Replay the moves of a PgnGame from its starting position.
+    Yields (gs, move) before each move is made, the same GameState is reused throughout.
+    Raises ValueError when a move cannot be resolved.
+    """
+    gs = GameState(fen=game.headers.get("FEN"))
+    for san in game.moves:
+        move = parse_san(san, index_moves(gs.get_all_valid_moves()))
+        yield gs, move
+        gs.make_move(move)
@@ -1,35 +1,20 @@
-from moves.move import Move
+from moves.move import CAPTURE_BITS
+from attack_tables import KING_TARGETS
 
 class King():
-    def __init__(self):
-        pass
-
-    def get_moves(self, gs, r, c, moves):
+    def get_moves(self, gs, square, moves):
         """
-        Get all the king moves for the king located at r, c and add the moves to the list.
+        Get all the king moves for the king on square and add the moves to the list.
         """
-        row_moves = (-1, -1, -1, 0, 0, 1, 1, 1)
-        col_moves = (-1, 0, 1, -1, 1, -1, 0, 1)
         ally_color = "w" if gs.white_to_move else "b"
+        board = gs.board
+        king_row, king_col = square >> 3, square & 7
+        king = board[king_row][king_col]
 
-        for i in range(8):
-            end_row = r + row_moves[i]
-            end_col = c + col_moves[i]
-            if 0 <= end_row <= 7 and 0 <= end_col <= 7:
-                end_piece = gs.board[end_row][end_col]
-                if end_piece[0] != ally_color:  # Not an ally piece - empty or enemy
-                    # Temporarily move the king and check for checks
-                    if ally_color == "w":
-                        gs.w_king_location = (end_row, end_col)
-                    else:
-                        gs.b_king_location = (end_row, end_col)
-                    
-                    in_check, pinned_pieces, checks = gs.check_for_pins_and_checks()
-                    if not in_check:
-                        moves.append(Move((r, c), (end_row, end_col), gs.board))
-                    
-                    # Move the king back to the original location
-                    if ally_color == "w":
-                        gs.w_king_location = (r, c)
-                    else:
-                        gs.b_king_location = (r, c)
+        # Lift the king, so squares on the line of a slider checking it count as attacked
+        board[king_row][king_col] = "--"
+        for row, col, end_square in KING_TARGETS[square]:
+            end_piece = board[row][col]
+            if end_piece[0] != ally_color and not gs.is_square_attacked(row, col, not gs.white_to_move):
+                moves.append(square | end_square << 6 | (CAPTURE_BITS if end_piece != "--" else 0))
+        board[king_row][king_col] = king
@@ -1,28 +1,19 @@
-from moves.move import Move
+from moves.move import CAPTURE_BITS
+from attack_tables import KNIGHT_TARGETS
 
 class Knight():
-    def __init__(self): 
-        pass
-
-    def get_moves(self, gs, r, c, moves):
+    def get_moves(self, gs, square, moves):
         """
-        Get all the knight moves for the knight located at r, c and add the moves to the list.
+        Get all the knight moves for the knight on square and add the moves to the list.
         """
-        piece_pinned = False
-        for i in range(len(gs.pinned_pieces) - 1, -1, -1):
-            if gs.pinned_pieces[i][0] == r and gs.pinned_pieces[i][1] == c:
-                piece_pinned = True
-                gs.pinned_pieces.remove(gs.pinned_pieces[i])
-                break
+        if square in gs.pinned_pieces:  # A pinned knight cannot move along the pin line
+            return
 
-        knight_moves = ((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2), (1, -2))  # All possible knight moves
         ally_color = "w" if gs.white_to_move else "b"
-
-        for move in knight_moves:
-            end_row = r + move[0]
-            end_col = c + move[1]
-            if 0 <= end_row <= 7 and 0 <= end_col <= 7:
-                if not piece_pinned:
-                    end_piece = gs.board[end_row][end_col]
-                    if end_piece[0] != ally_color:  # So it's either an enemy piece or an empty square
-                        moves.append(Move((r, c), (end_row, end_col), gs.board))
+        board = gs.board
+        for row, col, end_square in KNIGHT_TARGETS[square]:
+            end_piece = board[row][col]
+            if end_piece == "--":
+                moves.append(square | end_square << 6)
+            elif end_piece[0] != ally_color:
+                moves.append(square | end_square << 6 | CAPTURE_BITS)
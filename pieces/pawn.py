@@ -1,105 +1,70 @@
-from moves.move import Move
+from moves.move import CAPTURE, EN_PASSANT, DOUBLE_PAWN_PUSH, PROMOTION_FLAGS
+from attack_tables import PAWN_CAPTURES
 
-class Pawn:
-    def __init__(self):
-        pass
-
-    def get_moves(self, gs, r, c, moves):
-        is_piece_pinned = False
-        pin_direction = ()
+PROMOTION_PIECES = ("Q", "R", "B", "N")
 
+class Pawn:
+    def get_moves(self, gs, square, moves):
+        r, c = square >> 3, square & 7
         if gs.white_to_move:
+            color = "w"
             move_sign = -1
             start_row = 6
             back_row = 0
             enemy_color = "b"
             king_row, king_col = gs.w_king_location
         else:
+            color = "b"
             move_sign = 1
             start_row = 1
             back_row = 7
             enemy_color = "w"
             king_row, king_col = gs.b_king_location
 
-        is_blocking_piece = False
-        is_attacking_piece = False
-
-        # Check if the piece is pinned
-        for i in range(len(gs.pinned_pieces) - 1, -1, -1):
-            if gs.pinned_pieces[i][0] == r and gs.pinned_pieces[i][1] == c:
-                is_piece_pinned = True
-                pin_direction = (gs.pinned_pieces[i][2], gs.pinned_pieces[i][3])
-                gs.pinned_pieces.remove(gs.pinned_pieces[i])
-                break
+        # A pinned pawn stays on the line of its king and pinner
+        pin_line = gs.pinned_pieces.get(square)
+        board = gs.board
 
-        # Move one square forward
+        # Move one square forward, pawns never stand on the back rows so it is on the board
         end_row = r + move_sign
-        if 0 <= end_row < 8:  # Ensure end_row is within board bounds
-            if gs.board[end_row][c] == "--":
-                if not is_piece_pinned or pin_direction == (move_sign, 0):
-                    pawn_promotion = end_row == back_row
-                    moves.append(Move((r, c), (end_row, c), gs.board, is_pawn_promotion=pawn_promotion))
-                    
-                    # Move two squares forward from the starting position
-                    if r == start_row:
-                        end_row = r + 2 * move_sign
-                        if 0 <= end_row < 8 and gs.board[end_row][c] == "--":
-                            moves.append(Move((r, c), (end_row, c), gs.board))
+        end_square = square + 8 * move_sign
+        if board[end_row][c] == "--" and (pin_line is None or pin_line >> end_square & 1):
+            self.add_moves(square, end_square, end_row == back_row, 0, moves)
 
-        # Capture diagonally to the left
-        if c - 1 >= 0:
-            end_row = r + move_sign
-            if 0 <= end_row < 8:
-                if gs.board[end_row][c - 1][0] == enemy_color:
-                    if not is_piece_pinned or pin_direction == (move_sign, -1):
-                        pawn_promotion = end_row == back_row
-                        moves.append(Move((r, c), (end_row, c - 1), gs.board, is_pawn_promotion=pawn_promotion))
-                elif (end_row, c - 1) == gs.en_passant_possible_square:
-                    if not is_piece_pinned or pin_direction == (move_sign, -1):
-                        if king_row == r:
-                            if king_col < c:
-                                inside_range = range(king_col + 1, c - 1)
-                                outside_range = range(c + 1, 8)
-                            else:
-                                inside_range = range(king_col - 1, c, -1)
-                                outside_range = range(c + 2, 8)
-                            for i in inside_range:
-                                if gs.board[r][i] != "--":
-                                    is_blocking_piece = True
-                            for i in outside_range:
-                                square = gs.board[r][i]
-                                if square[0] == enemy_color and (square[1] == "R" or square[1] == "Q"):
-                                    is_attacking_piece = True
-                                elif square != "--":
-                                    is_blocking_piece = True
-                            if not is_attacking_piece or is_blocking_piece:
-                                moves.append(Move((r, c), (end_row, c - 1), gs.board, is_en_passant=True))
+            # Move two squares forward from the starting position
+            if r == start_row and board[end_row + move_sign][c] == "--":
+                moves.append(square | (end_square + 8 * move_sign) << 6 | DOUBLE_PAWN_PUSH << 12)
+
+        # Capture diagonally to the left and to the right
+        for end_row, end_col, end_square in PAWN_CAPTURES[color][square]:
+            if pin_line is not None and not pin_line >> end_square & 1:
+                continue
+            if board[end_row][end_col][0] == enemy_color:
+                self.add_moves(square, end_square, end_row == back_row, CAPTURE, moves)
+            elif (end_row, end_col) == gs.en_passant_possible_square:
+                if not self.en_passant_exposes_king(gs, r, c, end_row, end_col, king_row, king_col):
+                    moves.append(square | end_square << 6 | EN_PASSANT << 12)
+
+    def add_moves(self, start_square, end_square, is_promotion, flags, moves):
+        """Add a pawn move, as one move per promotion piece when it reaches the back row."""
+        if is_promotion:
+            for piece in PROMOTION_PIECES:
+                moves.append(start_square | end_square << 6 | (PROMOTION_FLAGS[piece] | flags) << 12)
+        else:
+            moves.append(start_square | end_square << 6 | flags << 12)
 
-        # Capture diagonally to the right
-        if c + 1 <= 7:
-            end_row = r + move_sign
-            if 0 <= end_row < 8:
-                if gs.board[end_row][c + 1][0] == enemy_color:
-                    if not is_piece_pinned or pin_direction == (move_sign, 1):
-                        pawn_promotion = end_row == back_row
-                        moves.append(Move((r, c), (end_row, c + 1), gs.board, is_pawn_promotion=pawn_promotion))
-                elif (end_row, c + 1) == gs.en_passant_possible_square:
-                    if not is_piece_pinned or pin_direction == (move_sign, 1):
-                        if king_row == r:
-                            if king_col < c:
-                                inside_range = range(king_col + 1, c)
-                                outside_range = range(c + 2, 8)
-                            else:
-                                inside_range = range(king_col - 1, c + 1, -1)
-                                outside_range = range(c - 1, -1, -1)
-                            for i in inside_range:
-                                if gs.board[r][i] != "--":
-                                    is_blocking_piece = True
-                            for i in outside_range:
-                                square = gs.board[r][i]
-                                if square[0] == enemy_color and (square[1] == "R" or square[1] == "Q"):
-                                    is_attacking_piece = True
-                                elif square != "--":
-                                    is_blocking_piece = True
-                            if not is_attacking_piece or is_blocking_piece:
-                                moves.append(Move((r, c), (end_row, c + 1), gs.board, is_en_passant=True))
+    def en_passant_exposes_king(self, gs, r, c, end_row, end_col, king_row, king_col):
+        """
+        En passant removes two pawns from the same row at once, which can uncover an attack on the king
+        the pin detection does not see. Play it on the board and look for attacks on the king.
+        """
+        pawn = gs.board[r][c]
+        captured_pawn = gs.board[r][end_col]
+        gs.board[r][c] = "--"
+        gs.board[r][end_col] = "--"
+        gs.board[end_row][end_col] = pawn
+        exposed = gs.is_square_attacked(king_row, king_col, not gs.white_to_move)
+        gs.board[end_row][end_col] = "--"
+        gs.board[r][end_col] = captured_pawn
+        gs.board[r][c] = pawn
+        return exposed
@@ -1,10 +1,5 @@
-from .rook import Rook
-from .bishop import Bishop
+from attack_tables import QUEEN_DIRECTIONS
+from .sliding_piece import SlidingPiece
 
-class Queen():
-    def __init__(self):
-        pass
-
-    def get_moves(self, gs ,row, col, moves):
-        Rook.get_moves(self, gs, row, col, moves)
-        Bishop.get_moves(self, gs, row, col, moves)
+class Queen(SlidingPiece):
+    directions = QUEEN_DIRECTIONS
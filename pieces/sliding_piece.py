@@ -0,0 +1,24 @@
+from moves.move import CAPTURE_BITS
+from attack_tables import RAYS
+
+class SlidingPiece:
+    """Moves of a piece sliding along the rays of its directions until it meets a piece."""
+    directions = ()
+
+    def get_moves(self, gs, square, moves):
+        pin_line = gs.pinned_pieces.get(square)  # A pinned piece stays on the line of its king and pinner
+        enemy_color = "b" if gs.white_to_move else "w"
+        board = gs.board
+        rays = RAYS[square]
+        for direction in self.directions:
+            ray = rays[direction]
+            if not ray or (pin_line is not None and not pin_line >> ray[0][2] & 1):
+                continue
+            for row, col, end_square in ray:
+                end_piece = board[row][col]
+                if end_piece == "--":
+                    moves.append(square | end_square << 6)
+                else:
+                    if end_piece[0] == enemy_color:
+                        moves.append(square | end_square << 6 | CAPTURE_BITS)
+                    break
@@ -0,0 +1,62 @@
+import json
+
+'''
+Search statistics, reported once per completed iteration of iterative deepening.
+
+SearchStats holds the counters the search increments while it runs, SearchInfo is the snapshot
+delivered to callers after every depth, through a callback, a queue or a JSON lines file.
+'''
+
+
+class SearchStats:
+    """Counters of one search, reset when a new search starts."""
+
+    def __init__(self):
+        self.nodes = 0
+        self.evaluations = 0
+        self.seldepth = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.tt_cuts = 0
+        self.beta_cutoffs = 0
+        self.first_move_beta_cutoffs = 0
+
+
+class SearchInfo:
+    """What the search knows after completing a depth."""
+
+    def __init__(self, depth, seldepth, nodes, elapsed_time, score, pv, stats, effective_branching_factor=0.0):
+        self.depth = depth
+        self.seldepth = seldepth
+        self.nodes = nodes  # Nodes of the whole search so far, all iterations included
+        self.time = elapsed_time
+        self.nps = nodes / elapsed_time if elapsed_time > 0 else 0.0
+        self.score = score  # From the point of view of the side to move
+        self.pv = pv  # Moves in UCI notation
+        self.tt_hit_rate = stats.tt_hits / stats.tt_probes if stats.tt_probes else 0.0
+        self.tt_cut_rate = stats.tt_cuts / stats.tt_probes if stats.tt_probes else 0.0
+        self.first_move_cutoff_rate = stats.first_move_beta_cutoffs / stats.beta_cutoffs if stats.beta_cutoffs else 0.0
+        # Nodes of this iteration over nodes of the previous one
+        self.effective_branching_factor = effective_branching_factor
+
+    def to_dict(self):
+        return {
+            "depth": self.depth,
+            "seldepth": self.seldepth,
+            "nodes": self.nodes,
+            "time": round(self.time, 4),
+            "nps": round(self.nps),
+            "score": self.score,
+            "pv": self.pv,
+            "tt_hit_rate": round(self.tt_hit_rate, 4),
+            "tt_cut_rate": round(self.tt_cut_rate, 4),
+            "first_move_cutoff_rate": round(self.first_move_cutoff_rate, 4),
+            "effective_branching_factor": round(self.effective_branching_factor, 3)
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+    def __str__(self):
+        return f"depth {self.depth} seldepth {self.seldepth} score {self.score} nodes {self.nodes} nps {self.nps:.0f} " \
+               f"ebf {self.effective_branching_factor:.2f} pv {' '.join(self.pv)}"
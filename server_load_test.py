@@ -0,0 +1,147 @@
+import os
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import engine_server
+
+'''
+Load generator for engine_server: N simulated players, each on its own connection, play random legal moves
+against the engine, starting a new game whenever one ends, for a fixed duration. Reports the engine moves
+per second and the p50/p99 latency of a move request, which is the round trip of the player's move and the
+engine's reply, queueing included.
+
+    python server_load_test.py --games 32 --duration 60 --start-server --workers 4 --nodes 2000
+'''
+
+DEFAULT_GAMES = 16
+DEFAULT_DURATION = 30.0
+SERVER_STOP_TIMEOUT = 30.0  # Seconds a started server gets to finish its searches and stop
+MAX_GAME_PLIES = 200  # Games are abandoned after this many plies, so the load keeps covering openings
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+
+class Player:
+    def __init__(self, host, port, seed, engine_time, increment):
+        self.host = host
+        self.port = port
+        self.rng = random.Random(seed)
+        self.engine_time = engine_time
+        self.increment = increment
+        self.latencies = []
+        self.games = 0
+        self.errors = 0
+
+    async def request(self, reader, writer, request):
+        writer.write((json.dumps(request) + "\n").encode())
+        await writer.drain()
+        return json.loads(await reader.readline())
+
+    async def run(self, deadline):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            while time.time() < deadline:
+                state = await self.request(reader, writer, {"op": "new", "engine": self.rng.choice("wb"),
+                                                            "time": self.engine_time, "increment": self.increment})
+                if "error" in state:
+                    self.errors += 1
+                    break
+                while time.time() < deadline and state.get("result") == "*" and state["moves"] < MAX_GAME_PLIES:
+                    start_time = time.time()
+                    response = await self.request(reader, writer, {"op": "move", "game": state["game"],
+                                                                   "move": self.rng.choice(state["legal"])})
+                    if "error" in response:
+                        self.errors += 1
+                        break
+                    if "reply" in response:
+                        self.latencies.append(time.time() - start_time)
+                    state = response
+                await self.request(reader, writer, {"op": "close", "game": state["game"]})
+                self.games += 1
+        finally:
+            writer.close()
+
+
+async def run_load(host, port, games, duration, engine_time, increment, seed):
+    players = [Player(host, port, seed + i, engine_time, increment) for i in range(games)]
+    start_time = time.time()
+    await asyncio.gather(*(player.run(start_time + duration) for player in players))
+    elapsed = time.time() - start_time
+    latencies = sorted(latency for player in players for latency in player.latencies)
+    return {
+        "concurrent_games": games,
+        "seconds": round(elapsed, 2),
+        "games": sum(player.games for player in players),
+        "engine_moves": len(latencies),
+        "moves_per_second": round(len(latencies) / elapsed, 2),
+        "p50_latency": round(percentile(latencies, 0.5), 4),
+        "p99_latency": round(percentile(latencies, 0.99), 4),
+        "max_latency": round(latencies[-1], 4) if latencies else 0.0,
+        "errors": sum(player.errors for player in players)
+    }
+
+
+async def wait_for_server(host, port, timeout=30.0):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.time() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+async def main_async(args):
+    server = None
+    if args.start_server:
+        command = [sys.executable, engine_server.__file__, "--host", args.host, "--port", str(args.port)]
+        for option in ("workers", "nodes", "depth"):
+            if getattr(args, option) is not None:
+                command += [f"--{option}", str(getattr(args, option))]
+        server = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.DEVNULL)
+    try:
+        await wait_for_server(args.host, args.port)
+        return await run_load(args.host, args.port, args.games, args.duration, args.engine_time, args.increment,
+                              args.seed)
+    finally:
+        if server:
+            server.terminate()  # engine_server shuts its worker processes down on SIGTERM
+            try:
+                await asyncio.wait_for(server.wait(), SERVER_STOP_TIMEOUT)
+            except asyncio.TimeoutError:
+                server.kill()
+                await server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure engine_server throughput and latency at N concurrent games.")
+    parser.add_argument("--host", default=engine_server.DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=engine_server.DEFAULT_PORT)
+    parser.add_argument("--games", type=int, default=DEFAULT_GAMES, help="Concurrent games")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="Seconds")
+    parser.add_argument("--engine-time", type=float, default=engine_server.DEFAULT_ENGINE_TIME,
+                        help="Engine clock of every game, seconds")
+    parser.add_argument("--increment", type=float, default=engine_server.DEFAULT_INCREMENT)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--start-server", action="store_true", help="Run engine_server for the test")
+    parser.add_argument("--workers", type=int, help="Search processes of the started server")
+    parser.add_argument("--nodes", type=int, help="Node limit per search of the started server")
+    parser.add_argument("--depth", type=int, help="Maximum search depth of the started server")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
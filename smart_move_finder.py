@@ -1,69 +1,359 @@
+import hashlib
+import json
+import os
 import random
 import time
 import pickle
-from constants import STARTING_DEPTH, ENDING_DEPTH, END_GAME_SCORE, PIECE_SCORES, PIECE_POSITION_SCORE, CASTLING_RIGHT_SCORE, CHECK_MATE_SCORE, STALE_MATE_SCORE, MOVE_SEARCH_TIME_LIMIT
+from opening_book import OpeningBook
+from tablebase import Tablebases
+from analysis_cache import AnalysisCache
+from constants import USE_OPENING_BOOK, OPENING_BOOK_PATH, STARTING_DEPTH, ENDING_DEPTH, END_GAME_SCORE, PIECE_SCORES, PIECE_CODES, PIECE_SQUARE_SCORES, DIMENSION, CASTLING_RIGHT_SCORE, CHECK_MATE_SCORE, STALE_MATE_SCORE, DRAW_SCORE, FIFTY_MOVE_RULE_HALF_MOVES, MOVE_SEARCH_TIME_LIMIT, MOBILITY_SCORE, MAX_DEPTH, TRANSPOSITION_TABLE_SIZE, SEARCH_LOG_PATH, ENGINE_PROFILING, USE_TABLEBASES, TABLEBASE_PATH, TABLEBASE_MAX_PIECES, TABLEBASE_WIN_SCORE, USE_ANALYSIS_CACHE, ANALYSIS_CACHE_PATH, ANALYSIS_CACHE_MAX_ENTRIES, ANALYSIS_CACHE_MIN_DEPTH, ENGINE_LEVELS, EVAL_NOISE_SEED
+from search_telemetry import SearchStats, SearchInfo
+from castle_rights import WHITE_KING_SIDE, WHITE_QUEEN_SIDE, BLACK_KING_SIDE, BLACK_QUEEN_SIDE
+from moves.move import code_to_uci, CAPTURE, EN_PASSANT, PROMOTION, PROMOTION_PIECES
+
+'''
+The search works on move codes (see moves.move), valid_moves lists of Move objects are converted on the way in
+and the best code is mapped back to its Move on the way out.
+'''
 
 history_table = {}
+killer_moves = {}
+transposition_table = {}
+opening_book = None
+tablebases = None
+analysis_cache = None
+next_moves = []
+stats = SearchStats()
+
+# Limits of the running search, checked every SEARCH_ABORT_CHECK_NODES nodes
+search_deadline = None
+search_node_limit = None
+search_stop_event = None
+SEARCH_ABORT_CHECK_NODES = 128
+
+# Module settings the search result depends on, part of the engine fingerprint of the analysis cache
+FINGERPRINT_SETTINGS = ("STARTING_DEPTH", "ENDING_DEPTH", "END_GAME_SCORE", "PIECE_SCORES", "PIECE_SQUARE_SCORES",
+                        "CASTLING_RIGHT_SCORE", "CHECK_MATE_SCORE", "STALE_MATE_SCORE", "DRAW_SCORE",
+                        "FIFTY_MOVE_RULE_HALF_MOVES", "USE_TABLEBASES", "TABLEBASE_MAX_PIECES", "TABLEBASE_WIN_SCORE",
+                        "WINNING_CAPTURE_THRESHOLD")
+# Sources of the search, the evaluation and their constants
+FINGERPRINT_SOURCES = ("smart_move_finder.py", "chess_engine.py", "constants.py")
+source_digest = None
+
+# Centipawns of evaluation noise of the engine level being played, see evaluation_noise
+eval_noise = 0
+eval_noise_seed = EVAL_NOISE_SEED
+
+# Transposition table entry bounds
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+WINNING_CAPTURE_THRESHOLD = 320
+WHITE_CASTLING_RIGHTS = WHITE_KING_SIDE | WHITE_QUEEN_SIDE
+BLACK_CASTLING_RIGHTS = BLACK_KING_SIDE | BLACK_QUEEN_SIDE
+
+class SearchAborted(Exception):
+    """Raised inside the search when it runs out of time or nodes or is told to stop."""
 
 def pick_random_valid_move(valid_moves):
     random_move = valid_moves[random.randint(0, len(valid_moves) - 1)]
     print("Random Move from pick_random_valid_move: " + str(random_move))
     return random_move
 
-def find_best_move(gs, valid_moves, return_queue, time_limit=5.0):
-    global next_moves, evaluation_count
-    evaluation_count = 0
+def probe_opening_book(gs, valid_moves, rng=random):
+    """Look the position up in the opening book, which is opened on first use if its file exists."""
+    global opening_book
+    if not USE_OPENING_BOOK:  # Checked on every probe, the UCI OwnBook option can turn it off after the book is open
+        return None
+    if opening_book is None:
+        if not os.path.exists(OPENING_BOOK_PATH):
+            return None
+        opening_book = OpeningBook(OPENING_BOOK_PATH)
+    return opening_book.find_move(gs, valid_moves, rng)
+
+def probe_tablebases(gs):
+    """Exact score of the position for the side to move from the tablebases, opened on first use, or None."""
+    global tablebases
+    if tablebases is None:
+        if not USE_TABLEBASES:
+            return None
+        tablebases = Tablebases(TABLEBASE_PATH)
+    result = tablebases.probe(gs)
+    if result is None:
+        return None
+    outcome, plies = result
+    return outcome * (TABLEBASE_WIN_SCORE - plies) if outcome else DRAW_SCORE
+
+def find_best_move(gs, valid_moves, return_queue, time_limit=5.0, info_queue=None, info_log_path=SEARCH_LOG_PATH,
+                   max_depth=MAX_DEPTH, node_limit=None, stop_event=None, level=None):
+    """
+    Search the position and put the best move in return_queue.
+    The SearchInfo of every completed depth is put in info_queue as a dict and appended to info_log_path
+    as a JSON line, when they are given. With ENGINE_PROFILING on, a {"profile": ...} stage breakdown follows.
+    The search ends at time_limit seconds, node_limit nodes, max_depth or when stop_event is set, whichever comes first.
+    With a level of ENGINE_LEVELS, its node budget and depth cap replace the time limit and its evaluation noise
+    applies, on fresh search tables: the move only depends on the position and the game, not on the machine or
+    the searches before. Levels skip the analysis cache.
+    """
+    global eval_noise
+    settings = ENGINE_LEVELS[level] if level is not None else None
+    if settings is not None:
+        max_depth = min(max_depth, settings["depth"])
+        node_limit = min(node_limit, settings["nodes"]) if node_limit else settings["nodes"]
+        time_limit = None
+        reset_search_state()  # Tables left by earlier searches would change the moves found within the budget
+
+    if settings is None or settings["book"]:
+        # A level picks its book moves from a generator seeded with the position, so they are repeatable too
+        book_move = probe_opening_book(gs, valid_moves, random.Random(gs.hash ^ eval_noise_seed) if settings else random)
+        if book_move is not None:
+            return_queue.put(book_move)
+            return
+
+    cached = probe_analysis_cache(gs, valid_moves, max_depth) if settings is None else None
+    if cached is not None:
+        cached_move, record = cached
+        if info_queue is not None:
+            info_queue.put(record)
+        return_queue.put(cached_move)
+        return
+
+    log_file = open(info_log_path, "a") if info_log_path else None
+
+    def report(record):
+        if info_queue is not None:
+            info_queue.put(record)
+        if log_file:
+            log_file.write(json.dumps(record) + "\n")
+
+    profiler = None
+    if ENGINE_PROFILING:
+        from engine_profiler import StageProfiler
+        profiler = StageProfiler()
+        profiler.enable()
+
+    iterations = []
+
+    def on_iteration(info):
+        iterations.append(info)
+        report(info.to_dict())
+
+    saved_eval_noise = eval_noise
+    if settings is not None:
+        eval_noise = settings["noise"]
+    try:
+        best_move, _ = iterative_deepening(gs, valid_moves, max_depth=max_depth, time_limit=time_limit,
+                                           on_iteration=on_iteration, node_limit=node_limit, stop_event=stop_event)
+    finally:
+        eval_noise = saved_eval_noise
+        if profiler:
+            profiler.disable()
+            report({"profile": profiler.report()})
+        if log_file:
+            log_file.close()
+
+    if iterations and settings is None:
+        store_analysis(gs, valid_moves, best_move, iterations[-1])
+    return_queue.put(best_move)
+
+def open_analysis_cache():
+    """The analysis cache, opened on first use, or None when it is turned off."""
+    global analysis_cache
+    if not USE_ANALYSIS_CACHE:
+        return None
+    if analysis_cache is None:
+        analysis_cache = AnalysisCache(ANALYSIS_CACHE_PATH, ANALYSIS_CACHE_MAX_ENTRIES)
+    return analysis_cache
+
+def engine_fingerprint():
+    """
+    Digest of the search and evaluation sources and of the current FINGERPRINT_SETTINGS values, so analysis cached
+    by an engine changed since, in its code or in settings overridden at run time, is not taken for this one's.
+    """
+    global source_digest
+    if source_digest is None:
+        digest = hashlib.sha1()
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for name in FINGERPRINT_SOURCES:
+            with open(os.path.join(directory, name), "rb") as source_file:
+                digest.update(source_file.read())
+        source_digest = digest.hexdigest()
+    settings = repr([globals()[name] for name in FINGERPRINT_SETTINGS])
+    return hashlib.sha1((source_digest + settings).encode()).hexdigest()[:16]
+
+def analysis_cache_applies(gs, valid_moves, depth):
+    """
+    Whether a result of that depth stands for the position whatever the game before it: the position did not occur
+    earlier in the game, the fifty-move rule is beyond the search horizon and all the legal moves are searched.
+    """
+    return gs.half_moves_count + depth < FIFTY_MOVE_RULE_HALF_MOVES and gs.repetition_count() == 0 \
+        and len(valid_moves) == len(gs.get_valid_move_codes())
+
+def probe_analysis_cache(gs, valid_moves, max_depth):
+    """
+    The cached analysis of the position when it is deep enough to replace the search: ANALYSIS_CACHE_MIN_DEPTH or max_depth.
+    Returns (best move, SearchInfo dict) or None.
+    """
+    if open_analysis_cache() is None:
+        return None
+    entry = analysis_cache.probe(gs.hash, engine_fingerprint())
+    if entry is None:
+        return None
+    code, score, depth, pv = entry
+    if depth < min(max_depth, ANALYSIS_CACHE_MIN_DEPTH) or not analysis_cache_applies(gs, valid_moves, depth):
+        return None
+    best_move = next((move for move in valid_moves if move.code == code), None)
+    if best_move is None:
+        return None  # Another position with the same hash
+    return best_move, {"depth": depth, "seldepth": depth, "nodes": 0, "time": 0.0, "nps": 0, "score": score, "pv": pv,
+                       "cached": True}
+
+def store_analysis(gs, valid_moves, best_move, info):
+    if open_analysis_cache() is not None and analysis_cache_applies(gs, valid_moves, info.depth):
+        analysis_cache.store(gs.hash, engine_fingerprint(), best_move.code, info.score, info.depth, info.pv)
+
+def reset_search_state():
+    """Forget the move ordering history, transpositions and counters, so the next search does not depend on previous ones."""
+    global next_moves, stats
+    history_table.clear()
+    killer_moves.clear()
+    transposition_table.clear()
+    next_moves = []
+    stats = SearchStats()
+
+def iterative_deepening(gs, valid_moves, max_depth=MAX_DEPTH, time_limit=None, on_iteration=None, node_limit=None, stop_event=None):
+    """
+    Search depth 1, 2, ... until max_depth is completed, time_limit seconds have passed, node_limit nodes
+    were searched or stop_event (a threading or multiprocessing Event) is set. The last three abort the depth
+    being searched. on_iteration(info) is called with a SearchInfo after every completed depth.
+    Returns the best move of the deepest completed search and that depth.
+    """
+    global next_moves, stats, search_deadline, search_node_limit, search_stop_event
+
+    moves_by_code = {move.code: move for move in valid_moves}
+    valid_moves = list(moves_by_code)
+
+    stats = SearchStats()
     next_moves = []
     start_time = time.time()
     
     best_move = None
-
-    actual_board_score = material_score_only(gs) 
-    depth = 1
-    
-    while True:
-        time_elapsed = time.time() - start_time
-        if time_elapsed >= time_limit:
-            print(f"Time limit reached at depth {depth-1}. Returning best move found.")
+    completed_depth = 0
+    previous_iteration_nodes = 0
+    turn_multiplier = 1 if gs.white_to_move else -1
+    root_ply = gs.ply
+    search_deadline = start_time + time_limit if time_limit is not None else None
+    search_node_limit = node_limit
+    search_stop_event = stop_event
+
+    for depth in range(1, max_depth + 1):
+        if search_should_stop():
             break
         
-        print(f"Searching at depth: {depth}")
-        find_moves_negamax_alpha_beta(gs, valid_moves, depth, -CHECK_MATE_SCORE, CHECK_MATE_SCORE, 1 if gs.white_to_move else -1)
-        
-        if time.time() - start_time >= time_limit:
-            print(f"Time limit reached during search at depth {depth}.")
+        iteration_start_nodes = stats.nodes
+        try:
+            score = find_moves_negamax_alpha_beta(gs, valid_moves, depth, -CHECK_MATE_SCORE, CHECK_MATE_SCORE, turn_multiplier)
+        except SearchAborted:
+            # Take back the moves of the abandoned search, the deepest completed depth stands
+            while gs.ply > root_ply:
+                gs.undo_move_code()
             break
 
         # The best move found at this depth
-        best_move = next_moves[0] if next_moves else best_move
-        depth += 1
+        best_move = moves_by_code[next_moves[0]] if next_moves else best_move
+        completed_depth = depth
+
+        iteration_nodes = stats.nodes - iteration_start_nodes
+        if on_iteration:
+            effective_branching_factor = iteration_nodes / previous_iteration_nodes if previous_iteration_nodes else 0.0
+            on_iteration(SearchInfo(depth, stats.seldepth, stats.nodes, time.time() - start_time, score,
+                                    principal_variation(gs, depth), stats, effective_branching_factor))
+        previous_iteration_nodes = iteration_nodes
+
+        if abs(score) >= CHECK_MATE_SCORE:
+            break  # A forced mate was found, deeper searches cannot improve on it
+
+    search_deadline = search_node_limit = search_stop_event = None
+    if best_move is None and valid_moves:
+        best_move = moves_by_code[valid_moves[0]]  # Stopped before depth 1 completed
+    return best_move, completed_depth
+
+def search_should_stop():
+    return (search_stop_event is not None and search_stop_event.is_set()) \
+        or (search_deadline is not None and time.time() >= search_deadline) \
+        or (search_node_limit is not None and stats.nodes >= search_node_limit)
+
+def principal_variation(gs, max_length):
+    """Follow the best moves stored in the transposition table from the current position, in UCI notation."""
+    pv = []
+    seen_hashes = set()
+    while len(pv) < max_length:
+        entry = transposition_table.get(gs.hash)
+        if entry is None or entry[3] is None or gs.hash in seen_hashes:
+            break
+        seen_hashes.add(gs.hash)
+        if entry[3] not in gs.get_valid_move_codes():
+            break
+        pv.append(entry[3])
+        gs.make_move_code(entry[3])
+    for _ in pv:
+        gs.undo_move_code()
+    return [code_to_uci(code) for code in pv]
 
-    elapsed_time = time.time() - start_time
-    print(f"Potential best moves count: {len(next_moves)}")
-    print(f"Total possibilities evaluated: {evaluation_count} in {elapsed_time:.2f}s")
-    print(f"Max depth reached: {depth-1}")
-    
-    return_queue.put(best_move)
-    
 
-def find_moves_negamax_alpha_beta(gs, valid_moves, depth, alpha, beta, turn_multiplier):
-    global next_moves, evaluation_count
+def find_moves_negamax_alpha_beta(gs, valid_moves, depth, alpha, beta, turn_multiplier, ply=0):
+    global next_moves
+
+    stats.nodes += 1
+    if ply > stats.seldepth:
+        stats.seldepth = ply
+    if stats.nodes % SEARCH_ABORT_CHECK_NODES == 0 and search_should_stop():
+        raise SearchAborted()
+
+    if not valid_moves:
+        return -CHECK_MATE_SCORE if gs.in_check else STALE_MATE_SCORE
+
+    # A position repeated inside the game or the search is a draw, as is one past the fifty-move rule
+    if ply > 0 and (gs.is_repetition() or gs.half_moves_count >= FIFTY_MOVE_RULE_HALF_MOVES):
+        return DRAW_SCORE
+
+    # Few pieces left: the tablebases know the exact result, the root still searches to pick the move
+    if ply > 0 and gs.pieces_count <= TABLEBASE_MAX_PIECES:
+        tablebase_score = probe_tablebases(gs)
+        if tablebase_score is not None:
+            return tablebase_score
 
     if depth == 0 or gs.is_game_over:
-        evaluation_count += 1
+        stats.evaluations += 1
         score = turn_multiplier * board_score_based_on_gamestate(gs)
+        if eval_noise:
+            score += evaluation_noise(gs.hash)
         return score
 
+    # Transposition table: cut when the stored result is deep enough, otherwise search its best move first
+    alpha_original = alpha
+    hash_move = None
+    stats.tt_probes += 1
+    entry = transposition_table.get(gs.hash)
+    if entry is not None:
+        stats.tt_hits += 1
+        entry_depth, entry_score, entry_bound, hash_move = entry
+        if ply > 0 and entry_depth >= depth and (
+                entry_bound == EXACT
+                or (entry_bound == LOWER_BOUND and entry_score >= beta)
+                or (entry_bound == UPPER_BOUND and entry_score <= alpha)):
+            stats.tt_cuts += 1
+            return entry_score
+
     max_score = -CHECK_MATE_SCORE
     best_moves = []
 
-    ordered_moves = order_moves(valid_moves, depth, gs)
+    ordered_moves = order_moves(valid_moves, depth, gs, hash_move)
 
-    for move in ordered_moves:
-        gs.make_move(move)
-        next_valid_moves = gs.get_all_valid_moves()
-        score = -find_moves_negamax_alpha_beta(gs, next_valid_moves, depth - 1, -beta, -alpha, -turn_multiplier)
-        gs.undo_last_move()
+    for move_number, move in enumerate(ordered_moves):
+        gs.make_move_code(move)
+        next_valid_moves = gs.get_valid_move_codes()
+        score = -find_moves_negamax_alpha_beta(gs, next_valid_moves, depth - 1, -beta, -alpha, -turn_multiplier, ply + 1)
+        gs.undo_move_code()
 
         if score > max_score:
             max_score = score
@@ -74,11 +364,14 @@ def find_moves_negamax_alpha_beta(gs, valid_moves, depth, alpha, beta, turn_mult
         alpha = max(alpha, score)
         if alpha >= beta:
             # Alpha-beta cutoff
-            if depth in history_table:
-                if not history_table[depth][0]:
-                    history_table[depth][0] = move
-                else:
-                    history_table[depth][1] = move
+            stats.beta_cutoffs += 1
+            if move_number == 0:
+                stats.first_move_beta_cutoffs += 1
+            depth_killers = killer_moves.setdefault(depth, [None, None])
+            if depth_killers[0] is None:
+                depth_killers[0] = move
+            else:
+                depth_killers[1] = move
             break
 
     # Update the best moves found at this depth
@@ -88,32 +381,50 @@ def find_moves_negamax_alpha_beta(gs, valid_moves, depth, alpha, beta, turn_mult
     for move in ordered_moves:
         update_history(move, 1)  # Adjust the score as needed based on your heuristic
 
+    if max_score <= alpha_original:
+        bound = UPPER_BOUND
+    elif max_score >= beta:
+        bound = LOWER_BOUND
+    else:
+        bound = EXACT
+    if len(transposition_table) >= TRANSPOSITION_TABLE_SIZE:
+        transposition_table.clear()
+    transposition_table[gs.hash] = (depth, max_score, bound, best_moves[0] if best_moves else None)
+
     return max_score
 
-def order_moves(moves, depth, gs):
+def order_moves(moves, depth, gs, hash_move=None):
+    """
+    Order moves for the search: hash move, PV move, winning then equal captures, killer moves,
+    quiet moves by history and losing captures last. The list passed in is left untouched.
+    """
+    moves = list(moves)
     ordered_moves = []
 
-    # Add PV move (if exists)
-    pv_move = next_moves[0] if next_moves else None
-    if pv_move in moves:
-        ordered_moves.append(pv_move)
-        moves.remove(pv_move)
-
     # Add hash move (if exists)
-    hash_move = None
-    if hash_move and hash_move in moves:
-        ordered_moves.append(hash_move)
+    if hash_move is not None and hash_move in moves:
         moves.remove(hash_move)
+        ordered_moves.append(hash_move)
 
-    # Categorize captures and promotions
+    # Add PV move (if exists). It comes from another node, so only when it is legal here too
+    pv_move = next_moves[0] if next_moves else None
+    if pv_move is not None and pv_move in moves:
+        moves.remove(pv_move)
+        ordered_moves.append(pv_move)
+
+    # Categorize captures
     winning_captures = []
     equal_captures = []
+    losing_captures = []
     for move in moves:
         if is_capture(move):
-            if is_winning_capture(move, gs):
+            capture_value = evaluate_capture(move, gs)
+            if capture_value >= WINNING_CAPTURE_THRESHOLD:
                 winning_captures.append(move)
-            else:
+            elif capture_value >= 0:
                 equal_captures.append(move)
+            else:
+                losing_captures.append(move)
 
     # Add winning captures
     ordered_moves.extend(winning_captures)
@@ -122,107 +433,122 @@ def order_moves(moves, depth, gs):
     ordered_moves.extend(equal_captures)
 
     # Add killer moves (if any)
-    killer_moves = history_table.get(depth, [None, None])
-    if killer_moves:
-        if killer_moves[0] and killer_moves[0] in moves:
-            ordered_moves.append(killer_moves[0])
-            moves.remove(killer_moves[0])
-        if killer_moves[1] and killer_moves[1] in moves:
-            ordered_moves.append(killer_moves[1])
-            moves.remove(killer_moves[1])
+    non_captures = [move for move in moves if not is_capture(move)]
+    for killer_move in killer_moves.get(depth, (None, None)):
+        if killer_move is not None and killer_move in non_captures:
+            non_captures.remove(killer_move)
+            ordered_moves.append(killer_move)
 
     # Sort remaining non-captures by history heuristic
-    non_captures = [move for move in moves if not is_capture(move)]
     sorted_non_captures = sorted(non_captures, key=lambda move: history_heuristic(move), reverse=True)
 
     # Add sorted non-captures
     ordered_moves.extend(sorted_non_captures)
 
     # Add losing captures
-    losing_captures = [move for move in moves if is_capture(move) and not is_winning_capture(move, gs)]
     ordered_moves.extend(losing_captures)
 
     return ordered_moves
 
-def is_capture(move):
-    return move.piece_captured != "--"
-
-def evaluate_capture(move, gs):
-    gs.make_move(move)
-    captured_piece = move.piece_captured
-    captured_value = PIECE_SCORES[captured_piece[1]] if captured_piece else 0
-    capturing_piece = gs.board[move.end_row][move.end_col]
-    capturing_value = PIECE_SCORES[capturing_piece[1]] if capturing_piece != "--" else 0
-    gs.undo_last_move()
-    capture_value = captured_value - capturing_value
-    return capture_value
-
-def is_winning_capture(move, gs):
-    capture_value = evaluate_capture(move, gs)
-    WINNING_CAPTURE_THRESHOLD = 800
-    return capture_value >= WINNING_CAPTURE_THRESHOLD
-
-def update_history(move, score):
-    move_key = str(move)  # Convert move to a string representation if necessary
-    if move_key in history_table:
-        history_table[move_key] += score
-    else:
-        history_table[move_key] = score
-
-def history_heuristic(move):
-    move_key = str(move)
-    return history_table.get(move_key, 0)
+def evaluation_noise(position_hash):
+    """Offset in [-eval_noise, eval_noise] drawn from the position hash, the same every time the position is evaluated."""
+    mixed = ((position_hash ^ eval_noise_seed) * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    return (mixed >> 32) % (2 * eval_noise + 1) - eval_noise
 
 def board_score_based_on_gamestate(gs):
     score = 0
-    pieces_score = 0
-    central_control_score = 0
 
     if gs.is_check_mate:
-        return CHECK_MATE_SCORE if gs.white_to_move else -CHECK_MATE_SCORE
+        return -CHECK_MATE_SCORE if gs.white_to_move else CHECK_MATE_SCORE
     elif gs.is_stale_mate:
         return STALE_MATE_SCORE
 
-    # Calculate piece scores
-    for row in range(len(gs.board)):
-        for col in range(len(gs.board[row])):
-            square = gs.board[row][col]
-            if square != "--":
-                piece_color = square[0]
-                piece_type = square[1]
-                piece_value = PIECE_SCORES[piece_type]
-                
-                position_score = PIECE_POSITION_SCORE[square][row][col]
-
-                if piece_color == "w":
-                    pieces_score += piece_value + position_score
-                else:
-                    pieces_score -= piece_value + position_score
+    # The squares of each side's pieces, from the piece lists instead of a scan of the board
+    white_squares = occupied_squares(gs.board, 'w', gs.piece_squares)
+    black_squares = occupied_squares(gs.board, 'b', gs.piece_squares)
 
-                # Central control example
-                if (row, col) in [(3, 3), (3, 4), (4, 3), (4, 4)]:
-                    central_control_score += 10 if piece_color == "w" else -10
+    # Material, piece-square tables and central control, kept up to date by make_move
+    static_score = gs.piece_square_score
 
     # Count attacked and defended pieces
-    attacked_pieces_score = count_attacked_pieces(gs.board, 'w') - count_attacked_pieces(gs.board, 'b')
-    defended_pieces_score = count_defended_pieces(gs.board, 'w') - count_defended_pieces(gs.board, 'b')
+    attacked_pieces_score = count_attacked_pieces(gs.board, 'w', white_squares) - count_attacked_pieces(gs.board, 'b', black_squares)
+    defended_pieces_score = count_defended_pieces(gs.board, 'w', white_squares) - count_defended_pieces(gs.board, 'b', black_squares)
 
     # Count enemy castling rights
     castling_rights_score = count_enemy_castling_rights(gs)
-    return score + pieces_score + central_control_score + attacked_pieces_score + defended_pieces_score + castling_rights_score
+    return score + static_score + attacked_pieces_score + defended_pieces_score + castling_rights_score
+
+def static_board_score(board):
+    """
+    Score the terms that only depend on piece placement, from white's point of view.
+    These are the terms batch_evaluator reproduces with vectorized NumPy ops. Mobility is an offline term, the
+    search evaluation does not count it.
+    """
+    return piece_square_score(board) + mobility_score(board)
+
+def piece_square_score(board):
+    """Sum the compiled material, position and central control tables over the occupied squares."""
+    score = 0
+    for row in range(len(board)):
+        board_row = board[row]
+        for col in range(len(board_row)):
+            square = board_row[col]
+            if square != "--":
+                score += PIECE_SQUARE_SCORES[PIECE_CODES[square]][row * DIMENSION + col]
+    return score
+
+def occupied_squares(board, piece_color, piece_squares=None):
+    """(row, col) of the pieces of a color, from the GameState piece lists when given, else by scanning the board."""
+    if piece_squares is None:
+        return [(row, col) for row in range(DIMENSION) for col in range(DIMENSION) if board[row][col][0] == piece_color]
+    return [(square >> 3, square & 7) for piece_type in "PNBRQK" for square in piece_squares[piece_color + piece_type]]
+
+def mobility_score(board):
+    """Weighted difference between the pseudo-legal knight, bishop, rook and queen moves of white and black."""
+    return MOBILITY_SCORE * (count_mobility(board, 'w') - count_mobility(board, 'b'))
+
+def count_mobility(board, piece_color, squares=None):
+    """
+    Count the squares the minor and major pieces of a color can move to, ignoring pins and checks.
+    A square counts if it is empty or holds an enemy piece, sliders stop on the first piece they meet.
+    squares are the (row, col) of the pieces of the color, see occupied_squares.
+    """
+    mobility_count = 0
+
+    directions = {
+        'N': [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)],
+        'B': [(-1, -1), (-1, 1), (1, -1), (1, 1)],
+        'R': [(-1, 0), (1, 0), (0, -1), (0, 1)],
+        'Q': [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)]
+    }
+
+    if squares is None:
+        squares = occupied_squares(board, piece_color)
+    for row, col in squares:
+        piece_type = board[row][col][1]
+        for direction in directions.get(piece_type, []):
+            r, c = row + direction[0], col + direction[1]
+            while 0 <= r < 8 and 0 <= c < 8:
+                target = board[r][c]
+                if target != "--":
+                    if target[0] != piece_color:
+                        mobility_count += 1
+                    break
+                mobility_count += 1
+                if piece_type == 'N':
+                    break
+                r += direction[0]
+                c += direction[1]
+
+    return mobility_count
 
 def material_score_only(gs):
     material_value = 0
-    for row in range(len(gs.board)):
-        for col in range(len(gs.board[row])):
-            square = gs.board[row][col]
-            if square != "--":
-                piece_type = square[1]
-                piece_value = PIECE_SCORES[piece_type]
-                material_value += piece_value 
+    for piece, squares in gs.piece_squares.items():
+        material_value += PIECE_SCORES[piece[1]] * len(squares)
     return material_value
 
-def count_attacked_pieces(board, piece_color):
+def count_attacked_pieces(board, piece_color, squares=None):
     attacked_pieces_count = 0
 
     directions = {
@@ -234,27 +560,26 @@ def count_attacked_pieces(board, piece_color):
         'K': [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
     }
 
-    for row in range(len(board)):
-        for col in range(len(board[row])):
-            piece = board[row][col]
-            if piece != "--" and piece[0] == piece_color:
-                piece_type = piece[1]
-                for direction in directions.get(piece_type, []):
-                    r, c = row + direction[0], col + direction[1]
-                    while 0 <= r < 8 and 0 <= c < 8:
-                        target = board[r][c]
-                        if target != "--":
-                            if target[0] != piece_color:
-                                attacked_pieces_count += PIECE_SCORES.get(target[1], 0)
-                            break
-                        if piece_type in ['P', 'N', 'K']:
-                            break
-                        r += direction[0]
-                        c += direction[1]
+    if squares is None:
+        squares = occupied_squares(board, piece_color)
+    for row, col in squares:
+        piece_type = board[row][col][1]
+        for direction in directions.get(piece_type, []):
+            r, c = row + direction[0], col + direction[1]
+            while 0 <= r < 8 and 0 <= c < 8:
+                target = board[r][c]
+                if target != "--":
+                    if target[0] != piece_color:
+                        attacked_pieces_count += PIECE_SCORES.get(target[1], 0)
+                    break
+                if piece_type in ['P', 'N', 'K']:
+                    break
+                r += direction[0]
+                c += direction[1]
 
     return attacked_pieces_count
 
-def count_defended_pieces(board, piece_color):
+def count_defended_pieces(board, piece_color, squares=None):
     defended_pieces_count = 0
 
     directions = {
@@ -266,72 +591,59 @@ def count_defended_pieces(board, piece_color):
         'K': [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
     }
 
-    for row in range(len(board)):
-        for col in range(len(board[row])):
-            piece = board[row][col]
-            if piece != "--" and piece[0] == piece_color:
-                piece_type = piece[1]
-                for direction in directions.get(piece_type, []):
-                    r, c = row + direction[0], col + direction[1]
-                    while 0 <= r < 8 and 0 <= c < 8:
-                        target = board[r][c]
-                        if target != "--":
-                            if target[0] != piece_color:
-                                defended_pieces_count += PIECE_SCORES.get(target[1], 0)
-                            break
-                        if piece_type in ['P', 'N', 'K']:
-                            break
-                        r += direction[0]
-                        c += direction[1]
+    if squares is None:
+        squares = occupied_squares(board, piece_color)
+    for row, col in squares:
+        piece_type = board[row][col][1]
+        for direction in directions.get(piece_type, []):
+            r, c = row + direction[0], col + direction[1]
+            while 0 <= r < 8 and 0 <= c < 8:
+                target = board[r][c]
+                if target != "--":
+                    if target[0] != piece_color:
+                        defended_pieces_count += PIECE_SCORES.get(target[1], 0)
+                    break
+                if piece_type in ['P', 'N', 'K']:
+                    break
+                r += direction[0]
+                c += direction[1]
 
     return defended_pieces_count
 
 def count_enemy_castling_rights(gs):
     castling_rights_score = 0
-    if gs.white_to_move:
-        if gs.current_castling_rights.wKs or gs.current_castling_rights.wQs:
-            castling_rights_score += CASTLING_RIGHT_SCORE
-    else:
-        if gs.current_castling_rights.bKs or gs.current_castling_rights.bQs:
-            castling_rights_score += CASTLING_RIGHT_SCORE
+    if gs.castling_rights & (WHITE_CASTLING_RIGHTS if gs.white_to_move else BLACK_CASTLING_RIGHTS):
+        castling_rights_score += CASTLING_RIGHT_SCORE
     return castling_rights_score
 
 def is_capture(move):
-    return move.piece_captured != "--"
+    return move >> 12 & CAPTURE
 
 def evaluate_capture(move, gs):
-    gs.make_move(move)
-    captured_piece = move.piece_captured
-    captured_value = PIECE_SCORES[captured_piece[1]] if captured_piece else 0
-    capturing_piece = gs.board[move.end_row][move.end_col]
-    capturing_value = PIECE_SCORES[capturing_piece[1]] if capturing_piece != "--" else 0
-    gs.undo_last_move()
+    """Value of the captured piece minus the value of the capturing piece, the promoted piece for promotions."""
+    start_square = move & 63
+    end_square = move >> 6 & 63
+    flags = move >> 12
+    if flags == EN_PASSANT:
+        captured_value = PIECE_SCORES["P"]
+    else:
+        captured_value = PIECE_SCORES[gs.board[end_square >> 3][end_square & 7][1]]
+    if flags & PROMOTION:
+        capturing_value = PIECE_SCORES[PROMOTION_PIECES[flags & 3]]
+    else:
+        capturing_value = PIECE_SCORES[gs.board[start_square >> 3][start_square & 7][1]]
     capture_value = captured_value - capturing_value
     return capture_value
 
 def is_winning_capture(move, gs):
     capture_value = evaluate_capture(move, gs)
-    WINNING_CAPTURE_THRESHOLD = 320
     return capture_value >= WINNING_CAPTURE_THRESHOLD
 
 def update_history(move, score):
-    move_key = str(move)  # Convert move to a string representation if necessary
-    if move_key in history_table:
-        history_table[move_key] += score
+    if move in history_table:
+        history_table[move] += score
     else:
-        history_table[move_key] = score
+        history_table[move] = score
 
 def history_heuristic(move):
-    move_key = str(move)
-    return history_table.get(move_key, 0)
-
-def material_score_only(gs):
-    material_value = 0
-    for row in range(len(gs.board)):
-        for col in range(len(gs.board[row])):
-            square = gs.board[row][col]
-            if square != "--":
-                piece_type = square[1]
-                piece_value = PIECE_SCORES[piece_type]
-                material_value += piece_value 
-    return material_value
+    return history_table.get(move, 0)
@@ -0,0 +1,366 @@
+import argparse
+import itertools
+import mmap
+import os
+import time
+from multiprocessing import Pool
+from attack_tables import KNIGHT_TARGETS, KING_TARGETS, RAYS, PAWN_CAPTURES, BETWEEN, RAY_DIRECTIONS, ROOK_DIRECTIONS, BISHOP_DIRECTIONS, QUEEN_DIRECTIONS
+from constants import DIMENSION, SQUARES, TABLEBASE_PATH
+
+'''
+Distance-to-mate tablebases of the endings of a king and one piece against a bare king, built by retrograde analysis.
+
+A position is indexed as ((white king * 64 + black king) * 64 + piece) * 2 + side to move, the white king being
+reduced by symmetry first: to the a1-d1-d4 triangle (10 squares) without pawns, to the a-d files with a pawn.
+Each table is a file of one byte per index, 0 for a draw or an illegal position, the plies to mate for a win
+of the side to move and LOSS + plies to mate for a loss. The tables are positions of the stronger side as white,
+positions where black is stronger are probed color flipped.
+
+Generation lists the moves of every position in worker processes, a white king square per task, then values
+positions outwards from the mates, in order of plies to mate, through the moves reversed. Promotions are looked
+up in the tables already built, so KPK comes after KQK and KRK.
+
+    python tablebase.py --workers 8
+    python tablebase.py KQK KRK
+'''
+
+ENDINGS = ("KQK", "KRK", "KPK")  # In build order
+DRAWN_ENDINGS = ("KK", "KNK", "KBK")  # Never won, no table
+TABLE_EXTENSION = ".tb"
+
+DRAW = 0
+LOSS = 128
+MAX_PLIES = LOSS - 1
+
+SLIDER_DIRECTIONS = {"Q": set(QUEEN_DIRECTIONS), "R": set(ROOK_DIRECTIONS), "B": set(BISHOP_DIRECTIONS)}
+PROMOTION_TYPES = "QRBN"
+
+
+def _mask(targets):
+    mask = 0
+    for _, _, square in targets:
+        mask |= 1 << square
+    return mask
+
+
+KING_MASKS = [_mask(KING_TARGETS[square]) for square in range(SQUARES)]
+KNIGHT_MASKS = [_mask(KNIGHT_TARGETS[square]) for square in range(SQUARES)]
+WHITE_PAWN_MASKS = [_mask(PAWN_CAPTURES["w"][square]) for square in range(SQUARES)]
+
+
+def _transform(square, symmetry):
+    """Square after the board symmetry: bit 0 mirrors the files, bit 1 the ranks, bit 2 swaps files and ranks."""
+    row, col = divmod(square, DIMENSION)
+    if symmetry & 1:
+        col = DIMENSION - 1 - col
+    if symmetry & 2:
+        row = DIMENSION - 1 - row
+    if symmetry & 4:
+        row, col = col, row
+    return row * DIMENSION + col
+
+
+TRANSFORMS = [[_transform(square, symmetry) for square in range(SQUARES)] for symmetry in range(8)]
+
+
+def _king_region(pawns):
+    region = []
+    for square in range(SQUARES):
+        row, col = divmod(square, DIMENSION)
+        rank = DIMENSION - 1 - row
+        if col < DIMENSION // 2 and (pawns or rank <= col):
+            region.append(square)
+    return region
+
+
+# With pawns only the files can be mirrored, the ranks are not symmetric for them
+KING_REGIONS = {pawns: _king_region(pawns) for pawns in (False, True)}
+REGION_INDEXES = {pawns: {square: i for i, square in enumerate(region)} for pawns, region in KING_REGIONS.items()}
+# Symmetry bringing a white king on the square into its region
+CANONICAL_SYMMETRIES = {
+    pawns: [next(symmetry for symmetry in ((0, 1) if pawns else range(8))
+                 if TRANSFORMS[symmetry][square] in REGION_INDEXES[pawns]) for square in range(SQUARES)]
+    for pawns in (False, True)
+}
+
+
+def piece_types(ending):
+    return ending[1:-1]
+
+
+def table_size(ending):
+    return len(KING_REGIONS["P" in ending]) * SQUARES ** (len(piece_types(ending)) + 1) * 2
+
+
+def position_index(ending, black_to_move, white_king, black_king, squares):
+    pawns = "P" in ending
+    transform = TRANSFORMS[CANONICAL_SYMMETRIES[pawns][white_king]]
+    index = REGION_INDEXES[pawns][transform[white_king]] * SQUARES + transform[black_king]
+    for square in squares:
+        index = index * SQUARES + transform[square]
+    return index * 2 + black_to_move
+
+
+def decode_value(value):
+    """(outcome, plies to mate) of a table byte, outcome 1 for a win of the side to move, -1 for a loss, 0 for a draw."""
+    if value == DRAW:
+        return 0, 0
+    if value < LOSS:
+        return 1, value
+    return -1, value - LOSS
+
+
+def is_attacked(target, pieces, occupancy, ignored_square=None):
+    """Is target attacked by the (piece type, square) white pieces, the white king aside."""
+    for piece_type, square in pieces:
+        if square == ignored_square:
+            continue
+        if piece_type == "N":
+            if KNIGHT_MASKS[square] >> target & 1:
+                return True
+        elif piece_type == "P":
+            if WHITE_PAWN_MASKS[square] >> target & 1:
+                return True
+        elif RAY_DIRECTIONS[square][target] in SLIDER_DIRECTIONS[piece_type] and not BETWEEN[square][target] & occupancy:
+            return True
+    return False
+
+
+class Tablebases:
+    """The tables of a directory, memory mapped, probed with GameState positions."""
+
+    def __init__(self, directory=TABLEBASE_PATH):
+        self.files = []
+        self.tables = {}
+        for ending in ENDINGS:
+            path = os.path.join(directory, ending + TABLE_EXTENSION)
+            if os.path.exists(path) and os.path.getsize(path) == table_size(ending):
+                table_file = open(path, "rb")
+                self.files.append(table_file)
+                self.tables[ending] = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
+        for table_file in self.files:
+            table_file.close()
+
+    def probe_squares(self, ending, black_to_move, white_king, black_king, squares):
+        """Table byte of a position with the stronger side as white, None when the table is missing."""
+        if ending in DRAWN_ENDINGS:
+            return DRAW
+        table = self.tables.get(ending)
+        if table is None:
+            return None
+        return table[position_index(ending, black_to_move, white_king, black_king, squares)]
+
+    def probe(self, gs):
+        """(outcome, plies to mate) for the side to move of gs, None when no table covers the position."""
+        white_pieces, black_pieces = [], []
+        for piece, squares in gs.piece_squares.items():
+            if piece[1] != "K":
+                for square in squares:
+                    (white_pieces if piece[0] == "w" else black_pieces).append((piece[1], square))
+        white_king = gs.w_king_location[0] * DIMENSION + gs.w_king_location[1]
+        black_king = gs.b_king_location[0] * DIMENSION + gs.b_king_location[1]
+        black_to_move = not gs.white_to_move
+        if black_pieces:
+            if white_pieces:
+                return None
+            # Black is the stronger side: mirror the ranks and swap the colors
+            white_pieces = [(piece_type, square ^ 56) for piece_type, square in black_pieces]
+            white_king, black_king = black_king ^ 56, white_king ^ 56
+            black_to_move = not black_to_move
+        white_pieces.sort(key=lambda piece: "QRBNP".index(piece[0]))
+        ending = "K" + "".join(piece_type for piece_type, _ in white_pieces) + "K"
+        value = self.probe_squares(ending, int(black_to_move), white_king, black_king,
+                                   [square for _, square in white_pieces])
+        return None if value is None else decode_value(value)
+
+
+worker_tablebases = None
+
+
+def init_worker(directory):
+    global worker_tablebases
+    worker_tablebases = Tablebases(directory)
+
+
+def external_value(ending, black_to_move, white_king, black_king, squares):
+    """Table byte of a position of another ending, reached by a capture or a promotion."""
+    value = worker_tablebases.probe_squares(ending, black_to_move, white_king, black_king, squares)
+    if value is None:
+        raise RuntimeError(f"The {ending} table is needed first")
+    return value
+
+
+def generate_moves(task):
+    """
+    Moves of the legal positions with the white king on one square of its region, in a worker process.
+    Returns (index, in check, indexes of the positions the moves lead to, table bytes of the moves leaving the ending).
+    """
+    ending, white_king = task
+    types = piece_types(ending)
+    records = []
+    for black_king, *squares in itertools.product(range(SQUARES), repeat=len(types) + 1):
+        occupied = {white_king, black_king, *squares}
+        if len(occupied) < len(types) + 2 or KING_MASKS[white_king] >> black_king & 1:
+            continue
+        if any(piece_type == "P" and not 8 <= square < 56 for piece_type, square in zip(types, squares)):
+            continue
+        pieces = list(zip(types, squares))
+        occupancy = sum(1 << square for square in occupied)
+        black_in_check = is_attacked(black_king, pieces, occupancy)
+
+        # White to move, illegal when the black king is in check
+        if not black_in_check:
+            children, externals = [], []
+            for _, _, target in KING_TARGETS[white_king]:
+                if target not in occupied and not KING_MASKS[black_king] >> target & 1:
+                    children.append(position_index(ending, 1, target, black_king, squares))
+            for i, (piece_type, square) in enumerate(pieces):
+                for target, promotion in piece_targets(piece_type, square, occupancy):
+                    moved = squares[:i] + [target] + squares[i + 1:]
+                    if promotion:
+                        promoted_types = types[:i] + promotion + types[i + 1:]
+                        externals.append(external_value("K" + promoted_types + "K", 1, white_king, black_king, moved))
+                    else:
+                        children.append(position_index(ending, 1, white_king, black_king, moved))
+            records.append((position_index(ending, 0, white_king, black_king, squares), False, children, externals))
+
+        # Black to move
+        children, externals = [], []
+        without_black_king = occupancy & ~(1 << black_king)
+        for _, _, target in KING_TARGETS[black_king]:
+            if KING_MASKS[white_king] >> target & 1:
+                continue
+            captured = squares.index(target) if target in squares else None
+            if is_attacked(target, pieces, without_black_king, target if captured is not None else None):
+                continue
+            if captured is None:
+                children.append(position_index(ending, 0, white_king, target, squares))
+            else:
+                remaining_types = types[:captured] + types[captured + 1:]
+                remaining_squares = squares[:captured] + squares[captured + 1:]
+                externals.append(external_value("K" + remaining_types + "K", 0, white_king, target, remaining_squares))
+        records.append((position_index(ending, 1, white_king, black_king, squares), black_in_check, children, externals))
+    return records
+
+
+def piece_targets(piece_type, square, occupancy):
+    """(target, promotion type or "") of the moves of a white piece, black only having its king."""
+    if piece_type == "N":
+        return [(target, "") for _, _, target in KNIGHT_TARGETS[square] if not occupancy >> target & 1]
+    if piece_type == "P":
+        targets = []
+        target = square - DIMENSION
+        if not occupancy >> target & 1:
+            if target < DIMENSION:
+                targets.extend((target, promotion) for promotion in PROMOTION_TYPES)
+            else:
+                targets.append((target, ""))
+                if square >= 48 and not occupancy >> (target - DIMENSION) & 1:
+                    targets.append((target - DIMENSION, ""))
+        return targets
+    targets = []
+    for direction in SLIDER_DIRECTIONS[piece_type]:
+        for _, _, target in RAYS[square][direction]:
+            if occupancy >> target & 1:
+                break
+            targets.append((target, ""))
+    return targets
+
+
+def retrograde(size, records):
+    """
+    Value the positions from their moves: a position is won in n + 1 plies when a move reaches a position lost
+    in n, lost in n + 1 when all its moves reach positions won in at most n, drawn when neither ever happens.
+    Positions are settled in order of plies to mate, so every distance is the shortest.
+    """
+    values = bytearray(size)
+    settled = bytearray(size)
+    remaining = [0] * size  # Moves not yet known to lose, per position
+    longest_loss = [0] * size  # Plies to mate after the slowest losing move
+    parents = [[] for _ in range(size)]
+    buckets = [[] for _ in range(MAX_PLIES + 2)]  # (index, won) waiting to be settled, by plies to mate
+
+    for index, in_check, children, externals in records:
+        remaining[index] = len(children)
+        for child in children:
+            parents[child].append(index)
+        fastest_win = None
+        for value in externals:
+            outcome, plies = decode_value(value)
+            if outcome > 0:
+                longest_loss[index] = max(longest_loss[index], plies + 1)
+                continue
+            if outcome < 0:
+                fastest_win = plies + 1 if fastest_win is None else min(fastest_win, plies + 1)
+            remaining[index] += 1  # A winning or drawing move, never counted down
+        if fastest_win is not None:
+            buckets[fastest_win].append((index, True))
+        elif not children and not externals:
+            if in_check:
+                buckets[0].append((index, False))
+            else:
+                settled[index] = 1  # Stalemate
+        elif remaining[index] == 0:
+            buckets[longest_loss[index]].append((index, False))
+
+    for plies, bucket in enumerate(buckets):
+        for index, won in bucket:
+            if settled[index]:
+                continue
+            if plies > MAX_PLIES:
+                raise ValueError("Distance to mate does not fit in a byte")
+            settled[index] = 1
+            values[index] = plies if won else LOSS + plies
+            for parent in parents[index]:
+                if settled[parent]:
+                    continue
+                if won:
+                    remaining[parent] -= 1
+                    longest_loss[parent] = max(longest_loss[parent], plies + 1)
+                    if remaining[parent] == 0:
+                        buckets[longest_loss[parent]].append((parent, False))
+                else:
+                    buckets[plies + 1].append((parent, True))
+    return values
+
+
+def build_table(ending, directory=TABLEBASE_PATH, workers=None):
+    """Generate the table of an ending into directory, the tables it promotes into must be there already."""
+    tasks = [(ending, white_king) for white_king in KING_REGIONS["P" in ending]]
+    records = []
+    with Pool(workers, initializer=init_worker, initargs=(directory,)) as pool:
+        for task_records in pool.imap_unordered(generate_moves, tasks):
+            records.extend(task_records)
+    values = retrograde(table_size(ending), records)
+    with open(os.path.join(directory, ending + TABLE_EXTENSION), "wb") as table_file:
+        table_file.write(values)
+    return values
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate endgame tablebases by retrograde analysis.")
+    parser.add_argument("endings", nargs="*", help=f"Endings to build, in order, all of {' '.join(ENDINGS)} by default")
+    parser.add_argument("--directory", default=TABLEBASE_PATH)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    unknown = [ending for ending in args.endings if ending not in ENDINGS]
+    if unknown:
+        parser.error(f"Unknown endings: {' '.join(unknown)}")
+
+    os.makedirs(args.directory, exist_ok=True)
+    for ending in args.endings or ENDINGS:
+        start_time = time.time()
+        values = build_table(ending, args.directory, args.workers)
+        longest = max((decode_value(value)[1] for value in values if value != DRAW), default=0)
+        wins = sum(1 for value in values if DRAW < value < LOSS)
+        print(f"{ending}: {len(values)} positions, {wins} won by the side to move, longest mate {longest} plies, "
+              f"{time.time() - start_time:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+import argparse
+import json
+import os
+import time
+from multiprocessing import Pool
+import numpy as np
+import batch_evaluator
+import pgn
+import smart_move_finder
+from constants import DIMENSION, SQUARES, PIECE_SCORES, PIECE_POSITION_SCORE, CENTER_SQUARES, CENTRAL_CONTROL_SCORE, CASTLING_RIGHT_SCORE, PIECE_CODES
+
+'''
+Texel tuning: fit the terms of the search evaluation, smart_move_finder.board_score_based_on_gamestate, to
+game results.
+
+Quiet positions are streamed from a PGN file (the bundled Fischer collection by default), encoded in worker
+processes, and the material values, piece-square tables, central control and castling rights weights are
+fitted by minimizing the mean squared error between the game result and a logistic of the evaluation.
+The attacked and defended pieces terms have no weight of their own, they are added at their current value
+while fitting the others. Mobility is not fitted, the search evaluation does not count it.
+
+    python texel_tuner.py assets/opening_books/Fischer.pgn --output tuned_eval.json
+'''
+
+DEFAULT_PGN = "assets/opening_books/Fischer.pgn"
+
+SKIPPED_OPENING_PLIES = 8
+TUNED_PIECE_TYPES = ["P", "N", "B", "R", "Q", "K"]
+MATERIAL_PIECE_TYPES = ["P", "N", "B", "R", "Q"]  # The king value stays 0
+
+# Parameter vector layout
+MATERIAL_OFFSET = 0
+POSITION_OFFSET = MATERIAL_OFFSET + len(MATERIAL_PIECE_TYPES)
+CENTRAL_CONTROL_INDEX = POSITION_OFFSET + len(TUNED_PIECE_TYPES) * SQUARES
+CASTLING_RIGHTS_INDEX = CENTRAL_CONTROL_INDEX + 1
+PARAMETERS_COUNT = CASTLING_RIGHTS_INDEX + 1
+
+# Square seen from black's side: same column, mirrored row
+MIRRORED_SQUARES = np.arange(SQUARES) ^ (SQUARES - DIMENSION)
+CENTER_INDEXES = [row * DIMENSION + col for row, col in CENTER_SQUARES]
+
+CACHED_ARRAYS = ("codes", "castling_rights", "fixed_scores", "results")
+
+
+def is_tactical(move):
+    return move.piece_captured != "--" or move.is_pawn_promotion
+
+
+def search_terms(gs):
+    """
+    (castling rights, attacked and defended pieces score) of the position: the castling rights feature is 1
+    when the side to move can still castle, the score is the fixed part of the search evaluation.
+    """
+    castling_rights = gs.castling_rights & (smart_move_finder.WHITE_CASTLING_RIGHTS if gs.white_to_move
+                                            else smart_move_finder.BLACK_CASTLING_RIGHTS)
+    fixed_score = smart_move_finder.count_attacked_pieces(gs.board, 'w') \
+        - smart_move_finder.count_attacked_pieces(gs.board, 'b') \
+        + smart_move_finder.count_defended_pieces(gs.board, 'w') \
+        - smart_move_finder.count_defended_pieces(gs.board, 'b')
+    return 1 if castling_rights else 0, fixed_score
+
+
+def quiet_positions(game):
+    """
+    Encode the quiet positions of a game as bytes of piece codes, with their search_terms.
+    A position is quiet when the side to move is not in check and neither the move that led
+    to it nor the move played from it is a capture or a promotion.
+    """
+    result = game.result
+    positions = []
+    terms = []
+    if result is None:
+        return positions, terms, result
+
+    previous_move = None
+    try:
+        for ply, (gs, move) in enumerate(pgn.replay_game(game)):
+            if ply >= SKIPPED_OPENING_PLIES and not gs.in_check and not is_tactical(move) \
+                    and not (previous_move and is_tactical(previous_move)):
+                positions.append(batch_evaluator.encode_board(gs.board).tobytes())
+                terms.append(search_terms(gs))
+            previous_move = move
+    except ValueError:
+        return [], [], result  # The engine cannot replay this game, skip it
+
+    return positions, terms, result
+
+
+def extract_positions(pgn_path, workers=None, max_games=None):
+    """
+    Replay the games of a PGN file across a process pool, returns (codes, castling_rights, fixed_scores, results)
+    arrays.
+    """
+    games = pgn.read_games(pgn_path)
+    if max_games:
+        games = (game for game, _ in zip(games, range(max_games)))
+
+    encoded_positions = []
+    terms = []
+    results = []
+    with Pool(workers) as pool:
+        for positions, position_terms, result in pool.imap(quiet_positions, games, chunksize=8):
+            encoded_positions.extend(positions)
+            terms.extend(position_terms)
+            results.extend([result] * len(positions))
+
+    codes = np.frombuffer(b"".join(encoded_positions), dtype=np.int8).reshape(-1, SQUARES)
+    terms = np.array(terms, dtype=np.float32).reshape(-1, 2)
+    return codes, terms[:, 0], terms[:, 1], np.array(results, dtype=np.float32)
+
+
+def build_features(codes, castling_rights):
+    """
+    Build the (N, PARAMETERS_COUNT) feature matrix, the evaluation is features @ parameters.
+    Black pieces count negatively on the mirrored square of the white piece-square table.
+    """
+    features = np.zeros((len(codes), PARAMETERS_COUNT), dtype=np.float32)
+    for i, piece_type in enumerate(TUNED_PIECE_TYPES):
+        white = codes == PIECE_CODES["w" + piece_type]
+        black = codes == PIECE_CODES["b" + piece_type]
+        placement = white.astype(np.int8) - black[:, MIRRORED_SQUARES]
+        features[:, POSITION_OFFSET + i * SQUARES:POSITION_OFFSET + (i + 1) * SQUARES] = placement
+        if piece_type in MATERIAL_PIECE_TYPES:
+            features[:, MATERIAL_OFFSET + i] = placement.sum(axis=1)
+
+    center = codes[:, CENTER_INDEXES]
+    features[:, CENTRAL_CONTROL_INDEX] = ((center >= PIECE_CODES["wP"]) & (center <= PIECE_CODES["wK"])).sum(axis=1) \
+        - (center >= PIECE_CODES["bP"]).sum(axis=1)
+    features[:, CASTLING_RIGHTS_INDEX] = castling_rights
+    return features
+
+
+def initial_parameters():
+    """Current constants.py values, in parameter vector layout."""
+    parameters = np.zeros(PARAMETERS_COUNT, dtype=np.float64)
+    for i, piece_type in enumerate(MATERIAL_PIECE_TYPES):
+        parameters[MATERIAL_OFFSET + i] = PIECE_SCORES[piece_type]
+    for i, piece_type in enumerate(TUNED_PIECE_TYPES):
+        table = PIECE_POSITION_SCORE["w" + piece_type]
+        parameters[POSITION_OFFSET + i * SQUARES:POSITION_OFFSET + (i + 1) * SQUARES] = np.array(table).ravel()
+    parameters[CENTRAL_CONTROL_INDEX] = CENTRAL_CONTROL_SCORE
+    parameters[CASTLING_RIGHTS_INDEX] = CASTLING_RIGHT_SCORE
+    return parameters
+
+
+def win_probability(scores, k):
+    return 1.0 / (1.0 + np.power(np.float32(10.0), -k * scores / 400.0))
+
+
+def loss(scores, results, k):
+    return float(np.mean((results - win_probability(scores, k)) ** 2))
+
+
+def fit_scaling_constant(scores, results, low=0.05, high=3.0, iterations=60):
+    """Golden-section search of the K that best maps the current evaluation to results."""
+    ratio = (5 ** 0.5 - 1) / 2
+    a, b = low, high
+    for _ in range(iterations):
+        c = b - ratio * (b - a)
+        d = a + ratio * (b - a)
+        if loss(scores, results, c) < loss(scores, results, d):
+            b = d
+        else:
+            a = c
+    return (a + b) / 2
+
+
+def tune(features, fixed_scores, results, parameters, k, iterations=1500, learning_rate=1.0, regularization=2e-8,
+         log_every=250):
+    """
+    Full-batch Adam on the Texel loss of features @ parameters + fixed_scores, returns the fitted parameters.
+    The L2 regularization pulls rarely seen piece-square entries back towards their starting values.
+    """
+    initial = parameters
+    parameters = parameters.copy()
+    first_moment = np.zeros_like(parameters)
+    second_moment = np.zeros_like(parameters)
+    beta1, beta2, epsilon = 0.9, 0.999, 1e-8
+    slope = np.log(10.0) * k / 400.0
+
+    for iteration in range(1, iterations + 1):
+        scores = features @ parameters.astype(np.float32) + fixed_scores
+        probabilities = win_probability(scores, k)
+        errors = (probabilities - results) * probabilities * (1.0 - probabilities) * np.float32(slope)
+        gradient = (2.0 / len(results)) * (features.T @ errors) + 2.0 * regularization * (parameters - initial)
+
+        first_moment = beta1 * first_moment + (1 - beta1) * gradient
+        second_moment = beta2 * second_moment + (1 - beta2) * gradient ** 2
+        corrected_first = first_moment / (1 - beta1 ** iteration)
+        corrected_second = second_moment / (1 - beta2 ** iteration)
+        parameters -= learning_rate * corrected_first / (np.sqrt(corrected_second) + epsilon)
+
+        if log_every and iteration % log_every == 0:
+            print(f"Iteration {iteration}: loss {loss(scores, results, k):.6f}")
+
+    return parameters
+
+
+def parameters_to_json(parameters):
+    """Round the parameters back into the constants.py layout."""
+    parameters = np.rint(parameters).astype(int)
+    piece_scores = {"K": PIECE_SCORES["K"]}
+    for i, piece_type in enumerate(MATERIAL_PIECE_TYPES):
+        piece_scores[piece_type] = int(parameters[MATERIAL_OFFSET + i])
+    position_scores = {}
+    for i, piece_type in enumerate(TUNED_PIECE_TYPES):
+        table = parameters[POSITION_OFFSET + i * SQUARES:POSITION_OFFSET + (i + 1) * SQUARES]
+        position_scores[piece_type] = table.reshape(DIMENSION, DIMENSION).tolist()
+    return {
+        "PIECE_SCORES": piece_scores,
+        "PIECE_POSITION_SCORE_WHITE": position_scores,
+        "CENTRAL_CONTROL_SCORE": int(parameters[CENTRAL_CONTROL_INDEX]),
+        "CASTLING_RIGHT_SCORE": int(parameters[CASTLING_RIGHTS_INDEX])
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Texel tuning of the search evaluation over a PGN collection.")
+    parser.add_argument("pgn", nargs="?", default=DEFAULT_PGN, help="PGN file to read the games from")
+    parser.add_argument("--output", default="tuned_eval.json", help="Where to write the tuned values")
+    parser.add_argument("--cache", help="NumPy .npz file caching the extracted positions between runs")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Feature extraction processes")
+    parser.add_argument("--max-games", type=int, help="Only read the first games of the PGN file")
+    parser.add_argument("--iterations", type=int, default=1500)
+    parser.add_argument("--learning-rate", type=float, default=1.0)
+    parser.add_argument("--regularization", type=float, default=2e-8, help="L2 pull towards the current values")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    cached = np.load(args.cache) if args.cache and os.path.exists(args.cache) else None
+    if cached is not None and "fixed_scores" in cached:  # Caches written before the search terms are re-extracted
+        codes, castling_rights, fixed_scores, results = (cached[name] for name in CACHED_ARRAYS)
+    else:
+        codes, castling_rights, fixed_scores, results = extract_positions(args.pgn, args.workers, args.max_games)
+        if args.cache:
+            np.savez_compressed(args.cache, codes=codes, castling_rights=castling_rights, fixed_scores=fixed_scores,
+                                results=results)
+    print(f"{len(codes)} quiet positions extracted in {time.time() - start_time:.1f}s")
+
+    features = build_features(codes, castling_rights)
+    parameters = initial_parameters()
+    initial_scores = features @ parameters.astype(np.float32) + fixed_scores
+    k = fit_scaling_constant(initial_scores, results)
+    loss_before = loss(initial_scores, results, k)
+    print(f"K = {k:.4f}, initial loss {loss_before:.6f}")
+
+    tuned = tune(features, fixed_scores, results, parameters, k, args.iterations, args.learning_rate,
+                 args.regularization)
+    loss_after = loss(features @ np.rint(tuned).astype(np.float32) + fixed_scores, results, k)
+    print(f"Tuned loss {loss_after:.6f} in {time.time() - start_time:.1f}s")
+
+    output = parameters_to_json(tuned)
+    output.update({"K": k, "positions": len(codes), "loss_before": loss_before, "loss_after": loss_after})
+    with open(args.output, "w") as output_file:
+        json.dump(output, output_file, indent=2)
+    print(f"Tuned values written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+import argparse
+import itertools
+import json
+import os
+import random
+import time
+from multiprocessing import Pool
+import numpy as np
+import batch_evaluator
+import match_runner
+import pgn
+import smart_move_finder
+from chess_engine import GameState
+from constants import SQUARES
+
+'''
+Training data: positions labeled with a shallow search score and the result of their game, for tuning
+and for learned evaluation experiments.
+
+Games are either replayed from a PGN file or played by the engine against itself from openings sampled out
+of a PGN collection. Every game is handled in a worker process, which searches its sampled positions at a
+fixed depth with a search state reset per game, so the labels do not depend on the worker or the order.
+The main process streams the samples into fixed-size shards of preallocated NumPy .npy files, opened as
+memory maps, so memory stays constant however many positions are generated:
+
+    shard_00000.boards.npy   (shard_size, 64) int8 piece codes, as batch_evaluator.encode_board
+    shard_00000.scores.npy   (shard_size,) int16 search score in centipawns, white's point of view
+    shard_00000.results.npy  (shard_size,) float32 game result, white's point of view (1.0, 0.5, 0.0)
+    shard_00000.white_to_move.npy  (shard_size,) int8
+
+manifest.json lists the shards and how many of their rows are filled, load_shards() maps them back
+without reading them into memory.
+
+    python training_data.py selfplay data/selfplay --games 1000 --depth 3
+    python training_data.py pgn data/fischer --pgn assets/opening_books/Fischer.pgn --depth 2
+'''
+
+DEFAULT_PGN = "assets/opening_books/Fischer.pgn"
+DEFAULT_SHARD_SIZE = 1 << 20
+DEFAULT_DEPTH = 3
+SKIPPED_OPENING_PLIES = 8
+SELF_PLAY_RANDOM_PLIES = 4  # Random moves after the opening, so games from the same opening differ
+SELF_PLAY_MAX_PLIES = 300
+GAMES_PER_WORKER = 8  # Games handed to the pool at a time per worker, bounds the memory of pending tasks
+
+MANIFEST = "manifest.json"
+FIELDS = {
+    "boards": (np.int8, (SQUARES,)),
+    "scores": (np.int16, ()),
+    "results": (np.float32, ()),
+    "white_to_move": (np.int8, ())
+}
+
+
+class ShardWriter:
+    """Append samples to memory mapped shards of shard_size rows, starting a new shard when one is full."""
+
+    def __init__(self, directory, shard_size=DEFAULT_SHARD_SIZE, metadata=None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.shard_size = shard_size
+        self.metadata = metadata or {}
+        self.shards = []  # [name, filled rows]
+        self.arrays = None
+
+    def open_shard(self):
+        name = f"shard_{len(self.shards):05d}"
+        self.arrays = {
+            field: np.lib.format.open_memmap(
+                os.path.join(self.directory, f"{name}.{field}.npy"), mode="w+", dtype=dtype,
+                shape=(self.shard_size,) + shape
+            )
+            for field, (dtype, shape) in FIELDS.items()
+        }
+        self.shards.append([name, 0])
+
+    def close_shard(self):
+        for array in self.arrays.values():
+            array.flush()
+        self.arrays = None
+        self.write_manifest()
+
+    def add(self, samples):
+        """Write a dict of equally long arrays, one per field, splitting them across shards as needed."""
+        count = len(samples["scores"])
+        start = 0
+        while start < count:
+            if self.arrays is None:
+                self.open_shard()
+            shard = self.shards[-1]
+            rows = min(count - start, self.shard_size - shard[1])
+            for field, array in self.arrays.items():
+                array[shard[1]:shard[1] + rows] = samples[field][start:start + rows]
+            shard[1] += rows
+            start += rows
+            if shard[1] == self.shard_size:
+                self.close_shard()
+
+    @property
+    def samples(self):
+        return sum(filled for _, filled in self.shards)
+
+    def write_manifest(self):
+        manifest = dict(self.metadata, shard_size=self.shard_size, samples=self.samples,
+                        shards=[{"name": name, "samples": filled} for name, filled in self.shards])
+        with open(os.path.join(self.directory, MANIFEST), "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+
+    def close(self):
+        if self.arrays is not None:
+            self.close_shard()
+        else:
+            self.write_manifest()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def load_shards(directory):
+    """The shards of a training data directory, a dict of read-only memory mapped arrays cut to the filled rows each."""
+    with open(os.path.join(directory, MANIFEST)) as manifest_file:
+        manifest = json.load(manifest_file)
+    return [
+        {
+            field: np.load(os.path.join(directory, f"{shard['name']}.{field}.npy"), mmap_mode="r")[:shard["samples"]]
+            for field in FIELDS
+        }
+        for shard in manifest["shards"] if shard["samples"]
+    ]
+
+
+def search_score(gs, valid_moves, depth, node_limit):
+    """
+    Best move and score of a fixed-depth search, the score from white's point of view.
+    The score is None when the node limit stops the search before its first depth completes.
+    """
+    scores = []
+    best_move, _ = smart_move_finder.iterative_deepening(
+        gs, valid_moves, max_depth=depth, node_limit=node_limit, on_iteration=lambda info: scores.append(info.score)
+    )
+    if not scores:
+        return best_move, None
+    return best_move, scores[-1] if gs.white_to_move else -scores[-1]
+
+
+class GameSamples:
+    """Samples of one game, labeled with its result once it is known."""
+
+    def __init__(self):
+        self.boards = []
+        self.scores = []
+        self.white_to_move = []
+
+    def add(self, gs, score):
+        self.boards.append(batch_evaluator.encode_board(gs.board).tobytes())
+        self.scores.append(score)
+        self.white_to_move.append(gs.white_to_move)
+
+    def labeled(self, result):
+        count = len(self.scores)
+        return {
+            "boards": np.frombuffer(b"".join(self.boards), dtype=np.int8).reshape(count, SQUARES),
+            "scores": np.array(self.scores, dtype=np.int16),
+            "results": np.full(count, result, dtype=np.float32),
+            "white_to_move": np.array(self.white_to_move, dtype=np.int8)
+        }
+
+
+def is_sampled(gs, ply, rng, sample_rate):
+    return ply >= SKIPPED_OPENING_PLIES and not gs.in_check and rng.random() < sample_rate
+
+
+def replay_pgn_game(task):
+    """Search the sampled positions of a PgnGame in a worker process, None when its result is unknown or it cannot be replayed."""
+    game, depth, node_limit, sample_rate, seed = task
+    result = game.result
+    if result is None:
+        return None
+    smart_move_finder.reset_search_state()
+    rng = random.Random(seed)
+    samples = GameSamples()
+    try:
+        for ply, (gs, move) in enumerate(pgn.replay_game(game)):
+            if is_sampled(gs, ply, rng, sample_rate):
+                _, score = search_score(gs, gs.get_all_valid_moves(), depth, node_limit)
+                if score is not None:  # No label rather than a made-up one
+                    samples.add(gs, score)
+    except ValueError:
+        return None
+    return samples.labeled(result)
+
+
+def play_self_play_game(task):
+    """Play a game from fen with fixed-depth searches for both sides in a worker process, labeling its sampled positions."""
+    fen, depth, node_limit, sample_rate, seed = task
+    smart_move_finder.reset_search_state()
+    rng = random.Random(seed)
+    gs = GameState(fen=fen)
+    samples = GameSamples()
+    scores = []
+    result = None
+
+    for ply in range(SELF_PLAY_MAX_PLIES):
+        valid_moves = gs.get_all_valid_moves()
+        if not valid_moves:
+            result = 0.5 if not gs.in_check else 0.0 if gs.white_to_move else 1.0
+            break
+        if gs.is_game_over or gs.can_claim_draw() or gs.has_insufficient_material():
+            result = 0.5
+            break
+        if ply < SELF_PLAY_RANDOM_PLIES:
+            gs.make_move(rng.choice(valid_moves))
+            continue
+        move, score = search_score(gs, valid_moves, depth, node_limit)
+        if is_sampled(gs, ply, rng, sample_rate) and score is not None:
+            samples.add(gs, score)
+        gs.make_move(move)
+        scores.append(score)
+        adjudication = match_runner.adjudicate(
+            scores, match_runner.RESIGN_SCORE, match_runner.RESIGN_PLIES, match_runner.DRAW_ADJUDICATION_SCORE,
+            match_runner.DRAW_PLIES, match_runner.DRAW_START_PLY
+        )
+        if adjudication:
+            result = pgn.RESULTS[adjudication]
+            break
+
+    return samples.labeled(0.5 if result is None else result)
+
+
+def generate(worker, tasks, writer, workers=None, max_samples=None, log=print):
+    """Run the game tasks across a process pool, streaming their samples into the writer in completion order."""
+    workers = workers or os.cpu_count()
+    games = 0
+    start_time = time.time()
+    with Pool(workers) as pool:
+        tasks = iter(tasks)
+        while True:
+            # Pool.imap would read the whole task iterator ahead, a batch at a time keeps it bounded
+            batch = list(itertools.islice(tasks, workers * GAMES_PER_WORKER))
+            if not batch:
+                break
+            for samples in pool.imap_unordered(worker, batch):
+                if samples is None:
+                    continue
+                if max_samples:
+                    samples = {field: values[:max_samples - writer.samples] for field, values in samples.items()}
+                writer.add(samples)
+                games += 1
+            if log:
+                rate = writer.samples / max(time.time() - start_time, 1e-9)
+                log(f"{games} games, {writer.samples} positions, {rate:.0f} positions/s")
+            if max_samples and writer.samples >= max_samples:
+                break
+    return games
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate positions labeled with search scores and game results.")
+    parser.add_argument("source", choices=["selfplay", "pgn"])
+    parser.add_argument("output", help="Directory of the shards")
+    parser.add_argument("--pgn", default=DEFAULT_PGN, help="Games to replay, or to sample self-play openings from")
+    parser.add_argument("--games", type=int, default=100, help="Self-play games, or the first games of the PGN file")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH, help="Search depth of every labeled position")
+    parser.add_argument("--nodes", type=int, help="Node limit per search, on top of the depth")
+    parser.add_argument("--sample-rate", type=float, default=1.0, help="Fraction of the eligible positions kept")
+    parser.add_argument("--max-samples", type=int, help="Stop after this many positions")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE, help="Positions per shard")
+    parser.add_argument("--opening-plies", type=int, default=match_runner.DEFAULT_OPENING_PLIES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    if args.source == "pgn":
+        games = itertools.islice(pgn.read_games(args.pgn), args.games)
+        tasks = ((game, args.depth, args.nodes, args.sample_rate, args.seed + i) for i, game in enumerate(games))
+        worker = replay_pgn_game
+    else:
+        openings = match_runner.sample_openings(args.pgn, args.games, args.opening_plies, args.seed)
+        if not openings:
+            parser.error(f"No openings of {args.opening_plies} plies in {args.pgn}")
+        tasks = ((openings[i % len(openings)], args.depth, args.nodes, args.sample_rate, args.seed + i)
+                 for i in range(args.games))
+        worker = play_self_play_game
+
+    metadata = {"source": args.source, "pgn": args.pgn, "depth": args.depth, "nodes": args.nodes,
+                "sample_rate": args.sample_rate, "seed": args.seed}
+    start_time = time.time()
+    with ShardWriter(args.output, args.shard_size, metadata) as writer:
+        games = generate(worker, tasks, writer, args.workers, args.max_samples)
+    print(f"{writer.samples} positions from {games} games written to {args.output} in {time.time() - start_time:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
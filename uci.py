@@ -0,0 +1,272 @@
+import os
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")  # constants imports pygame, its banner must not reach stdout
+
+import queue
+import sys
+import threading
+import smart_move_finder
+from chess_engine import GameState
+from constants import CHECK_MATE_SCORE, MAX_DEPTH, TABLEBASE_WIN_SCORE
+from tablebase import MAX_PLIES as TABLEBASE_MAX_PLIES
+
+'''
+UCI (Universal Chess Interface) front end, so tournament managers and match scripts can drive the engine.
+
+    python uci.py
+
+Commands are read from stdin on a background thread and handled as they arrive, while the search runs
+on its own thread: stop, ponderhit and isready are answered during a search, which checks its stop event
+every few hundred nodes.
+'''
+
+ENGINE_NAME = "Chess engine"
+ENGINE_AUTHOR = "Chess engine authors"
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# Rough size of a transposition table entry in the dict, to turn the Hash option into a number of entries
+TRANSPOSITION_ENTRY_BYTES = 200
+DEFAULT_HASH_MB = 64
+
+# Time management
+DEFAULT_MOVES_TO_GO = 30
+INCREMENT_SHARE = 0.8
+MOVE_OVERHEAD = 0.05  # Seconds kept for the answer to reach the GUI
+
+
+def score_to_uci(score, pv_length):
+    """UCI score of a search score, mate scores found by the search carry no distance so it is taken from the PV."""
+    if abs(score) >= CHECK_MATE_SCORE:
+        moves_to_mate = max(1, (pv_length + 1) // 2)
+        return f"mate {moves_to_mate if score > 0 else -moves_to_mate}"
+    if abs(score) >= TABLEBASE_WIN_SCORE - TABLEBASE_MAX_PLIES:
+        # A tablebase result, the score holds the plies to mate
+        moves_to_mate = (TABLEBASE_WIN_SCORE - abs(score)) // 2 + 1
+        return f"mate {moves_to_mate if score > 0 else -moves_to_mate}"
+    return f"cp {score}"
+
+
+def info_line(record):
+    """UCI info line of a SearchInfo dict."""
+    return f"info depth {record['depth']} seldepth {record['seldepth']} " \
+           f"score {score_to_uci(record['score'], len(record['pv']))} nodes {record['nodes']} " \
+           f"nps {record['nps']} time {int(record['time'] * 1000)} pv {' '.join(record['pv'])}"
+
+
+def parse_go(tokens):
+    """Arguments of a go command as a dict, numbers as ints and flags as True."""
+    arguments = {}
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token in ("infinite", "ponder"):
+            arguments[token] = True
+            i += 1
+        elif token == "searchmoves":
+            arguments[token] = tokens[i + 1:]
+            break
+        else:
+            if i + 1 < len(tokens):
+                arguments[token] = int(tokens[i + 1])
+            i += 2
+    return arguments
+
+
+def allocate_time(arguments, white_to_move):
+    """Seconds to spend on the move, None to search without a time limit."""
+    if "movetime" in arguments:
+        return max(arguments["movetime"] / 1000 - MOVE_OVERHEAD, 0.01)
+    time_left = arguments.get("wtime" if white_to_move else "btime")
+    if time_left is None:
+        return None
+    increment = arguments.get("winc" if white_to_move else "binc", 0) / 1000
+    time_left /= 1000
+    moves_to_go = arguments.get("movestogo", DEFAULT_MOVES_TO_GO)
+    budget = time_left / moves_to_go + increment * INCREMENT_SHARE
+    return max(min(budget, time_left - MOVE_OVERHEAD), 0.01)
+
+
+class UciInfoWriter:
+    """Stands in for find_best_move's info_queue and writes every completed depth as an info line."""
+
+    def __init__(self, uci):
+        self.uci = uci
+        self.last_pv = []
+
+    def put(self, record):
+        if "depth" in record:
+            self.last_pv = record["pv"]
+            self.uci.send(info_line(record))
+
+
+class Uci:
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.output_lock = threading.Lock()
+        self.gs = GameState(fen=START_FEN)
+        self.search_thread = None
+        self.stop_event = threading.Event()
+        self.bestmove_released = threading.Event()  # Cleared while pondering or in infinite mode
+        self.ponder_time_limit = None
+        self.set_hash(DEFAULT_HASH_MB)
+
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def set_hash(self, size_mb):
+        smart_move_finder.TRANSPOSITION_TABLE_SIZE = max(1, size_mb * 1024 * 1024 // TRANSPOSITION_ENTRY_BYTES)
+        smart_move_finder.transposition_table.clear()
+
+    def handle(self, line):
+        """Handle one command line, returns False on quit."""
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, arguments = tokens[0], tokens[1:]
+
+        if command == "uci":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send(f"option name Hash type spin default {DEFAULT_HASH_MB} min 1 max 4096")
+            self.send("option name Threads type spin default 1 min 1 max 1")
+            self.send(f"option name OwnBook type check default {'true' if smart_move_finder.USE_OPENING_BOOK else 'false'}")
+            self.send("option name Ponder type check default false")
+            self.send(f"option name AnalysisCache type check default "
+                      f"{'true' if smart_move_finder.USE_ANALYSIS_CACHE else 'false'}")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "setoption":
+            self.set_option(arguments)
+        elif command == "ucinewgame":
+            self.wait_for_search()
+            smart_move_finder.reset_search_state()
+        elif command == "position":
+            self.wait_for_search()
+            self.set_position(arguments)
+        elif command == "go":
+            self.wait_for_search()
+            self.go(parse_go(arguments))
+        elif command == "stop":
+            self.stop_event.set()
+            self.bestmove_released.set()
+        elif command == "ponderhit":
+            self.ponderhit()
+        elif command == "quit":
+            self.stop_event.set()
+            self.bestmove_released.set()
+            self.wait_for_search()
+            return False
+        return True
+
+    def set_option(self, tokens):
+        if "name" not in tokens:
+            return
+        value_index = tokens.index("value") if "value" in tokens else len(tokens)
+        name = " ".join(tokens[tokens.index("name") + 1:value_index]).lower()
+        value = " ".join(tokens[value_index + 1:])
+        if name == "hash":
+            self.set_hash(int(value))
+        elif name == "ownbook":
+            smart_move_finder.USE_OPENING_BOOK = value.lower() == "true"
+        elif name == "analysiscache":
+            smart_move_finder.USE_ANALYSIS_CACHE = value.lower() == "true"
+        # Threads: the search runs on one thread, the option exists for GUIs that always send it
+
+    def set_position(self, tokens):
+        if not tokens:
+            return
+        if tokens[0] == "startpos":
+            fen, rest = START_FEN, tokens[1:]
+        elif tokens[0] == "fen":
+            end = tokens.index("moves") if "moves" in tokens else len(tokens)
+            fen, rest = " ".join(tokens[1:end]), tokens[end:]
+        else:
+            return
+        gs = GameState(fen=fen)
+        # The moves are played on the GameState, so repetitions of the game are seen by the search
+        for uci_move in rest[1:] if rest and rest[0] == "moves" else []:
+            move = next((move for move in gs.get_all_valid_moves() if move.to_uci() == uci_move), None)
+            if move is None:
+                self.send(f"info string illegal move {uci_move}")
+                break
+            gs.make_move(move)
+        self.gs = gs
+
+    def go(self, arguments):
+        valid_moves = self.gs.get_all_valid_moves()
+        if not valid_moves:
+            self.send("bestmove 0000")
+            return
+        if "searchmoves" in arguments:
+            valid_moves = [move for move in valid_moves if move.to_uci() in arguments["searchmoves"]] or valid_moves
+
+        time_limit = allocate_time(arguments, self.gs.white_to_move)
+        self.stop_event = threading.Event()
+        self.bestmove_released = threading.Event()
+        if arguments.get("infinite") or arguments.get("ponder"):
+            # The time budget applies from ponderhit, a bestmove is only sent after stop or ponderhit
+            self.ponder_time_limit = time_limit if arguments.get("ponder") else None
+            time_limit = None
+        else:
+            self.bestmove_released.set()
+
+        self.search_thread = threading.Thread(
+            target=self.search, daemon=True,
+            args=(self.gs, valid_moves, time_limit, arguments.get("depth", MAX_DEPTH), arguments.get("nodes"),
+                  self.stop_event, self.bestmove_released)
+        )
+        self.search_thread.start()
+
+    def search(self, gs, valid_moves, time_limit, max_depth, node_limit, stop_event, bestmove_released):
+        info_writer = UciInfoWriter(self)
+        return_queue = queue.Queue()
+        smart_move_finder.find_best_move(gs, valid_moves, return_queue, time_limit, info_writer, None,
+                                         max_depth=max_depth, node_limit=node_limit, stop_event=stop_event)
+        best_move = return_queue.get()
+        bestmove_released.wait()
+        ponder = f" ponder {info_writer.last_pv[1]}" if len(info_writer.last_pv) > 1 \
+            and info_writer.last_pv[0] == best_move.to_uci() else ""
+        self.send(f"bestmove {best_move.to_uci()}{ponder}")
+
+    def ponderhit(self):
+        """The expected move was played: the ponder search goes on as a normal search with the time budget of the move."""
+        self.bestmove_released.set()
+        if self.ponder_time_limit is not None:
+            timer = threading.Timer(self.ponder_time_limit, self.stop_event.set)
+            timer.daemon = True
+            timer.start()
+        else:
+            self.stop_event.set()
+
+    def wait_for_search(self):
+        if self.search_thread is not None:
+            if self.search_thread.is_alive() and not self.bestmove_released.is_set():
+                # A new command arrived while pondering or searching infinitely: end that search first
+                self.stop_event.set()
+                self.bestmove_released.set()
+            self.search_thread.join()
+            self.search_thread = None
+
+
+def read_commands(commands):
+    """Read stdin on a background thread, so commands are picked up while the search runs."""
+    for line in sys.stdin:
+        commands.put(line)
+    commands.put(None)
+
+
+def main():
+    uci = Uci()
+    commands = queue.Queue()
+    threading.Thread(target=read_commands, args=(commands,), daemon=True).start()
+    while True:
+        line = commands.get()
+        if line is None or not uci.handle(line.strip()):
+            break
+
+
+if __name__ == "__main__":
+    main()
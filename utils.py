@@ -11,5 +11,6 @@ class Utils:
     def get_chess_notation():
         pass
     
-    def get_rank_file(self, row ,col ):
-        return self.col_to_files[col] + self.rows_to_ranks[row]
+    @staticmethod
+    def get_rank_file(row, col):
+        return Utils.cols_to_files[col] + Utils.rows_to_ranks[row]
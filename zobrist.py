@@ -0,0 +1,49 @@
+import random
+from constants import DIMENSION, SQUARES, CODED_PIECES, PIECE_CODES
+
+'''
+Zobrist keys for hashing positions. The generator is seeded so keys, and every file storing
+position hashes such as the opening book, stay valid across runs.
+'''
+
+_key_generator = random.Random(0x5EED_C4E55)
+
+def _random_key():
+    return _key_generator.getrandbits(64)
+
+# PIECE_KEYS[piece code][square], the empty square code hashes to 0
+PIECE_KEYS = [[0] * SQUARES] + [[_random_key() for _ in range(SQUARES)] for _ in CODED_PIECES[1:]]
+WHITE_TO_MOVE_KEY = _random_key()
+# Indexed by the 4 castling bits of castle_rights: wKs = 1, wQs = 2, bKs = 4, bQs = 8
+CASTLING_KEYS = [0] + [_random_key() for _ in range(15)]
+EN_PASSANT_KEYS = [_random_key() for _ in range(DIMENSION)]
+
+
+def en_passant_capturable(board, en_passant_square, white_to_move):
+    """An en passant square only enters the hash when a pawn of the side to move could capture on it."""
+    if not en_passant_square:
+        return False
+    row, col = en_passant_square
+    pawn_row, pawn = (row + 1, "wP") if white_to_move else (row - 1, "bP")
+    return (col > 0 and board[pawn_row][col - 1] == pawn) or (col < DIMENSION - 1 and board[pawn_row][col + 1] == pawn)
+
+
+def en_passant_key(board, en_passant_square, white_to_move):
+    if en_passant_capturable(board, en_passant_square, white_to_move):
+        return EN_PASSANT_KEYS[en_passant_square[1]]
+    return 0
+
+
+def hash_position(gs):
+    """Compute the Zobrist hash of a GameState from scratch."""
+    key = 0
+    for row in range(DIMENSION):
+        for col in range(DIMENSION):
+            square = gs.board[row][col]
+            if square != "--":
+                key ^= PIECE_KEYS[PIECE_CODES[square]][row * DIMENSION + col]
+    if gs.white_to_move:
+        key ^= WHITE_TO_MOVE_KEY
+    key ^= CASTLING_KEYS[gs.castling_rights]
+    key ^= en_passant_key(gs.board, gs.en_passant_possible_square, gs.white_to_move)
+    return key